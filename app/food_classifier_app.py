@@ -7,13 +7,59 @@ To run: streamlit run food_classifier_app.py
 
 import streamlit as st
 import torch
-import torch.nn as nn
-from torchvision import transforms, models
+from torchvision.transforms import functional as TF
 from PIL import Image
-import json
+from collections import OrderedDict, deque
+import hashlib
+import io
 import os
+import sqlite3
+import sys
+import threading
 import time
 
+RERUN_STARTED = time.perf_counter()
+
+# Rerun profiler for operators: PROFILE_RERUNS=1 shows where each rerun spends its time
+PROFILE_RERUNS = os.environ.get("PROFILE_RERUNS", "0") == "1"
+RERUN_PROFILE_HISTORY = 20
+
+class RerunProfiler:
+    """Wall time per section of one script run; the last few runs are kept in session state"""
+    
+    def __init__(self, started):
+        self.started = started
+        self._last = started
+        self.sections = {}
+    
+    def mark(self, name):
+        """Attribute the time since the previous mark to the section name"""
+        now = time.perf_counter()
+        self.sections[name] = self.sections.get(name, 0.0) + now - self._last
+        self._last = now
+    
+    def render(self):
+        """Record this run and show the last run and the recent average in the sidebar"""
+        run = {**self.sections, "total": time.perf_counter() - self.started}
+        history = st.session_state.setdefault('rerun_profile', deque(maxlen=RERUN_PROFILE_HISTORY))
+        history.append(run)
+        
+        rows = []
+        for name in run:
+            times = [past[name] for past in history if name in past]
+            rows.append({
+                "section": name,
+                "last ms": round(run[name] * 1000, 1),
+                "mean ms": round(sum(times) / len(times) * 1000, 1),
+                "max ms": round(max(times) * 1000, 1),
+            })
+        with st.sidebar:
+            with st.expander("⏱️ Rerun profiler"):
+                st.caption(f"Last {len(history)} reruns of this session")
+                st.table(rows)
+
+rerun_profiler = RerunProfiler(RERUN_STARTED)
+
 # Page config
 st.set_page_config(
     page_title="Bangladeshi Food Classifier",
@@ -22,929 +68,271 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Custom CSS - Clean, responsive design
-st.markdown("""
-<style>
-    /* Dark theme */
-    .stApp {
-        background: linear-gradient(135deg, #1a1a2e 0%, #16213e 100%);
-    }
-    
-    /* Text colors */
-    .stApp, .stMarkdown, p, span, div, label {
-        color: #e0e0e0 !important;
-    }
-    
-    h1, h2, h3, h4, h5, h6 {
-        color: #ffffff !important;
-    }
-    
-    /* Hide branding */
-    #MainMenu, footer, header {visibility: hidden;}
-    
-    
-    /* Sidebar - Always visible */
-    section[data-testid="stSidebar"] {
-        background: rgba(20, 20, 40, 0.98) !important;
-        border-right: 1px solid rgba(102, 126, 234, 0.3) !important;
-    }
-    
-    section[data-testid="stSidebar"] * {
-        color: #e0e0e0 !important;
-    }
-    
-    section[data-testid="stSidebar"] h3 {
-        color: #667eea !important;
-    }
-    
-    /* Buttons */
-    .stButton>button {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%) !important;
-        color: white !important;
-        border-radius: 10px !important;
-        padding: 0.6rem 1.2rem !important;
-        font-weight: 600 !important;
-        border: none !important;
-        width: 100%;
-    }
-    
-    .stButton>button:hover {
-        opacity: 0.9;
-        transform: translateY(-1px);
-    }
-    
-    /* File Uploader */
-    .stFileUploader {
-        background: rgba(135, 206, 235, 0.15);
-        border: 2px dashed rgba(135, 206, 235, 0.6);
-        border-radius: 10px;
-        padding: 1rem;
-    }
-    
-    .stFileUploader:hover {
-        background: rgba(135, 206, 235, 0.25);
-        border-color: #87CEEB;
-    }
-    
-    .stFileUploader label, .stFileUploader p, .stFileUploader span {
-        color: #000000 !important;
-    }
-    
-    /* Tabs */
-    .stTabs [data-baseweb="tab-list"] {
-        gap: 8px;
-        background: rgba(255, 255, 255, 0.05);
-        border-radius: 10px;
-        padding: 0.5rem;
-    }
-    
-    .stTabs [data-baseweb="tab"] {
-        border-radius: 8px;
-        color: #b0b0b0 !important;
-        padding: 0.5rem 1rem;
-    }
-    
-    .stTabs [aria-selected="true"] {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%) !important;
-        color: white !important;
-    }
-    
-    /* Metrics */
-    [data-testid="stMetricValue"] {
-        color: #667eea !important;
-    }
-    
-    [data-testid="stMetricLabel"] {
-        color: #b0b0b0 !important;
-    }
+# Custom CSS, PWA meta tags and service worker registration live in page_head.html.
+# Streamlit rebuilds the page on every rerun, so the markdown call itself must run
+# each time; the file is read once per process.
+@st.cache_data(show_spinner=False)
+def load_static_html(name):
+    """Contents of a static HTML fragment next to this script"""
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), name), 'r', encoding='utf-8') as f:
+        return f.read()
+
+st.markdown(load_static_html("page_head.html"), unsafe_allow_html=True)
+rerun_profiler.mark("page_config_css")
+
+# ============================================
+# NUTRITION DATABASE
+# ============================================
+# nutrition_store.py and nutrition_data.json are shared with the backend (which serves them at
+# /nutrition) and live in backend/, as do the model loading modules imported below; a copy next
+# to this script takes precedence
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from nutrition_store import NutritionStore, resolve_nutrition_path
+
+@st.cache_resource
+def load_nutrition_store():
+    """Load, validate and index nutrition_data.json once per process (not on every rerun)"""
+    return NutritionStore.load(resolve_nutrition_path())
+
+# Food Database search: BM25 column weights (name and aliases count most) and page size
+FOOD_SEARCH_WEIGHTS = {
+    "name": 10.0, "aliases": 8.0, "variants": 4.0, "description": 3.0,
+    "vitamins": 2.0, "origin": 1.0, "preparation": 1.0, "health_tips": 1.0,
+}
+FOOD_SEARCH_PAGE_SIZE = 10
+
+class FoodSearchIndex:
+    """In-memory SQLite full-text index over every text field of the nutrition records
     
-    /* Progress bar */
-    .stProgress > div > div {
-        background: linear-gradient(90deg, #667eea 0%, #764ba2 100%);
-    }
+    Uses FTS5 (ranked with BM25, prefix matching) when the SQLite build has it, and
+    unranked LIKE matching otherwise. Numeric filters run on a plain table joined by rowid.
+    """
     
-    /* Responsive - Mobile */
-    @media (max-width: 768px) {
-        .block-container {
-            padding: 1rem !important;
-        }
+    def __init__(self, store):
+        self._db = sqlite3.connect(":memory:", check_same_thread=False)
+        self._lock = threading.Lock()
+        self.columns = list(FOOD_SEARCH_WEIGHTS)
         
-        .stButton>button {
-            padding: 0.5rem 1rem !important;
-        }
-    }
+        self._db.execute(
+            "CREATE TABLE foods (id INTEGER PRIMARY KEY, key TEXT NOT NULL, "
+            "calories REAL, protein REAL, carbs REAL, fat REAL)"
+        )
+        try:
+            self._db.execute(
+                f"CREATE VIRTUAL TABLE food_text USING fts5({', '.join(self.columns)}, "
+                "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+            )
+            self.fts = True
+        except sqlite3.OperationalError:
+            self._db.execute(f"CREATE TABLE food_text (rowid INTEGER PRIMARY KEY, {', '.join(self.columns)})")
+            self.fts = False
+        
+        aliases = {}
+        for alias, key in store.exact.items():
+            if alias != key:
+                aliases.setdefault(key, []).append(alias.replace("_", " "))
+        for rowid, (key, record) in enumerate(store.records.items(), start=1):
+            self._db.execute(
+                "INSERT INTO foods VALUES (?, ?, ?, ?, ?, ?)",
+                (rowid, key, record.calories, record.protein, record.carbs, record.fat)
+            )
+            text = {
+                "name": key.replace("_", " "),
+                "aliases": " ".join(aliases.get(key, [])),
+                "variants": record.popular_variants,
+                "description": record.description,
+                "vitamins": record.vitamins,
+                "origin": record.origin,
+                "preparation": record.preparation,
+                "health_tips": " ".join(record.health_tips),
+            }
+            self._db.execute(
+                f"INSERT INTO food_text (rowid, {', '.join(self.columns)}) VALUES (?{', ?' * len(self.columns)})",
+                (rowid, *(text[column] for column in self.columns))
+            )
+        self._db.commit()
     
-    /* Container max-width */
-    .block-container {
-        max-width: 1400px !important;
-        padding: 2rem !important;
-    }
+    def ranges(self):
+        """(min, max) of calories, protein and carbs across all foods, for the filter sliders"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT MIN(calories), MAX(calories), MIN(protein), MAX(protein), MIN(carbs), MAX(carbs) FROM foods"
+            ).fetchone()
+        return {"calories": row[0:2], "protein": row[2:4], "carbs": row[4:6]}
     
-    @media (max-width: 480px) {
-        .main-header {
-            padding: 1rem;
-        }
+    def search(self, query="", filters=None, limit=FOOD_SEARCH_PAGE_SIZE, offset=0):
+        """(total matches, keys of one page) for a free-text query and {column: (min, max)} filters
         
-        .main-header h1 {
-            font-size: 1.5rem;
-        }
+        Every query word must match (as a word prefix); results are ordered by relevance,
+        or by name when there is no query.
+        """
+        words = "".join(ch if ch.isalnum() else " " for ch in query.lower()).split()
+        where, params = [], []
+        for column, (low, high) in (filters or {}).items():
+            if column not in ("calories", "protein", "carbs", "fat"):
+                raise ValueError(f"Cannot filter on {column}")
+            where.append(f"foods.{column} BETWEEN ? AND ?")
+            params.extend([low, high])
         
-        .main-header p {
-            font-size: 0.9rem;
-        }
+        order = "foods.key"
+        if words and self.fts:
+            where.append("food_text MATCH ?")
+            params.append(" ".join(f'"{word}"*' for word in words))
+            weights = ", ".join(str(FOOD_SEARCH_WEIGHTS[column]) for column in self.columns)
+            order = f"bm25(food_text, {weights}), foods.key"
+        elif words:
+            text = " || ' ' || ".join(f"food_text.{column}" for column in self.columns)
+            for word in words:
+                where.append(f"({text}) LIKE ?")
+                params.append(f"%{word}%")
         
-        .stButton>button {
-            padding: 0.75rem 1.5rem;
-            font-size: 1rem;
-        }
-    }
-    
-    /* Touch-friendly elements */
-    @media (hover: none) and (pointer: coarse) {
-        .stButton>button, a, input, select {
-            min-height: 44px;
-            min-width: 44px;
-        }
-    }
-    
-    /* PWA Install Banner */
-    .install-banner {
-        position: fixed;
-        bottom: 20px;
-        left: 50%;
-        transform: translateX(-50%);
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        color: white;
-        padding: 1rem 2rem;
-        border-radius: 50px;
-        box-shadow: 0 4px 12px rgba(0,0,0,0.3);
-        z-index: 1000;
-        display: none;
-        font-size: 0.9rem;
-        text-align: center;
-    }
-    
-    .install-banner.show {
-        display: block;
-    }
-</style>
+        sql = "FROM foods JOIN food_text ON food_text.rowid = foods.id"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        with self._lock:
+            total = self._db.execute(f"SELECT COUNT(*) {sql}", params).fetchone()[0]
+            rows = self._db.execute(
+                f"SELECT foods.key {sql} ORDER BY {order} LIMIT ? OFFSET ?", params + [limit, offset]
+            ).fetchall()
+        return total, [row[0] for row in rows]
 
-<!-- PWA Manifest Link -->
-<link rel="manifest" href="/app/static/manifest.json">
+@st.cache_resource
+def load_food_search_index():
+    """Full-text index over the nutrition database, built once per process"""
+    return FoodSearchIndex(load_nutrition_store())
 
-<!-- PWA Meta Tags -->
-<meta name="mobile-web-app-capable" content="yes">
-<meta name="apple-mobile-web-app-capable" content="yes">
-<meta name="apple-mobile-web-app-status-bar-style" content="black-translucent">
-<meta name="apple-mobile-web-app-title" content="Food Classifier">
-<meta name="theme-color" content="#667eea">
-<meta name="viewport" content="width=device-width, initial-scale=1.0, maximum-scale=5.0, user-scalable=yes">
+# ============================================
+# MODEL FUNCTIONS
+# ============================================
+# Checkpoint loading (architecture detection, safetensors/mmap weights) and the INT8
+# agreement/fingerprint gate are shared with the backend; imported from backend/ like
+# nutrition_store
+from model_loader import file_fingerprint, load_class_names
+from model_loader import load_model as load_checkpoint
+from quantize import load_quantized_model
 
-<!-- PWA Icons -->
-<link rel="icon" type="image/png" sizes="192x192" href="/app/static/icon-192.png">
-<link rel="apple-touch-icon" sizes="192x192" href="/app/static/icon-192.png">
+# Opt-in INT8 model: set MODEL_PRECISION=int8 and place model_int8.pt (built by
+# backend/quantize.py) with its agreement report next to model.pth
+MODEL_PRECISION = os.environ.get("MODEL_PRECISION", "fp32").lower()
+QUANTIZED_MIN_AGREEMENT = float(os.environ.get("QUANTIZED_MIN_AGREEMENT", "0.98"))
 
-<!-- PWA Service Worker Registration -->
-<script>
-    if ('serviceWorker' in navigator) {
-        window.addEventListener('load', function() {
-            navigator.serviceWorker.register('/service-worker.js')
-                .then(function(registration) {
-                    console.log('ServiceWorker registered:', registration.scope);
-                })
-                .catch(function(error) {
-                    console.log('ServiceWorker registration failed:', error);
-                });
-        });
-    }
+@st.cache_resource
+def load_model(model_path, class_names_path, precision="fp32"):
+    """Load trained model with auto-detection
     
-    // PWA Install Prompt
-    let deferredPrompt;
-    window.addEventListener('beforeinstallprompt', (e) => {
-        e.preventDefault();
-        deferredPrompt = e;
-        
-        // Show install banner
-        const banner = document.querySelector('.install-banner');
-        if (banner) {
-            banner.classList.add('show');
-        }
-    });
+    Returns (model, class_names, detected_arch, model_version); the version identifies the
+    checkpoint and precision and keys the probability cache. An INT8 artifact that cannot be
+    used (missing, below the agreement gate or built from another model.pth) falls back to fp32.
+    """
+    class_names = load_class_names(class_names_path)
+    fingerprint = file_fingerprint(model_path)
     
-    // Check if running as PWA
-    if (window.matchMedia('(display-mode: standalone)').matches) {
-        console.log('Running as PWA');
-    }
-</script>
-""", unsafe_allow_html=True)
+    if precision == "int8":
+        artifact_path = os.path.join(os.path.dirname(model_path), "model_int8.pt")
+        try:
+            model, report = load_quantized_model(artifact_path, QUANTIZED_MIN_AGREEMENT, fingerprint)
+            detected_arch = f"{report['architecture']} (INT8)"
+            return model, class_names, detected_arch, f"{report['architecture']}-{fingerprint}-int8"
+        except (OSError, ValueError, RuntimeError) as e:
+            print(f"⚠️ INT8 model not used, falling back to fp32: {e}")
+    
+    model, detected_arch = load_checkpoint(model_path, len(class_names))
+    return model, class_names, detected_arch, f"{detected_arch}-{fingerprint}"
 
 # ============================================
-# COMPREHENSIVE NUTRITION DATABASE FOR 33 BANGLADESHI FOODS
+# TEST-TIME AUGMENTATION
 # ============================================
-NUTRITION_DATA = {
-    "alu_vorta": {
-        "calories": 95, "protein": 2.1, "carbs": 18.5, "fat": 2.5, "fiber": 2.3,
-        "description": "Mashed potato with mustard oil, green chilies, onions, and coriander",
-        "origin": "Popular across Bangladesh, especially in rural areas",
-        "preparation": "Boil potatoes until soft, mash them, and mix with mustard oil, green chilies, onions, salt, and coriander leaves. Some add garlic for extra flavor.",
-        "best_time": "Lunch or dinner as side dish",
-        "health_tips": [
-            "✓ Good source of vitamin C and potassium",
-            "✓ Low in calories, suitable for weight management",
-            "✓ Mustard oil provides healthy omega-3 fatty acids",
-            "Avoid excessive oil to keep it heart-healthy"
-        ],
-        "vitamins": "Vitamin C, Potassium, Omega-3",
-        "serving_size": "100g",
-        "popular_variants": "Plain Alu Vorta, with Garlic, with Egg"
-    },
-    "bakorkhani": {
-        "calories": 385, "protein": 8.5, "carbs": 58.0, "fat": 13.0, "fiber": 2.1,
-        "description": "Thick, crispy flatbread made from refined flour, ghee, milk, and sugar",
-        "origin": "Old Dhaka specialty, popular during Ramadan",
-        "preparation": "Made from refined flour, ghee, milk, and sugar. Dough is layered with ghee, rolled thin, and baked in a clay oven (tandoor) until crispy and flaky.",
-        "best_time": "Iftar during Ramadan, breakfast with tea",
-        "health_tips": [
-            "⚠️ High in calories and carbs - consume in moderation",
-            "⚠️ Contains saturated fat from ghee",
-            "Best paired with tea and enjoyed occasionally",
-            "Good energy source for breaking fast during Ramadan"
-        ],
-        "vitamins": "B vitamins, Iron",
-        "serving_size": "100g",
-        "popular_variants": "Sweet Bakorkhani, Savory Bakorkhani"
-    },
-    "bhapa": {
-        "calories": 245, "protein": 18.5, "carbs": 8.2, "fat": 16.0, "fiber": 1.2,
-        "description": "Steamed fish in mustard paste - traditional delicacy",
-        "origin": "Traditional across Bangladesh, especially Sylhet",
-        "preparation": "Fish (typically hilsa or rui) marinated with mustard paste, green chilies, turmeric, and salt, then steamed in banana leaves or aluminum foil.",
-        "best_time": "Lunch or dinner",
-        "health_tips": [
-            "✓ Excellent source of protein and omega-3 fatty acids",
-            "✓ Steaming preserves nutrients better than frying",
-            "✓ Mustard has anti-inflammatory properties",
-            "Low in carbs, suitable for diabetics"
-        ],
-        "vitamins": "Omega-3, Protein, Vitamin D, Selenium",
-        "serving_size": "100g",
-        "popular_variants": "Ilish Bhapa, Rui Bhapa, Pabda Bhapa"
-    },
-    "burger": {
-        "calories": 295, "protein": 17.0, "carbs": 24.0, "fat": 14.0, "fiber": 1.5,
-        "description": "Grilled or fried patty in a bun with vegetables and sauces",
-        "origin": "Urban areas, popular fast food in Dhaka and Chittagong",
-        "preparation": "Grilled or fried beef/chicken patty served in a bun with lettuce, tomato, onion, cheese, and sauces. Local variations include spicy chicken and beef burgers.",
-        "best_time": "Snacks, lunch, dinner",
-        "health_tips": [
-            "⚠️ High in calories and saturated fat",
-            "Choose grilled over fried patties",
-            "Add more vegetables for fiber",
-            "Limit consumption to occasional treats"
-        ],
-        "vitamins": "B vitamins, Iron, Protein",
-        "serving_size": "100g",
-        "popular_variants": "Chicken Burger, Beef Burger, Veggie Burger"
-    },
-    "chicken": {
-        "calories": 165, "protein": 31.0, "carbs": 0.0, "fat": 3.6, "fiber": 0.0,
-        "description": "Versatile poultry - prepared in various ways",
-        "origin": "Widely consumed across Bangladesh",
-        "preparation": "Can be prepared in various ways - curry, roasted, fried, or grilled. Common preparation includes cooking with onions, garlic, ginger, and spices.",
-        "best_time": "Any meal",
-        "health_tips": [
-            "✓ Excellent lean protein source",
-            "✓ Low in fat when skinless",
-            "✓ Rich in vitamins B6 and B12",
-            "Choose grilled or boiled over fried preparations"
-        ],
-        "vitamins": "B6, B12, Niacin, Selenium, Phosphorus",
-        "serving_size": "100g",
-        "popular_variants": "Chicken Curry, Roast, Grilled, Fried"
-    },
-    "chicken_roast": {
-        "calories": 280, "protein": 26.5, "carbs": 5.5, "fat": 17.0, "fiber": 0.8,
-        "description": "Deep-fried chicken in rich spiced gravy with potatoes and eggs",
-        "origin": "Popular in Dhaka and urban areas, wedding/party dish",
-        "preparation": "Chicken marinated in yogurt, ginger-garlic paste, and spices, then deep-fried and cooked in a rich gravy with potatoes, eggs, and aromatic spices.",
-        "best_time": "Special occasions, parties, weddings",
-        "health_tips": [
-            "⚠️ High in calories and fat due to frying",
-            "✓ Good protein content",
-            "Consume in moderation",
-            "Remove excess oil before eating"
-        ],
-        "vitamins": "B vitamins, Iron, Protein",
-        "serving_size": "100g",
-        "popular_variants": "Spicy Roast, Mild Roast, Hotel Style"
-    },
-    "chingri_vuna": {
-        "calories": 195, "protein": 24.0, "carbs": 6.5, "fat": 8.5, "fiber": 1.5,
-        "description": "Prawns sautéed with spices in thick masala",
-        "origin": "Coastal areas - Khulna, Barisal, Chittagong",
-        "preparation": "Prawns sautéed with onions, garlic, ginger, tomatoes, and spices in mustard oil. Cooked until the masala thickens and coats the prawns.",
-        "best_time": "Lunch or dinner",
-        "health_tips": [
-            "✓ Excellent source of protein and omega-3",
-            "✓ Rich in selenium and vitamin B12",
-            "✓ Low in carbohydrates",
-            "⚠️ High in cholesterol - consume moderately if at risk"
-        ],
-        "vitamins": "Omega-3, B12, Selenium, Protein",
-        "serving_size": "100g",
-        "popular_variants": "Bagda Chingri, Galda Chingri, Chingri Malai"
-    },
-    "chomchom": {
-        "calories": 350, "protein": 6.5, "carbs": 52.0, "fat": 13.0, "fiber": 0.2,
-        "description": "Oval-shaped cottage cheese sweet soaked in sugar syrup",
-        "origin": "Tangail and Porabari are famous for authentic Chomchom",
-        "preparation": "Made from chhana (cottage cheese) mixed with semolina, shaped into ovals, and soaked in sugar syrup flavored with cardamom and rose water.",
-        "best_time": "Dessert, festivals, celebrations",
-        "health_tips": [
-            "⚠️ Very high in sugar and calories",
-            "⚠️ Not suitable for diabetics",
-            "Consume as an occasional treat only",
-            "Contains some protein from milk"
-        ],
-        "vitamins": "Calcium, Protein",
-        "serving_size": "100g",
-        "popular_variants": "Tangail Chomchom, Porabari Chomchom"
-    },
-    "chowmein": {
-        "calories": 198, "protein": 6.5, "carbs": 28.5, "fat": 6.8, "fiber": 2.4,
-        "description": "Stir-fried noodles with vegetables and meat",
-        "origin": "Popular street food in Dhaka, Chittagong, and Sylhet",
-        "preparation": "Stir-fried noodles with vegetables (cabbage, carrots, capsicum), chicken or egg, and soy sauce. Cooked on high heat in a wok.",
-        "best_time": "Lunch, dinner, snacks",
-        "health_tips": [
-            "✓ Moderate calorie content",
-            "✓ Contains vegetables providing vitamins",
-            "Choose whole wheat noodles for more fiber",
-            "Control oil quantity to reduce fat"
-        ],
-        "vitamins": "B vitamins, Vitamin A, Iron",
-        "serving_size": "100g",
-        "popular_variants": "Chicken Chowmein, Vegetable Chowmein, Egg Chowmein"
-    },
-    "dal": {
-        "calories": 116, "protein": 9.0, "carbs": 20.0, "fat": 0.5, "fiber": 7.9,
-        "description": "Lentil soup - the heart of Bengali meals, cooked with turmeric and spices",
-        "origin": "Staple food across all regions of Bangladesh",
-        "preparation": "Lentils boiled with turmeric and salt, then tempered with onions, garlic, and spices fried in oil. Common varieties include masoor, moong, and chana dal.",
-        "best_time": "Every meal - breakfast, lunch, dinner",
-        "health_tips": [
-            "✓ Excellent plant-based protein source",
-            "✓ High in fiber, aids digestion",
-            "✓ Rich in iron and folate",
-            "✓ Low in fat and calories",
-            "Perfect for vegetarians and weight management"
-        ],
-        "vitamins": "Folate, Iron, Magnesium, Potassium, Zinc",
-        "serving_size": "100g",
-        "popular_variants": "Masoor Dal, Moong Dal, Chana Dal, Mixed Dal"
-    },
-    "egg_curry": {
-        "calories": 185, "protein": 11.5, "carbs": 8.5, "fat": 12.0, "fiber": 2.1,
-        "description": "Hard-boiled eggs in spiced tomato-onion gravy",
-        "origin": "Popular across Bangladesh, especially as a breakfast item",
-        "preparation": "Boiled eggs cooked in onion-tomato gravy with ginger, garlic, and spices (turmeric, cumin, coriander, chili powder). Often garnished with coriander leaves.",
-        "best_time": "Any meal - common breakfast with paratha",
-        "health_tips": [
-            "✓ Good source of complete protein",
-            "✓ Contains vitamins A, D, E, and B12",
-            "✓ Affordable protein option",
-            "⚠️ Moderate fat content - control oil quantity"
-        ],
-        "vitamins": "B12, D, A, Choline, Selenium",
-        "serving_size": "100g",
-        "popular_variants": "Dim Bhuna, Dimer Dalna, Egg Masala"
-    },
-    "french_fries": {
-        "calories": 312, "protein": 3.4, "carbs": 41.0, "fat": 15.0, "fiber": 3.8,
-        "description": "Deep-fried potato strips",
-        "origin": "Urban fast food centers across Bangladesh",
-        "preparation": "Potatoes cut into strips and deep-fried until golden and crispy. Often seasoned with salt and served with ketchup or mayonnaise.",
-        "best_time": "Snacks",
-        "health_tips": [
-            "⚠️ High in calories and unhealthy fats",
-            "⚠️ Deep-fried, increases trans fat content",
-            "Contains acrylamide when overcooked",
-            "Limit consumption to occasional treats",
-            "Baked version is a healthier alternative"
-        ],
-        "vitamins": "Potassium, Vitamin C",
-        "serving_size": "100g",
-        "popular_variants": "Crispy Fries, Curly Fries, Wedges"
-    },
-    "fried_chicken": {
-        "calories": 320, "protein": 24.0, "carbs": 12.5, "fat": 20.0, "fiber": 0.8,
-        "description": "Crispy battered and deep-fried chicken",
-        "origin": "Popular fast food in Dhaka, Chittagong, and Sylhet",
-        "preparation": "Chicken pieces marinated in spices, coated with flour batter, and deep-fried until crispy. Local versions include spicy marinades with chili and garlic.",
-        "best_time": "Lunch, dinner, snacks",
-        "health_tips": [
-            "⚠️ Very high in calories and fat",
-            "✓ Good protein content",
-            "Remove skin to reduce fat",
-            "Consume rarely, choose grilled alternatives",
-            "High sodium content"
-        ],
-        "vitamins": "B vitamins, Protein",
-        "serving_size": "100g",
-        "popular_variants": "Spicy Fried Chicken, Crispy Chicken, Wings"
-    },
-    "fuchka": {
-        "calories": 125, "protein": 3.8, "carbs": 22.0, "fat": 2.5, "fiber": 2.8,
-        "description": "Crispy hollow puris with spiced tamarind water",
-        "origin": "Street food popular everywhere, especially Dhaka and Chittagong",
-        "preparation": "Crispy hollow puris filled with spiced tamarind water, boiled chickpeas, potatoes, onions, and coriander. The tangy, spicy water is the key element.",
-        "best_time": "Evening snacks",
-        "health_tips": [
-            "✓ Relatively low in calories",
-            "⚠️ Hygiene concerns with street vendors",
-            "Ensure clean water is used",
-            "Good source of carbs for energy",
-            "Tamarind aids digestion"
-        ],
-        "vitamins": "Vitamin C, Iron",
-        "serving_size": "100g",
-        "popular_variants": "Fuchka, Puchka, Golgappa"
-    },
-    "jalebi": {
-        "calories": 425, "protein": 3.5, "carbs": 65.0, "fat": 16.0, "fiber": 0.5,
-        "description": "Deep-fried spiral-shaped sweet soaked in sugar syrup",
-        "origin": "Popular sweet across Bangladesh, especially during festivals",
-        "preparation": "Batter made from refined flour fermented overnight, then piped in circular shapes into hot oil and deep-fried. Immediately soaked in sugar syrup flavored with cardamom and saffron.",
-        "best_time": "Special occasions, festivals, weddings",
-        "health_tips": [
-            "⚠️ Extremely high in sugar and calories",
-            "⚠️ Deep-fried, high in unhealthy fats",
-            "⚠️ Not suitable for diabetics",
-            "Consume only on special occasions",
-            "Can cause blood sugar spikes"
-        ],
-        "vitamins": "Minimal nutritional value",
-        "serving_size": "100g",
-        "popular_variants": "Crispy Jalebi, Paneer Jalebi, Imarti"
-    },
-    "jhalmuri": {
-        "calories": 280, "protein": 6.5, "carbs": 52.0, "fat": 5.5, "fiber": 4.2,
-        "description": "Spicy puffed rice snack with vegetables and peanuts",
-        "origin": "Popular street snack in Dhaka, Chittagong, and all urban areas",
-        "preparation": "Puffed rice mixed with chopped onions, tomatoes, green chilies, mustard oil, chanachur, peanuts, and coriander. Seasoned with salt and lime juice.",
-        "best_time": "Evening snacks",
-        "health_tips": [
-            "✓ Low in fat and calories",
-            "✓ Good source of fiber",
-            "✓ Contains vegetables and peanuts",
-            "⚠️ Watch portion size as it's easy to overeat",
-            "Nutritious evening snack option"
-        ],
-        "vitamins": "Vitamin C, Iron, Fiber",
-        "serving_size": "100g",
-        "popular_variants": "Masala Muri, Chanachur Muri"
-    },
-    "kotkoti": {
-        "calories": 405, "protein": 7.2, "carbs": 48.0, "fat": 21.0, "fiber": 1.8,
-        "description": "Traditional Bengali sweet made from dried milk and sugar",
-        "origin": "Traditional Bengali sweet from Murshidabad and Dhaka",
-        "preparation": "Made from khoya (dried milk), sugar, and ghee. Mixture is cooked until thick, shaped into round balls, and garnished with nuts or coconut.",
-        "best_time": "Dessert, festivals",
-        "health_tips": [
-            "⚠️ Very high in calories and fat",
-            "⚠️ High sugar content",
-            "Contains some calcium from milk",
-            "Consume sparingly as a festive treat",
-            "Not suitable for weight loss diets"
-        ],
-        "vitamins": "Calcium, Protein",
-        "serving_size": "100g",
-        "popular_variants": "Milk Kotkoti, Khoya Sweets"
-    },
-    "morog_polao": {
-        "calories": 215, "protein": 12.5, "carbs": 28.0, "fat": 6.5, "fiber": 1.2,
-        "description": "Fragrant rice cooked with chicken and aromatic spices",
-        "origin": "Wedding and festive dish, popular in Dhaka and Old Bengal regions",
-        "preparation": "Basmati rice cooked with chicken, ghee, yogurt, onions, and aromatic spices (cinnamon, cardamom, bay leaves, cloves). Chicken is first marinated and then layered with rice.",
-        "best_time": "Special occasions, weddings, lunch",
-        "health_tips": [
-            "✓ Balanced meal with protein and carbs",
-            "✓ Aromatic spices aid digestion",
-            "⚠️ Moderate fat due to ghee",
-            "Control portion size",
-            "Good source of energy for special occasions"
-        ],
-        "vitamins": "B vitamins, Iron, Protein",
-        "serving_size": "100g",
-        "popular_variants": "Morog Polao, Chicken Polao"
-    },
-    "mutton_leg_roast": {
-        "calories": 340, "protein": 26.0, "carbs": 8.5, "fat": 23.0, "fiber": 1.5,
-        "description": "Slow-roasted mutton leg in rich spiced gravy",
-        "origin": "Special occasion dish in Dhaka and urban areas",
-        "preparation": "Mutton leg marinated with yogurt, spices, and herbs, then slow-roasted or pressure-cooked. Finished with fried onions, boiled eggs, and potatoes in a rich gravy.",
-        "best_time": "Special occasions, weddings, celebrations",
-        "health_tips": [
-            "⚠️ High in calories and saturated fat",
-            "✓ Excellent protein source",
-            "✓ Rich in iron and zinc",
-            "Consume in small portions",
-            "Remove visible fat before eating"
-        ],
-        "vitamins": "B12, Iron, Zinc, Protein",
-        "serving_size": "100g",
-        "popular_variants": "Slow Roast, Pressure Cooked, Oven Roasted"
-    },
-    "paratha": {
-        "calories": 320, "protein": 6.8, "carbs": 42.0, "fat": 14.0, "fiber": 2.2,
-        "description": "Layered flatbread with oil or ghee",
-        "origin": "Popular breakfast item across Bangladesh",
-        "preparation": "Wheat flour dough layered with oil or ghee, rolled thin, and cooked on a griddle until golden and flaky. Can be plain or stuffed with vegetables, eggs, or meat.",
-        "best_time": "Breakfast",
-        "health_tips": [
-            "⚠️ High in calories and fat",
-            "✓ Provides energy for the day",
-            "Whole wheat version is healthier",
-            "Pair with vegetables for balanced nutrition",
-            "Control oil quantity during cooking"
-        ],
-        "vitamins": "B vitamins, Iron, Magnesium",
-        "serving_size": "100g",
-        "popular_variants": "Plain Paratha, Aloo Paratha, Egg Paratha, Mughlai Paratha"
-    },
-    "pera_sondesh": {
-        "calories": 365, "protein": 8.5, "carbs": 55.0, "fat": 12.0, "fiber": 0.3,
-        "description": "Soft cottage cheese sweet shaped into rounds",
-        "origin": "Originated in West Bengal, popular in Dhaka and across Bangladesh",
-        "preparation": "Chhana (cottage cheese) kneaded with sugar and cooked until thick. Shaped into small round sweets and garnished with nuts or cardamom.",
-        "best_time": "Dessert, festivals",
-        "health_tips": [
-            "⚠️ High in sugar and calories",
-            "✓ Contains protein from milk",
-            "✓ Source of calcium",
-            "Consume in moderation",
-            "Better than deep-fried sweets"
-        ],
-        "vitamins": "Calcium, Protein",
-        "serving_size": "100g",
-        "popular_variants": "Sandesh, Kachagolla, Nolen Gurer Sandesh"
-    },
-    "peyaju": {
-        "calories": 285, "protein": 6.2, "carbs": 35.0, "fat": 13.0, "fiber": 3.5,
-        "description": "Onion and lentil fritters",
-        "origin": "Popular iftar item during Ramadan, common across Bangladesh",
-        "preparation": "Sliced onions mixed with lentils (dal), rice flour, spices, and green chilies, formed into fritters and deep-fried until crispy.",
-        "best_time": "Iftar, evening snacks",
-        "health_tips": [
-            "⚠️ Deep-fried, high in calories",
-            "✓ Contains onions with antioxidants",
-            "✓ Lentils provide protein",
-            "Drain excess oil before eating",
-            "Good energy source for breaking fast"
-        ],
-        "vitamins": "Protein, Fiber, Iron",
-        "serving_size": "100g",
-        "popular_variants": "Onion Peyaju, Mixed Dal Peyaju"
-    },
-    "pizza": {
-        "calories": 285, "protein": 12.0, "carbs": 36.0, "fat": 10.0, "fiber": 2.3,
-        "description": "Baked dough base with cheese, sauce, and toppings",
-        "origin": "Urban fast food centers, popular in Dhaka and Chittagong",
-        "preparation": "Dough base topped with tomato sauce, cheese, and various toppings (vegetables, chicken, beef), baked in an oven until cheese melts and crust is crispy.",
-        "best_time": "Lunch, dinner, parties",
-        "health_tips": [
-            "⚠️ High in calories and sodium",
-            "✓ Contains calcium from cheese",
-            "Choose thin crust and more vegetables",
-            "Limit cheese and processed meats",
-            "Consume occasionally"
-        ],
-        "vitamins": "Calcium, Protein, B vitamins",
-        "serving_size": "100g",
-        "popular_variants": "Margherita, Pepperoni, Chicken Pizza, Veggie Pizza"
-    },
-    "puli_pitha": {
-        "calories": 265, "protein": 5.8, "carbs": 45.0, "fat": 7.5, "fiber": 2.1,
-        "description": "Rice flour dumplings with sweet coconut filling",
-        "origin": "Traditional winter dessert across rural and urban Bangladesh",
-        "preparation": "Rice flour dough shaped into dumplings, filled with sweet coconut and jaggery mixture, then steamed or boiled in sweetened milk.",
-        "best_time": "Winter season, dessert",
-        "health_tips": [
-            "✓ Steamed, not fried - healthier option",
-            "✓ Contains coconut with healthy fats",
-            "⚠️ High in sugar from jaggery",
-            "Traditional winter comfort food",
-            "Good source of quick energy"
-        ],
-        "vitamins": "Iron (from jaggery), Fiber",
-        "serving_size": "100g",
-        "popular_variants": "Dudh Puli, Chitoi Pitha, Patishapta"
-    },
-    "rice": {
-        "calories": 130, "protein": 2.7, "carbs": 28.0, "fat": 0.3, "fiber": 0.4,
-        "description": "Staple grain of Bangladesh",
-        "origin": "Staple food across entire Bangladesh",
-        "preparation": "Rice grains washed and boiled in water until soft. Can be cooked plain or with salt. Brown rice is also becoming popular.",
-        "best_time": "Every meal - breakfast, lunch, dinner",
-        "health_tips": [
-            "✓ Primary energy source",
-            "✓ Gluten-free grain",
-            "✓ Easy to digest",
-            "Choose brown rice for more fiber",
-            "Control portion size for weight management",
-            "Pair with dal and vegetables for balanced meal"
-        ],
-        "vitamins": "B vitamins, Manganese",
-        "serving_size": "100g",
-        "popular_variants": "White Rice, Brown Rice, Basmati Rice"
-    },
-    "roshmalai": {
-        "calories": 340, "protein": 7.5, "carbs": 48.0, "fat": 14.0, "fiber": 0.2,
-        "description": "Soft cheese patties in sweetened, thickened milk with cardamom",
-        "origin": "Comilla is famous for authentic Roshmalai",
-        "preparation": "Chhana (cottage cheese) shaped into flat discs, boiled in sugar syrup, then soaked in sweetened, cardamom-flavored condensed milk. Garnished with pistachios.",
-        "best_time": "Dessert, special occasions, Eid",
-        "health_tips": [
-            "⚠️ Very high in sugar and calories",
-            "✓ Contains protein and calcium from milk",
-            "⚠️ High in saturated fat",
-            "Consume as an occasional dessert",
-            "Not suitable for diabetics"
-        ],
-        "vitamins": "Calcium, Protein, Vitamin D, B12",
-        "serving_size": "100g",
-        "popular_variants": "Rasgulla, Chamcham, Comilla Roshmalai"
-    },
-    "rupchanda_fry": {
-        "calories": 245, "protein": 22.0, "carbs": 8.5, "fat": 14.0, "fiber": 0.8,
-        "description": "Fried pomfret fish",
-        "origin": "Popular in coastal regions and urban restaurants",
-        "preparation": "Pomfret fish marinated with turmeric, chili powder, salt, and lemon juice, coated with flour or semolina, and shallow or deep-fried until golden and crispy.",
-        "best_time": "Lunch or dinner",
-        "health_tips": [
-            "✓ Excellent source of protein",
-            "✓ Rich in omega-3 fatty acids",
-            "✓ Contains vitamin D and selenium",
-            "⚠️ Frying increases calorie content",
-            "Choose shallow frying over deep frying"
-        ],
-        "vitamins": "Omega-3, Vitamin D, Selenium, B12",
-        "serving_size": "100g",
-        "popular_variants": "Pomfret Fry, Silver Pomfret"
-    },
-    "shami_kabab": {
-        "calories": 255, "protein": 18.5, "carbs": 12.0, "fat": 15.0, "fiber": 2.5,
-        "description": "Minced meat patties with chana dal",
-        "origin": "Mughlai dish popular in Dhaka, especially Old Dhaka",
-        "preparation": "Minced meat (beef or mutton) cooked with chana dal, onions, ginger, garlic, and spices until soft. Mashed, shaped into patties, and shallow-fried.",
-        "best_time": "Snacks, iftar, dinner appetizer",
-        "health_tips": [
-            "✓ High protein content",
-            "✓ Contains dal providing fiber",
-            "⚠️ Moderate to high fat content",
-            "Good source of iron and zinc",
-            "Choose lean meat to reduce fat"
-        ],
-        "vitamins": "B12, B6, Iron, Zinc, Protein",
-        "serving_size": "100g",
-        "popular_variants": "Shami Kabab, Chapli Kabab, Seekh Kabab"
-    },
-    "shawarma": {
-        "calories": 265, "protein": 16.5, "carbs": 22.0, "fat": 12.0, "fiber": 2.8,
-        "description": "Grilled meat wrapped in flatbread with vegetables",
-        "origin": "Popular street and fast food in Dhaka and Chittagong",
-        "preparation": "Marinated chicken or beef grilled on a vertical rotisserie, thinly sliced, and wrapped in flatbread with vegetables, pickles, and garlic sauce or tahini.",
-        "best_time": "Lunch, dinner, snacks",
-        "health_tips": [
-            "✓ Good protein source",
-            "✓ Contains vegetables",
-            "⚠️ Sauces add extra calories",
-            "Choose chicken over beef for less fat",
-            "Request less sauce to reduce calories"
-        ],
-        "vitamins": "B vitamins, Protein, Fiber",
-        "serving_size": "100g",
-        "popular_variants": "Chicken Shawarma, Beef Shawarma, Mixed Shawarma"
-    },
-    "shorshe_ilish": {
-        "calories": 310, "protein": 20.5, "carbs": 4.5, "fat": 24.0, "fiber": 1.5,
-        "description": "Hilsa fish cooked in mustard sauce - National dish",
-        "origin": "National dish of Bangladesh, especially popular in rainy season",
-        "preparation": "Hilsa fish cooked in mustard paste gravy with green chilies, turmeric, and mustard oil. The mustard paste is the key ingredient giving the dish its signature flavor.",
-        "best_time": "Lunch or dinner, especially during monsoon",
-        "health_tips": [
-            "✓ Extremely rich in omega-3 fatty acids",
-            "✓ Excellent protein source",
-            "✓ Mustard has anti-inflammatory properties",
-            "✓ Good for heart health",
-            "⚠️ High in fat (healthy fats)",
-            "Contains small bones - eat carefully"
-        ],
-        "vitamins": "Omega-3, Vitamin D, B12, Selenium",
-        "serving_size": "100g",
-        "popular_variants": "Shorshe Ilish, Ilish Bhapa, Ilish Bhaja"
-    },
-    "singara": {
-        "calories": 262, "protein": 5.5, "carbs": 32.0, "fat": 12.5, "fiber": 3.2,
-        "description": "Triangular fried pastry with spiced potato filling",
-        "origin": "Popular snack across Bangladesh, especially as tea-time snack",
-        "preparation": "Triangular pastry filled with spiced potatoes, peas, onions, and sometimes minced meat. Deep-fried until golden and crispy.",
-        "best_time": "Evening snack with tea",
-        "health_tips": [
-            "⚠️ Deep-fried, high in calories",
-            "✓ Contains vegetables providing fiber",
-            "Drain excess oil before eating",
-            "Baked version is a healthier option",
-            "Popular tea-time snack in moderation"
-        ],
-        "vitamins": "Vitamin C, B vitamins, Potassium",
-        "serving_size": "100g",
-        "popular_variants": "Aloo Shingara, Beef Shingara, Mixed Shingara"
-    },
-    "tea": {
-        "calories": 35, "protein": 0.5, "carbs": 7.0, "fat": 1.2, "fiber": 0.0,
-        "description": "Most popular beverage in Bangladesh",
-        "origin": "Most popular beverage across all regions of Bangladesh",
-        "preparation": "Black tea leaves boiled with water, milk, and sugar. Some add ginger, cardamom, or cinnamon for flavor. Sylhet region is famous for seven-layer tea.",
-        "best_time": "Any time - morning, afternoon, evening",
-        "health_tips": [
-            "✓ Contains antioxidants from tea leaves",
-            "✓ May boost metabolism",
-            "⚠️ Excess sugar adds empty calories",
-            "Reduce sugar for health benefits",
-            "Green tea is a healthier alternative",
-            "Limit to 2-3 cups daily"
-        ],
-        "vitamins": "Antioxidants, Caffeine",
-        "serving_size": "100ml (with milk and sugar)",
-        "popular_variants": "Black Tea, Milk Tea, Seven-Layer Tea, Green Tea"
-    },
-    "tikka": {
-        "calories": 220, "protein": 24.0, "carbs": 6.5, "fat": 11.0, "fiber": 1.2,
-        "description": "Grilled marinated chicken pieces",
-        "origin": "Popular appetizer in restaurants across Bangladesh",
-        "preparation": "Chicken pieces marinated in yogurt, lemon juice, ginger-garlic paste, and spices (cumin, coriander, garam masala), then grilled or baked in a tandoor oven.",
-        "best_time": "Appetizer, snacks, dinner",
-        "health_tips": [
-            "✓ High protein, low carb option",
-            "✓ Grilled/baked, not fried - healthier",
-            "✓ Yogurt marinade aids digestion",
-            "✓ Good for muscle building",
-            "Excellent choice for weight management"
-        ],
-        "vitamins": "B vitamins, Protein, Selenium",
-        "serving_size": "100g",
-        "popular_variants": "Chicken Tikka, Tikka Masala, Tandoori Tikka"
-    }
-}
+IMAGENET_MEAN = torch.tensor([0.485, 0.456, 0.406]).view(1, 3, 1, 1)
+IMAGENET_STD = torch.tensor([0.229, 0.224, 0.225]).view(1, 3, 1, 1)
 
-# ============================================
-# MODEL FUNCTIONS
-# ============================================
-def detect_model_architecture(state_dict):
-    """Auto-detect model architecture from state_dict keys"""
-    keys = list(state_dict.keys())
-    
-    if any('features.' in k and 'block' in k for k in keys):
-        num_params = sum(p.numel() for p in state_dict.values())
-        return "EfficientNet-B3" if num_params > 10_000_000 else "EfficientNet-B0"
-    
-    if any('denseblock' in k for k in keys):
-        return "DenseNet-121"
-    
-    if any('layer1' in k for k in keys):
-        return "ResNet-50" if any('conv3' in k for k in keys) else "ResNet-18"
-    
-    return "Unknown"
+# Fixed augmentation parameters so TTA results are reproducible (and therefore cacheable)
+TTA_ROTATION_DEGREES = 5.0
+TTA_BRIGHTNESS = 1.1
+TTA_CONTRAST = 1.1
+TTA_CROP_SCALE = 0.95
+TTA_VIEWS = ["original", "horizontal_flip", "rotation", "color_jitter", "crop"]
 
-@st.cache_resource
-def load_model(model_path, class_names_path):
-    """Load trained model with auto-detection"""
-    with open(class_names_path, 'r') as f:
-        class_dict = json.load(f)
-    class_names = [class_dict[str(i)] for i in range(len(class_dict))]
-    num_classes = len(class_names)
+def build_tta_batch(image, num_views=5):
+    """Build the original image and its TTA views as one normalized (N, 3, 224, 224) tensor
     
-    state_dict = torch.load(model_path, map_location=torch.device('cpu'))
-    detected_arch = detect_model_architecture(state_dict)
-    
-    if "ResNet-18" in detected_arch:
-        model = models.resnet18(weights=None)
-        model.fc = nn.Linear(model.fc.in_features, num_classes)
-    elif "ResNet-50" in detected_arch:
-        model = models.resnet50(weights=None)
-        model.fc = nn.Linear(model.fc.in_features, num_classes)
-    elif "EfficientNet-B0" in detected_arch:
-        model = models.efficientnet_b0(weights=None)
-        model.classifier[1] = nn.Linear(model.classifier[1].in_features, num_classes)
-    elif "EfficientNet-B3" in detected_arch:
-        model = models.efficientnet_b3(weights=None)
-        model.classifier[1] = nn.Linear(model.classifier[1].in_features, num_classes)
-    elif "DenseNet" in detected_arch:
-        model = models.densenet121(weights=None)
-        model.classifier = nn.Linear(model.classifier.in_features, num_classes)
-    else:
-        raise ValueError(f"Unknown architecture: {detected_arch}")
+    Views (in order): original, horizontal flip, slight rotation, brightness/contrast jitter
+    and a center crop. Every view is derived from the same decoded uint8 tensor, and
+    normalization is applied once to the stacked batch.
+    """
+    img = TF.pil_to_tensor(image)
+    base = TF.resize(img, [224, 224], antialias=True)
+    views = [base]
     
-    model.load_state_dict(state_dict)
-    model.eval()
+    if num_views > 1:
+        views.append(TF.hflip(base))
+    if num_views > 2:
+        rotated = TF.rotate(TF.resize(img, [240, 240], antialias=True), TTA_ROTATION_DEGREES)
+        views.append(TF.center_crop(rotated, 224))
+    if num_views > 3:
+        views.append(TF.adjust_contrast(TF.adjust_brightness(base, TTA_BRIGHTNESS), TTA_CONTRAST))
+    if num_views > 4:
+        crop_size = int(round(256 * TTA_CROP_SCALE ** 0.5))
+        cropped = TF.center_crop(TF.resize(img, [256, 256], antialias=True), crop_size)
+        views.append(TF.resize(cropped, [224, 224], antialias=True))
     
-    return model, class_names, detected_arch
+    batch = torch.stack(views).float().div_(255.0)
+    return batch.sub_(IMAGENET_MEAN).div_(IMAGENET_STD)
 
-def predict_food(image, model, class_names, use_tta=True, num_augmentations=5, confidence_threshold=60.0):
-    """Predict food class from image with Test-Time Augmentation (TTA) and confidence validation
+def classify_views(view_batches, model, confidence_threshold=None, stats=None):
+    """Average class probabilities over each image's TTA views
     
-    Args:
-        image: PIL Image
-        model: PyTorch model
-        class_names: List of class names
-        use_tta: Whether to use test-time augmentation (default: True)
-        num_augmentations: Number of augmentations for TTA (default: 5)
-        confidence_threshold: Minimum confidence to accept prediction (default: 50.0%)
+    Returns a (num_images, num_classes) tensor and, per image, whether all of its views
+    were used (False when adaptive TTA skipped the extra views of a confident image).
     
-    Returns:
-        predicted_class: str - Predicted food class or "UNKNOWN"
-        confidence_score: float - Confidence percentage
-        top3: list - Top 3 predictions with confidence
-        is_valid: bool - Whether prediction meets confidence threshold
+    view_batches holds one (num_views, 3, 224, 224) batch per image, original view first.
+    Without a threshold every view of every image runs in one forward pass. With one
+    (adaptive TTA), only the original views run first; the extra views run in a second
+    batched pass for just the images whose confidence is below the threshold.
+    
+    stats, if given, counts "images", "escalated" (images that needed the extra views),
+    "views_run" and "views_full" (views a full TTA pass would have run).
     """
-    # Base transform
-    base_transform = transforms.Compose([
-        transforms.Resize((224, 224)),
-        transforms.ToTensor(),
-        transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
-    ])
+    num_views = view_batches[0].shape[0]
     
-    if not use_tta:
-        # Standard prediction without TTA
-        img_tensor = base_transform(image).unsqueeze(0)
-        with torch.no_grad():
-            outputs = model(img_tensor)
-            probabilities = torch.nn.functional.softmax(outputs, dim=1)
-    else:
-        # Test-Time Augmentation for better accuracy
-        all_predictions = []
-        
-        # Original prediction
-        img_tensor = base_transform(image).unsqueeze(0)
-        with torch.no_grad():
-            outputs = model(img_tensor)
-            all_predictions.append(torch.nn.functional.softmax(outputs, dim=1))
-        
-        # Augmented predictions
-        tta_transforms = [
-            # Horizontal flip
-            transforms.Compose([
-                transforms.Resize((224, 224)),
-                transforms.RandomHorizontalFlip(p=1.0),
-                transforms.ToTensor(),
-                transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
-            ]),
-            # Slight rotation
-            transforms.Compose([
-                transforms.Resize((240, 240)),
-                transforms.RandomRotation(10),
-                transforms.CenterCrop(224),
-                transforms.ToTensor(),
-                transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
-            ]),
-            # Color jitter
-            transforms.Compose([
-                transforms.Resize((224, 224)),
-                transforms.ColorJitter(brightness=0.2, contrast=0.2),
-                transforms.ToTensor(),
-                transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
-            ]),
-            # Random crop
-            transforms.Compose([
-                transforms.Resize((256, 256)),
-                transforms.RandomResizedCrop(224, scale=(0.9, 1.0)),
-                transforms.ToTensor(),
-                transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
-            ])
-        ]
-        
-        # Apply augmentations and get predictions
-        for i, tta_transform in enumerate(tta_transforms[:num_augmentations-1]):
-            try:
-                img_aug = tta_transform(image).unsqueeze(0)
-                with torch.no_grad():
-                    outputs = model(img_aug)
-                    all_predictions.append(torch.nn.functional.softmax(outputs, dim=1))
-            except Exception:
-                continue  # Skip if augmentation fails
-        
-        # Average predictions from all augmentations
-        probabilities = torch.stack(all_predictions).mean(dim=0)
+    with torch.no_grad():
+        if confidence_threshold is None or num_views == 1:
+            outputs = model(torch.cat(view_batches))
+            probabilities = torch.nn.functional.softmax(outputs, dim=1).view(len(view_batches), num_views, -1).mean(dim=1)
+            uncertain = list(range(len(view_batches))) if num_views > 1 else []
+        else:
+            originals = torch.stack([views[0] for views in view_batches])
+            probabilities = torch.nn.functional.softmax(model(originals), dim=1)
+            uncertain = (probabilities.max(dim=1).values * 100 < confidence_threshold).nonzero().flatten().tolist()
+            if uncertain:
+                extra = torch.cat([view_batches[i][1:] for i in uncertain])
+                extra_probabilities = torch.nn.functional.softmax(model(extra), dim=1).view(len(uncertain), num_views - 1, -1)
+                for row, i in enumerate(uncertain):
+                    probabilities[i] = (probabilities[i] + extra_probabilities[row].sum(dim=0)) / num_views
     
-    confidence, predicted = torch.max(probabilities, 1)
+    adaptive = confidence_threshold is not None and num_views > 1
+    full = [not adaptive or i in uncertain for i in range(len(view_batches))]
+    
+    if stats is not None:
+        stats["images"] = stats.get("images", 0) + len(view_batches)
+        stats["escalated"] = stats.get("escalated", 0) + len(uncertain)
+        stats["views_run"] = stats.get("views_run", 0) + len(view_batches) + len(uncertain) * (num_views - 1)
+        stats["views_full"] = stats.get("views_full", 0) + len(view_batches) * num_views
+    return probabilities, full
+
+def tta_view_count(use_tta, num_augmentations):
+    """Number of TTA views to build for the given settings"""
+    return min(max(num_augmentations, 1), len(TTA_VIEWS)) if use_tta else 1
+
+def summarize_prediction(probabilities, class_names, confidence_threshold):
+    """Turn one row of class probabilities into (class, confidence %, top3, is_valid)"""
+    confidence, predicted = torch.max(probabilities, 0)
     predicted_class = class_names[predicted.item()]
     confidence_score = confidence.item() * 100
     
     # Get top 3 predictions
     top3_prob, top3_idx = torch.topk(probabilities, min(3, len(class_names)))
     top3 = [(class_names[idx.item()], prob.item() * 100) 
-            for idx, prob in zip(top3_idx[0], top3_prob[0])]
+            for idx, prob in zip(top3_idx, top3_prob)]
     
     # Validate prediction confidence
     is_valid = confidence_score >= confidence_threshold
@@ -953,26 +341,169 @@ def predict_food(image, model, class_names, use_tta=True, num_augmentations=5, c
     
     return predicted_class, confidence_score, top3, is_valid
 
-def get_nutrition(food_name):
-    """Get nutrition data for food"""
-    food_key = food_name.lower().replace(" ", "_").replace("-", "_")
+def ensemble_prediction(probabilities, class_names, confidence_threshold=60.0):
+    """Ensemble prediction over the (num_images, num_classes) probabilities of several photos of one food
+    
+    Images whose confidence meets the threshold vote for their class, weighted by confidence.
+    Cheap enough to rerun on cached probabilities whenever the threshold changes.
+    
+    Returns:
+        dict with final class, confidence, consensus top3, validity and per-image predictions
+    """
+    num_images = probabilities.shape[0]
+    confidences, predicted = probabilities.max(dim=1)
+    confidences = confidences * 100
+    valid = confidences >= confidence_threshold
+    
+    # Confidence-weighted vote among valid images
+    class_scores = torch.zeros(len(class_names)).index_add_(0, predicted[valid], confidences[valid])
+    num_valid = int(valid.sum().item())
+    final_is_valid = num_valid >= num_images * 0.5  # At least 50% valid
+    
+    if final_is_valid and num_valid > 0:
+        final_idx = int(class_scores.argmax().item())
+        final_class = class_names[final_idx]
+        final_confidence = class_scores[final_idx].item() / num_valid
+    else:
+        # Not enough valid predictions
+        final_class = "UNKNOWN"
+        final_confidence = confidences.mean().item()
+    
+    # Consensus top 3: sum each image's top-3 confidences, averaged over images
+    k = min(3, len(class_names))
+    top_prob, top_idx = torch.topk(probabilities, k, dim=1)
+    top3_scores = torch.zeros_like(probabilities).scatter_(1, top_idx, top_prob).sum(dim=0) * 100 / num_images
+    final_prob, final_idx = torch.topk(top3_scores, k)
+    final_top3 = [(class_names[idx.item()], score.item()) for idx, score in zip(final_idx, final_prob)]
     
-    for key in NUTRITION_DATA:
-        if key in food_key or food_key in key:
-            return NUTRITION_DATA[key]
+    individual_predictions = [
+        summarize_prediction(row, class_names, confidence_threshold) for row in probabilities
+    ]
     
     return {
-        "calories": 200, "protein": 8, "carbs": 25, "fat": 8, "fiber": 2,
-        "description": "Bangladeshi food item",
-        "origin": "Bangladesh",
-        "preparation": "Traditional Bengali cooking method",
-        "best_time": "Lunch or dinner",
-        "health_tips": ["Nutrition information not available in database", "Enjoy in moderation as part of a balanced diet"],
-        "vitamins": "Various nutrients",
-        "serving_size": "Standard serving",
-        "popular_variants": "Multiple regional variations"
+        'class': final_class,
+        'confidence': final_confidence,
+        'top3': final_top3,
+        'multi_image': True,
+        'num_images': num_images,
+        'individual_predictions': individual_predictions,
+        'is_valid': final_is_valid
     }
 
+def get_nutrition(food_name):
+    """Nutrition record for a food (the generic default record if it is not in the database)"""
+    store = load_nutrition_store()
+    key, _ = store.resolve(food_name)
+    return store.records[key] if key is not None else store.default
+
+# ============================================
+# UPLOAD PREVIEWS
+# ============================================
+# Longest side of the preview images; the full image is only decoded for analysis
+THUMBNAIL_MAX_SIDE = 640
+
+def upload_digest(uploaded_file):
+    """SHA-256 of an uploaded file's bytes"""
+    return hashlib.sha256(uploaded_file.getvalue()).hexdigest()
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def load_thumbnail(digest, _data, max_side=THUMBNAIL_MAX_SIDE):
+    """Downsized JPEG preview of an upload, keyed by its hash so reruns skip the decode"""
+    image = Image.open(io.BytesIO(_data))
+    image.draft('RGB', (max_side, max_side))  # JPEGs decode directly at a reduced scale
+    image = image.convert('RGB')
+    image.thumbnail((max_side, max_side))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+def show_thumbnail(uploaded_file, digest, caption):
+    """Cached preview of an upload; digest is its upload_digest, already computed by the caller"""
+    st.image(load_thumbnail(digest, uploaded_file.getvalue()), caption=caption, use_container_width=True)
+
+def load_upload_image(uploaded_file):
+    """Full-size RGB image of an upload, for analysis"""
+    return Image.open(io.BytesIO(uploaded_file.getvalue())).convert('RGB')
+
+# ============================================
+# PROBABILITY CACHE
+# ============================================
+# Averaged class probabilities per (image hash, model version, TTA views), shared by all
+# sessions. Results are recomputed from these when the threshold changes, without the model.
+PROBABILITY_CACHE_SIZE = int(os.environ.get("PROBABILITY_CACHE_SIZE", "256"))
+
+class ProbabilityCache:
+    """LRU of per-image class probabilities
+    
+    An entry from adaptive TTA that skipped the extra views is partial: it only stands in
+    for the full result while the original view stays at or above the threshold.
+    """
+    
+    def __init__(self, max_entries):
+        self.max_entries = max(1, max_entries)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key, adaptive=False, confidence_threshold=None):
+        """Cached probabilities for key if they are valid for these TTA settings, else None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                probabilities, full = entry
+                if full or (adaptive and probabilities.max().item() * 100 >= confidence_threshold):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return probabilities
+            self.misses += 1
+            return None
+    
+    def put(self, key, probabilities, full=True):
+        with self._lock:
+            self._entries[key] = (probabilities, full)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+@st.cache_resource
+def load_probability_cache():
+    return ProbabilityCache(PROBABILITY_CACHE_SIZE)
+
+def upload_probabilities(uploaded_files, model, model_version, num_views, adaptive=False,
+                         confidence_threshold=60.0, stats=None, progress_callback=None, digests=None):
+    """(num_images, num_classes) probabilities of uploads, classifying only the ones not cached
+    
+    Cache misses are decoded and classified together in one batched pass.
+    """
+    cache = load_probability_cache()
+    digests = digests or [upload_digest(f) for f in uploaded_files]
+    keys = [(digest, model_version, num_views) for digest in digests]
+    rows = [cache.get(key, adaptive, confidence_threshold) for key in keys]
+    missing = [i for i, row in enumerate(rows) if row is None]
+    
+    if missing:
+        views = []
+        for done, i in enumerate(missing, 1):
+            views.append(build_tta_batch(load_upload_image(uploaded_files[i]), num_views))
+            if progress_callback:
+                progress_callback(done / (len(missing) + 1))
+        probabilities, full = classify_views(views, model, confidence_threshold if adaptive else None, stats)
+        for row, i in enumerate(missing):
+            rows[i] = probabilities[row].clone()
+            cache.put(keys[i], rows[i], full[row])
+    if progress_callback:
+        progress_callback(1.0)
+    
+    return torch.stack(rows)
+
+def build_prediction(probabilities, class_names, confidence_threshold, multi_image=False):
+    """Result dict shown in the Analysis Results panel, from cached probabilities"""
+    if multi_image:
+        return ensemble_prediction(probabilities, class_names, confidence_threshold)
+    predicted_class, confidence, top3, is_valid = summarize_prediction(probabilities[0], class_names, confidence_threshold)
+    return {'class': predicted_class, 'confidence': confidence, 'top3': top3, 'is_valid': is_valid}
+
 # ============================================
 # MAIN APP
 # ============================================
@@ -1023,11 +554,26 @@ def main():
                 value=5,
                 help="More augmentations = higher accuracy but slower"
             )
+            adaptive_tta = st.checkbox(
+                "⚡ Adaptive TTA",
+                value=False,
+                help="Classify the original view first and run the extra views only when its confidence is below the minimum confidence level"
+            )
         else:
             num_augmentations = 1
+            adaptive_tta = False
         
         st.session_state['use_tta'] = use_tta
         st.session_state['num_augmentations'] = num_augmentations
+        st.session_state['adaptive_tta'] = adaptive_tta
+        
+        tta_stats = st.session_state.get('tta_stats')
+        if adaptive_tta and tta_stats and tta_stats.get('images'):
+            st.caption(
+                f"⚡ Extra views needed for {tta_stats['escalated']}/{tta_stats['images']} images "
+                f"({tta_stats['escalated'] / tta_stats['images']:.0%}); "
+                f"{tta_stats['views_run']}/{tta_stats['views_full']} views classified"
+            )
         
         st.markdown("---")
         st.markdown("### 🎯 Confidence Settings")
@@ -1092,6 +638,7 @@ def main():
         st.info("Developed for FYDP on food classification using Deep learning")
         st.markdown("### 👥Team Members")
         st.info("Masud Rana Mamun & Momen Miah")
+    rerun_profiler.mark("header_sidebar")
     # Check model availability
     # Get the directory where this script is located
     script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -1139,10 +686,22 @@ def main():
     
     # Load model silently
     try:
-        model, class_names, detected_arch = load_model(model_path, class_path)
+        model, class_names, detected_arch, model_version = load_model(model_path, class_path, MODEL_PRECISION)
     except Exception as e:
         st.error(f"❌ Error loading model: {e}")
         return
+    if MODEL_PRECISION == "int8" and not model_version.endswith("-int8"):
+        st.warning("⚠️ INT8 model is missing, stale or below the agreement gate; using fp32 weights")
+    
+    try:
+        nutrition_store = load_nutrition_store()
+    except Exception as e:
+        st.error(f"❌ Error loading nutrition data: {e}")
+        return
+    unresolved = nutrition_store.unresolved(class_names)
+    if unresolved:
+        st.warning(f"⚠️ No nutrition entry for: {', '.join(unresolved)}")
+    rerun_profiler.mark("load_model")
     
     # Main content
     tab1, tab2 = st.tabs(["🔍 Classify Food", "📚 Food Database"])
@@ -1168,22 +727,26 @@ def main():
                     label_visibility="collapsed"
                 )
                 
-                # Clear prediction if images are removed
-                if not uploaded_images and 'prediction' in st.session_state:
-                    del st.session_state['prediction']
+                # Clear the analysis if images are removed
+                if not uploaded_images:
+                    st.session_state.pop('analysis', None)
                 
                 if uploaded_images:
                     if len(uploaded_images) > 5:
                         st.warning("⚠️ Please upload maximum 5 images. Using first 5 images only.")
                         uploaded_images = uploaded_images[:5]
                     
-                    # Display all uploaded images in a grid
+                    # Different images invalidate the previous analysis
+                    digests = [upload_digest(img_file) for img_file in uploaded_images]
+                    if st.session_state.get('analysis', {}).get('digests') != digests:
+                        st.session_state.pop('analysis', None)
+                    
+                    # Display all uploaded images in a grid (cached thumbnails, not full-size decodes)
                     st.markdown(f"**{len(uploaded_images)} image(s) uploaded:**")
                     cols = st.columns(min(len(uploaded_images), 3))
-                    for idx, img_file in enumerate(uploaded_images):
+                    for idx, (img_file, digest) in enumerate(zip(uploaded_images, digests)):
                         with cols[idx % 3]:
-                            img = Image.open(img_file).convert('RGB')
-                            st.image(img, caption=f"Image {idx+1}", use_container_width=True)
+                            show_thumbnail(img_file, digest, f"Image {idx+1}")
                     
                     st.markdown("<br>", unsafe_allow_html=True)
                     
@@ -1216,72 +779,27 @@ def main():
                         status_text = f"🧠 AI is analyzing {len(uploaded_images)} images with ensemble prediction..."
                         with st.spinner(status_text):
                             progress_bar = st.progress(0)
-                            
-                            # Predict on each image
-                            all_predictions = []
-                            all_confidences = []
-                            
                             confidence_threshold = st.session_state.get('confidence_threshold', 50.0)
+                            adaptive = st.session_state.get('adaptive_tta', False)
+                            num_views = tta_view_count(use_tta, num_aug)
                             
-                            for idx, img_file in enumerate(uploaded_images):
-                                img = Image.open(img_file).convert('RGB')
-                                pred_class, confidence, top3, is_valid = predict_food(
-                                    img, model, class_names, 
-                                    use_tta=use_tta, 
-                                    num_augmentations=num_aug,
-                                    confidence_threshold=confidence_threshold
-                                )
-                                all_predictions.append((pred_class, confidence, top3, is_valid))
-                                all_confidences.append(confidence)
-                                
-                                # Update progress
-                                progress_bar.progress((idx + 1) / len(uploaded_images))
-                                time.sleep(0.1)
-                            
+                            # All uncached images x all TTA views in one batched forward pass
+                            upload_probabilities(
+                                uploaded_images, model, model_version, num_views,
+                                adaptive=adaptive,
+                                confidence_threshold=confidence_threshold,
+                                stats=st.session_state.setdefault('tta_stats', {}) if adaptive else None,
+                                progress_callback=progress_bar.progress,
+                                digests=digests
+                            )
                             progress_bar.empty()
-                            
-                            # Check how many predictions are valid
-                            valid_predictions = [p for p in all_predictions if p[3]]
-                            
-                            # Ensemble prediction: majority vote with confidence weighting
-                            from collections import Counter
-                            pred_classes = [p[0] for p in all_predictions]
-                            
-                            # Weighted voting based on confidence (only valid predictions)
-                            class_scores = {}
-                            for pred_class, confidence, _, is_valid in all_predictions:
-                                if is_valid:  # Only count valid predictions
-                                    class_scores[pred_class] = class_scores.get(pred_class, 0) + confidence
-                            
-                            # Check if we have any valid predictions
-                            final_is_valid = len(valid_predictions) >= len(uploaded_images) * 0.5  # At least 50% valid
-                            
-                            if final_is_valid and class_scores:
-                                # Get final prediction
-                                final_class = max(class_scores.items(), key=lambda x: x[1])[0]
-                                final_confidence = class_scores[final_class] / len(valid_predictions)
-                            else:
-                                # Not enough valid predictions
-                                final_class = "UNKNOWN"
-                                final_confidence = sum(all_confidences) / len(all_confidences)
-                            
-                            # Get consensus top 3
-                            all_top3_classes = {}
-                            for _, _, top3, _ in all_predictions:
-                                for food, conf in top3:
-                                    all_top3_classes[food] = all_top3_classes.get(food, 0) + conf
-                            
-                            final_top3 = sorted(all_top3_classes.items(), key=lambda x: x[1], reverse=True)[:3]
-                            final_top3 = [(food, score/len(uploaded_images)) for food, score in final_top3]
                         
-                        st.session_state['prediction'] = {
-                            'class': final_class,
-                            'confidence': final_confidence,
-                            'top3': final_top3,
-                            'multi_image': True,
-                            'num_images': len(uploaded_images),
-                            'individual_predictions': all_predictions,
-                            'is_valid': final_is_valid
+                        st.session_state['analysis'] = {
+                            'uploads': list(uploaded_images),
+                            'digests': digests,
+                            'num_views': num_views,
+                            'adaptive': adaptive,
+                            'multi_image': True
                         }
                         st.rerun()
             
@@ -1293,13 +811,13 @@ def main():
                     label_visibility="collapsed"
                 )
                 
-                # Clear prediction if image is removed
-                if uploaded_image is None and 'prediction' in st.session_state:
-                    del st.session_state['prediction']
+                # Clear the analysis if the image is removed or replaced
+                digests = [upload_digest(uploaded_image)] if uploaded_image is not None else []
+                if st.session_state.get('analysis', {}).get('digests') != digests:
+                    st.session_state.pop('analysis', None)
                 
                 if uploaded_image:
-                    image = Image.open(uploaded_image).convert('RGB')
-                    st.image(image, caption="📸 Your uploaded image", use_container_width=True)
+                    show_thumbnail(uploaded_image, digests[0], "📸 Your uploaded image")
                     
                     st.markdown("<br>", unsafe_allow_html=True)
                     
@@ -1332,31 +850,44 @@ def main():
                         status_text = "🧠 AI is analyzing with Test-Time Augmentation..." if use_tta else "🧠 AI is analyzing..."
                         with st.spinner(status_text):
                             progress_bar = st.progress(0)
-                            for i in range(100):
-                                time.sleep(0.015 if use_tta else 0.005)
-                                progress_bar.progress(i + 1)
-                            
-                            predicted_class, confidence, top3, is_valid = predict_food(
-                                image, model, class_names, 
-                                use_tta=use_tta, 
-                                num_augmentations=num_aug,
-                                confidence_threshold=confidence_threshold
+                            adaptive = st.session_state.get('adaptive_tta', False)
+                            num_views = tta_view_count(use_tta, num_aug)
+                            upload_probabilities(
+                                [uploaded_image], model, model_version, num_views,
+                                adaptive=adaptive,
+                                confidence_threshold=confidence_threshold,
+                                stats=st.session_state.setdefault('tta_stats', {}) if adaptive else None,
+                                progress_callback=progress_bar.progress,
+                                digests=digests
                             )
                             progress_bar.empty()
                     
-                        st.session_state['prediction'] = {
-                            'class': predicted_class,
-                            'confidence': confidence,
-                            'top3': top3,
-                            'is_valid': is_valid
+                        st.session_state['analysis'] = {
+                            'uploads': [uploaded_image],
+                            'digests': digests,
+                            'num_views': num_views,
+                            'adaptive': adaptive,
+                            'multi_image': False
                         }
                         st.rerun()
         
         with col2:
             st.markdown("### Analysis Results")
             
-            if 'prediction' in st.session_state:
-                pred = st.session_state['prediction']
+            analysis = st.session_state.get('analysis')
+            if analysis:
+                # Rebuilt on every rerun from the cached probabilities, so moving the threshold
+                # never reruns the model (adaptive TTA may still need the extra views of an
+                # image whose original view falls below a raised threshold)
+                confidence_threshold = st.session_state.get('confidence_threshold', 60.0)
+                probabilities = upload_probabilities(
+                    analysis['uploads'], model, model_version, analysis['num_views'],
+                    adaptive=analysis['adaptive'],
+                    confidence_threshold=confidence_threshold,
+                    stats=st.session_state.setdefault('tta_stats', {}) if analysis['adaptive'] else None,
+                    digests=analysis['digests']
+                )
+                pred = build_prediction(probabilities, class_names, confidence_threshold, analysis['multi_image'])
                 
                 # Check if prediction is valid
                 if not pred.get('is_valid', True):
@@ -1439,52 +970,78 @@ def main():
                     st.markdown("---")
                     st.markdown("### 🍴 Food Information")
                     
-                    st.markdown(f"**📝 Description:** {nutrition['description']}")
-                    st.markdown(f"**🗺️ Origin:** {nutrition['origin']}")
-                    st.markdown(f"**⏰ Best Time:** {nutrition['best_time']}")
+                    st.markdown(f"**📝 Description:** {nutrition.description}")
+                    st.markdown(f"**🗺️ Origin:** {nutrition.origin}")
+                    st.markdown(f"**⏰ Best Time:** {nutrition.best_time}")
                     
                     st.markdown("---")
                     st.markdown("### 📊 Nutrition Facts (per 100g)")
                     
                     # Nutrition metrics
                     met_col1, met_col2, met_col3, met_col4 = st.columns(4)
-                    met_col1.metric("🔥 Calories", f"{nutrition['calories']} kcal")
-                    met_col2.metric("🥩 Protein", f"{nutrition['protein']}g")
-                    met_col3.metric("🍚 Carbs", f"{nutrition['carbs']}g")
-                    met_col4.metric("🧈 Fat", f"{nutrition['fat']}g")
+                    met_col1.metric("🔥 Calories", f"{nutrition.calories} kcal")
+                    met_col2.metric("🥩 Protein", f"{nutrition.protein}g")
+                    met_col3.metric("🍚 Carbs", f"{nutrition.carbs}g")
+                    met_col4.metric("🧈 Fat", f"{nutrition.fat}g")
                     
-                    st.markdown(f"**🥗 Fiber:** {nutrition['fiber']}g | **💊 Vitamins:** {nutrition['vitamins']}")
-                    st.info(f"**📏 Serving Size:** {nutrition['serving_size']}")
+                    st.markdown(f"**🥗 Fiber:** {nutrition.fiber}g | **💊 Vitamins:** {nutrition.vitamins}")
+                    st.info(f"**📏 Serving Size:** {nutrition.serving_size}")
                     
                     st.markdown("---")
                     st.markdown("### 👨‍🍳 How It's Made")
-                    st.markdown(f"<div class='info-section'>{nutrition['preparation']}</div>", unsafe_allow_html=True)
+                    st.markdown(f"<div class='info-section'>{nutrition.preparation}</div>", unsafe_allow_html=True)
                     
                     st.markdown("### 💡 Health Tips")
-                    # Handle health_tips as either list or string
-                    if isinstance(nutrition.get('health_tips'), list):
-                        for tip in nutrition['health_tips']:
-                            st.markdown(f"• {tip}")
-                    else:
-                        st.success(nutrition['health_tips'])
+                    for tip in nutrition.health_tips:
+                        st.markdown(f"• {tip}")
                     
                     st.markdown("### 🍽️ Popular Variants")
-                    st.markdown(f"_{nutrition['popular_variants']}_")
+                    st.markdown(f"_{nutrition.popular_variants}_")
                 
             else:
                 st.info("👆 Upload an image and click 'Analyze Food' to see results")
     
+    rerun_profiler.mark("classify_tab")
+    
     with tab2:
         st.markdown("### 📚 Complete Food Database")
         
+        search_index = load_food_search_index()
+        records = load_nutrition_store().records
+        
         # Search
-        search = st.text_input("🔍 Search food...", placeholder="e.g., biryani, fish, dal")
+        search = st.text_input("🔍 Search food...", placeholder="e.g., fish, sweet, mustard, puchka")
+        
+        # Nutrient range filters, bounded by the values in the database
+        with st.expander("🎚️ Filter by nutrients"):
+            filters = {}
+            for column, (low, high), label in zip(
+                ("calories", "protein", "carbs"),
+                search_index.ranges().values(),
+                ("Calories (kcal)", "Protein (g)", "Carbs (g)")
+            ):
+                selected = st.slider(label, min_value=float(low), max_value=float(high), value=(float(low), float(high)))
+                if selected != (low, high):
+                    filters[column] = selected
+        
+        # Back to the first page whenever the query or the filters change
+        search_signature = (search, tuple(sorted(filters.items())))
+        if st.session_state.get('food_search_signature') != search_signature:
+            st.session_state['food_search_signature'] = search_signature
+            st.session_state['food_search_page'] = 1
         
-        # Filter foods
-        foods_to_show = []
-        for food_key, food_data in NUTRITION_DATA.items():
-            if not search or search.lower() in food_key.lower() or search.lower() in food_data['description'].lower():
-                foods_to_show.append((food_key, food_data))
+        page = st.session_state['food_search_page']
+        total, keys = search_index.search(
+            search, filters, limit=FOOD_SEARCH_PAGE_SIZE, offset=(page - 1) * FOOD_SEARCH_PAGE_SIZE
+        )
+        num_pages = max(1, -(-total // FOOD_SEARCH_PAGE_SIZE))
+        foods_to_show = [(key, records[key]) for key in keys]
+        
+        if total:
+            first = (page - 1) * FOOD_SEARCH_PAGE_SIZE + 1
+            st.caption(f"Showing {first}–{first + len(keys) - 1} of {total} foods" + (" (best matches first)" if search else ""))
+        else:
+            st.info("No foods match your search.")
         
         # Display in grid
         for i in range(0, len(foods_to_show), 2):
@@ -1495,17 +1052,29 @@ def main():
                     food_key, food_data = foods_to_show[i + idx]
                     
                     with col:
-                        with st.expander(f"🍽️ **{food_key.replace('_', ' ').title()}** - {food_data['calories']} kcal"):
-                            st.markdown(f"**Description:** {food_data['description']}")
-                            st.markdown(f"**Origin:** {food_data['origin']}")
-                            st.markdown(f"**Protein:** {food_data['protein']}g | **Carbs:** {food_data['carbs']}g | **Fat:** {food_data['fat']}g")
-                            # Handle health_tips as either list or string
-                            if isinstance(food_data.get('health_tips'), list):
-                                st.markdown("**Health Tips:**")
-                                for tip in food_data['health_tips']:
-                                    st.markdown(f"  • {tip}")
-                            else:
-                                st.markdown(f"**Health Tips:** {food_data['health_tips']}")
+                        with st.expander(f"🍽️ **{food_key.replace('_', ' ').title()}** - {food_data.calories} kcal"):
+                            st.markdown(f"**Description:** {food_data.description}")
+                            st.markdown(f"**Origin:** {food_data.origin}")
+                            st.markdown(f"**Protein:** {food_data.protein}g | **Carbs:** {food_data.carbs}g | **Fat:** {food_data.fat}g")
+                            st.markdown("**Health Tips:**")
+                            for tip in food_data.health_tips:
+                                st.markdown(f"  • {tip}")
+        
+        # Pagination
+        if num_pages > 1:
+            prev_col, page_col, next_col = st.columns([1, 2, 1])
+            with prev_col:
+                if st.button("⬅️ Previous", disabled=page <= 1, use_container_width=True):
+                    st.session_state['food_search_page'] = page - 1
+                    st.rerun()
+            with page_col:
+                st.markdown(f"<p style='text-align: center;'>Page {page} of {num_pages}</p>", unsafe_allow_html=True)
+            with next_col:
+                if st.button("Next ➡️", disabled=page >= num_pages, use_container_width=True):
+                    st.session_state['food_search_page'] = page + 1
+                    st.rerun()
+    
+    rerun_profiler.mark("database_tab")
     
     # Footer
     st.markdown("---")
@@ -1645,3 +1214,6 @@ def main():
 
 if __name__ == "__main__":
     main()
+    if PROFILE_RERUNS:
+        rerun_profiler.mark("footer")
+        rerun_profiler.render()
@@ -0,0 +1,184 @@
+"""
+Dynamic micro-batching for the prediction endpoints
+
+Concurrent requests each submit a single preprocessed image tensor. A background
+task collects them into one batch (up to max_batch_size, waiting at most
+max_wait_ms after the first item arrives) and runs a single forward pass, then
+hands every caller its own row of probabilities.
+
+Forward passes run on a dedicated inference thread pool so the event loop stays
+free to accept requests while the model is busy.
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+from workers import ServerBusyError
+
+
+class MicroBatcher:
+    """Gather concurrent single-image requests into batched forward passes"""
+
+    def __init__(self, run_batch, max_batch_size=8, max_wait_ms=5.0, max_queue_size=64, inference_workers=1,
+                 on_batch=None):
+        """
+        Args:
+            run_batch: Callable taking an (N, C, H, W) tensor and returning (N, num_classes) probabilities
+            max_batch_size: Largest batch sent to the model
+            max_wait_ms: How long to wait for more requests after the first one arrives
+            max_queue_size: Requests allowed to wait for a batch before new ones are rejected
+            inference_workers: Number of batches allowed to run on the model at the same time
+            on_batch: Optional callback(batch_size, queue_waits, run_seconds) after each forward pass
+        """
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.max_queue_size = max(1, int(max_queue_size))
+        self.inference_workers = max(1, int(inference_workers))
+        self.on_batch = on_batch
+        self._executor = None
+        self._slots = None
+        self._queue = None
+        self._task = None
+        self._running = set()
+
+        # Metrics
+        self.total_batches = 0
+        self.total_items = 0
+        self.batch_size_counts = {}
+        self.total_queue_wait = 0.0
+        self.max_queue_wait = 0.0
+        self.rejected = 0
+        self.run_items = 0
+        self.total_run_seconds = 0.0
+
+    def start(self):
+        """Start the background batching task (must be called from the event loop)"""
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+            self._slots = asyncio.Semaphore(self.inference_workers)
+            self._executor = ThreadPoolExecutor(max_workers=self.inference_workers, thread_name_prefix="inference")
+            self._task = asyncio.get_running_loop().create_task(self._worker())
+
+    async def stop(self):
+        """Stop the background task and fail any requests still waiting"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+        self._executor.shutdown(wait=False)
+        while not self._queue.empty():
+            _, future, _ = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Batcher stopped"))
+
+    async def submit(self, tensor):
+        """Queue one (C, H, W) image tensor and wait for its probability row"""
+        if self._task is None:
+            raise RuntimeError("Batcher not started")
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((tensor, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise ServerBusyError("Inference queue is full")
+        return await future
+
+    async def _collect(self):
+        """Wait for the first item, then gather more until the batch is full or the deadline passes"""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            # Take whatever is already queued without yielding
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _worker(self):
+        while True:
+            # Only collect a new batch once an inference worker is free, so
+            # requests keep accumulating in the queue while the model is busy
+            await self._slots.acquire()
+            try:
+                batch = await self._collect()
+            except BaseException:
+                self._slots.release()
+                raise
+            task = asyncio.get_running_loop().create_task(self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch):
+        try:
+            started = time.perf_counter()
+            live = [(tensor, future) for tensor, future, _ in batch if not future.done()]
+            waits = [started - enqueued for _, _, enqueued in batch]
+            self._record(len(batch), waits)
+            if not live:
+                return
+
+            try:
+                probabilities = await asyncio.get_running_loop().run_in_executor(
+                    self._executor, self.run_batch, torch.stack([tensor for tensor, _ in live])
+                )
+            except Exception as e:
+                for _, future in live:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+            run_seconds = time.perf_counter() - started
+            self.run_items += len(live)
+            self.total_run_seconds += run_seconds
+            if self.on_batch is not None:
+                self.on_batch(len(live), waits, run_seconds)
+
+            for row, (_, future) in zip(probabilities, live):
+                if not future.done():
+                    future.set_result(row)
+        finally:
+            self._slots.release()
+
+    def _record(self, batch_size, waits):
+        self.total_batches += 1
+        self.total_items += batch_size
+        self.batch_size_counts[batch_size] = self.batch_size_counts.get(batch_size, 0) + 1
+        self.total_queue_wait += sum(waits)
+        self.max_queue_wait = max(self.max_queue_wait, max(waits))
+
+    def stats(self):
+        """Batch-size and queue-wait metrics"""
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "max_queue_size": self.max_queue_size,
+            "inference_workers": self.inference_workers,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "rejected": self.rejected,
+            "total_batches": self.total_batches,
+            "total_items": self.total_items,
+            "avg_batch_size": self.total_items / self.total_batches if self.total_batches else 0.0,
+            "batch_size_counts": {str(k): v for k, v in sorted(self.batch_size_counts.items())},
+            "avg_queue_wait_ms": 1000.0 * self.total_queue_wait / self.total_items if self.total_items else 0.0,
+            "max_queue_wait_ms": 1000.0 * self.max_queue_wait,
+            "forward_ms_per_image": 1000.0 * self.total_run_seconds / self.run_items if self.run_items else None,
+        }
@@ -0,0 +1,102 @@
+"""
+Micro-benchmark: fast preprocessing path vs the torchvision transform pipeline
+
+Times both pipelines on the same images (bytes already in memory, so only
+decode + resize + normalize is measured) and reports how far the outputs
+differ. Without --image-dir a corpus of synthetic 12 MP JPEGs is generated.
+
+Usage:
+    python bench_preprocess.py --image-dir data/holdout
+    python bench_preprocess.py --synthetic 20 --repeats 3
+"""
+
+import argparse
+import io
+import statistics
+import time
+
+import torch
+from PIL import Image
+
+from image_files import find_images
+from model_loader import transform
+from preprocessing import preprocess_image_bytes
+
+
+def baseline_preprocess(image_bytes):
+    """The original pipeline: full decode, then transforms.Resize/ToTensor/Normalize"""
+    return transform(Image.open(io.BytesIO(image_bytes)).convert("RGB"))
+
+
+def synthetic_corpus(count, width=4032, height=3024, quality=90):
+    """Large JPEGs with smooth gradients and noise, similar in size to phone photos"""
+    corpus = []
+    generator = torch.Generator().manual_seed(0)
+    small = torch.rand(count, 3, height // 64, width // 64, generator=generator)
+    for i in range(count):
+        pixels = torch.nn.functional.interpolate(small[i:i + 1], size=(height, width), mode="bilinear")
+        pixels = (pixels[0] * 255).to(torch.uint8).permute(1, 2, 0).numpy()
+        buffer = io.BytesIO()
+        Image.fromarray(pixels).save(buffer, format="JPEG", quality=quality)
+        corpus.append(buffer.getvalue())
+    return corpus
+
+
+def time_pipeline(fn, corpus, repeats):
+    """Per-image latency in milliseconds (best of `repeats` runs over the corpus)"""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for image_bytes in corpus:
+            fn(image_bytes)
+        timings.append((time.perf_counter() - start) * 1000 / len(corpus))
+    return min(timings), statistics.mean(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark image preprocessing pipelines")
+    parser.add_argument("--image-dir", help="Folder of photos to benchmark on")
+    parser.add_argument("--limit", type=int, default=50, help="Max images loaded from --image-dir")
+    parser.add_argument("--synthetic", type=int, default=10, help="Synthetic 12 MP JPEGs when no --image-dir")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.image_dir:
+        paths = find_images(args.image_dir, args.limit)
+        if not paths:
+            parser.error(f"No images found in {args.image_dir}")
+        corpus = []
+        for path in paths:
+            with open(path, 'rb') as f:
+                corpus.append(f.read())
+        source = args.image_dir
+    else:
+        corpus = synthetic_corpus(args.synthetic)
+        source = "synthetic 4032x3024 JPEGs"
+
+    torch.set_num_threads(1)  # one decode worker thread, as in the server
+    print(f"📷 {len(corpus)} images ({source}), "
+          f"{sum(len(b) for b in corpus) / len(corpus) / 1e6:.1f} MB average")
+
+    # Warm both paths once so lazy initialization is not timed
+    baseline_preprocess(corpus[0])
+    preprocess_image_bytes(corpus[0])
+
+    base_best, base_mean = time_pipeline(baseline_preprocess, corpus, args.repeats)
+    fast_best, fast_mean = time_pipeline(preprocess_image_bytes, corpus, args.repeats)
+    print(f"⏱️  transform pipeline: {base_best:7.1f} ms/image (mean {base_mean:.1f})")
+    print(f"⏱️  fast pipeline:      {fast_best:7.1f} ms/image (mean {fast_mean:.1f})")
+    print(f"🚀 Speedup: {base_best / fast_best:.1f}x")
+
+    # Differences in units of one 8-bit intensity level of the normalized input
+    level = 1.0 / (255 * min(0.229, 0.224, 0.225))
+    max_diff = mean_diff = 0.0
+    for image_bytes in corpus:
+        diff = (preprocess_image_bytes(image_bytes) - baseline_preprocess(image_bytes)).abs()
+        max_diff = max(max_diff, diff.max().item())
+        mean_diff += diff.mean().item() / len(corpus)
+    print(f"📊 Output difference: mean {mean_diff / level:.2f}, max {max_diff / level:.1f} intensity levels")
+
+
+if __name__ == "__main__":
+    main()
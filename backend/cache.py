@@ -0,0 +1,220 @@
+"""
+Prediction cache keyed by the content of the uploaded image
+
+Clients often re-submit the same photo (retries, shares, the PWA re-posting).
+Results are cached by a hash of the raw upload bytes plus the model version,
+so a repeated upload skips decoding and inference entirely. There is a bounded
+in-memory LRU tier with TTL and an optional on-disk SQLite tier that survives
+restarts.
+
+Only the in-memory tier is touched on the event loop. Disk lookups run in a
+worker thread (lookup_many), and results are written to disk by a write-behind
+thread that commits them in batches, so a slow disk never stalls requests.
+"""
+
+import array
+import asyncio
+import hashlib
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import torch
+
+
+class PredictionCache:
+    """LRU + TTL cache of class-probability vectors with an optional SQLite tier"""
+
+    # Write-behind batching: at most this many rows per transaction, flushed at least this often
+    WRITE_BATCH_SIZE = 256
+    WRITE_INTERVAL_SECONDS = 0.5
+
+    def __init__(self, max_entries=1024, ttl_seconds=3600, db_path=None):
+        """
+        Args:
+            max_entries: Maximum results kept in memory (least recently used are evicted)
+            ttl_seconds: How long a cached result stays valid (0 = forever)
+            db_path: SQLite file for the on-disk tier (None = memory only)
+        """
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = float(ttl_seconds)
+        self.db_path = db_path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_lock = threading.Lock()
+        self._pending = queue.Queue()
+        self._writer = None
+        self.write_errors = 0
+
+        # Counters
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS prediction_cache ("
+                "key TEXT PRIMARY KEY, probabilities BLOB NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._purge_disk()
+            self._db.commit()
+            self._writer = threading.Thread(target=self._write_behind, name="prediction-cache-writer", daemon=True)
+            self._writer.start()
+
+    @staticmethod
+    def key(image_bytes, model_version):
+        """Cache key for an upload: hash of the model version and the raw bytes"""
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(model_version.encode())
+        digest.update(b"\0")
+        digest.update(image_bytes)
+        return digest.hexdigest()
+
+    def _expired(self, created_at):
+        return self.ttl > 0 and time.time() - created_at > self.ttl
+
+    def _memory_get(self, key):
+        """Probabilities from the in-memory tier, or None (expired entries are dropped)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            probabilities, created_at = entry
+            if not self._expired(created_at):
+                self._entries.move_to_end(key)
+                return probabilities
+            del self._entries[key]
+            self.expirations += 1
+            return None
+
+    def _disk_get_many(self, keys):
+        """{key: (probabilities, created_at)} of the keys stored on disk (runs in a worker thread)"""
+        placeholders = ", ".join("?" * len(keys))
+        with self._db_lock:
+            rows = self._db.execute(
+                f"SELECT key, probabilities, created_at FROM prediction_cache WHERE key IN ({placeholders})", keys
+            ).fetchall()
+        return {
+            key: (torch.tensor(array.array("f", blob)), created_at)
+            for key, blob, created_at in rows if not self._expired(created_at)
+        }
+
+    async def lookup_many(self, keys):
+        """
+        {key: probabilities} for the keys that are cached
+
+        Memory hits are answered on the event loop; the rest are looked up on disk in
+        one query in a worker thread.
+        """
+        found = {}
+        missing = []
+        for key in dict.fromkeys(keys):
+            probabilities = self._memory_get(key)
+            if probabilities is not None:
+                found[key] = probabilities
+            else:
+                missing.append(key)
+        self.hits += len(found)
+
+        if missing and self._db is not None:
+            from_disk = await asyncio.to_thread(self._disk_get_many, missing)
+            with self._lock:
+                for key, (probabilities, created_at) in from_disk.items():
+                    self._store(key, probabilities, created_at)
+                    found[key] = probabilities
+            self.hits += len(from_disk)
+            self.disk_hits += len(from_disk)
+            self.misses += len(missing) - len(from_disk)
+        else:
+            self.misses += len(missing)
+        return found
+
+    async def lookup(self, key):
+        """Cached probabilities for key, or None"""
+        return (await self.lookup_many([key])).get(key)
+
+    def put(self, key, probabilities):
+        """Store one probability vector in memory; the disk write is queued for the writer thread"""
+        created_at = time.time()
+        with self._lock:
+            self._store(key, probabilities, created_at)
+        if self._writer is not None:
+            self._pending.put((key, array.array("f", probabilities.tolist()).tobytes(), created_at))
+
+    def _write_behind(self):
+        """Writer thread: insert queued results in batches, one commit per batch, until close()"""
+        stopping = False
+        while not stopping:
+            batch = [self._pending.get()]
+            deadline = time.monotonic() + self.WRITE_INTERVAL_SECONDS
+            while batch[-1] is not None and len(batch) < self.WRITE_BATCH_SIZE:
+                try:
+                    batch.append(self._pending.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            if batch[-1] is None:
+                stopping = True
+                batch.pop()
+            if not batch:
+                continue
+            try:
+                with self._db_lock:
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO prediction_cache (key, probabilities, created_at) VALUES (?, ?, ?)",
+                        batch
+                    )
+                    self._db.commit()
+            except sqlite3.Error as e:
+                self.write_errors += 1
+                print(f"⚠️ Prediction cache disk write failed: {e}")
+
+    def _store(self, key, probabilities, created_at):
+        self._entries[key] = (probabilities, created_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _purge_disk(self):
+        if self.ttl > 0:
+            self._db.execute("DELETE FROM prediction_cache WHERE created_at < ?", (time.time() - self.ttl,))
+
+    def close(self):
+        """Flush queued disk writes and close the database (blocking; call from a worker thread)"""
+        if self._writer is not None:
+            self._pending.put(None)
+            self._writer.join()
+            self._writer = None
+        if self._db is not None:
+            with self._db_lock:
+                self._purge_disk()
+                self._db.commit()
+                self._db.close()
+                self._db = None
+
+    def stats(self):
+        """Hit/miss/eviction counters (queries the disk tier; call from a worker thread)"""
+        lookups = self.hits + self.misses
+        stats = {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+        if self._db is not None:
+            stats["pending_writes"] = self._pending.qsize()
+            stats["write_errors"] = self.write_errors
+            with self._db_lock:
+                stats["disk_entries"] = self._db.execute("SELECT COUNT(*) FROM prediction_cache").fetchone()[0]
+        return stats
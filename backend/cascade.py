@@ -0,0 +1,65 @@
+"""
+Confidence-based model cascade
+
+A small model (e.g. ResNet-18 or EfficientNet-B0) answers every image first.
+Only images whose top-1 confidence is below the threshold are re-run on the
+larger model. Both models take the same preprocessed 224x224 input, so an
+escalation costs one extra forward pass and no extra decoding.
+
+The throughput gain is estimated from the measured per-image forward time of
+each model: the cascade costs fast + escalation_rate * accurate per image,
+against accurate alone.
+"""
+
+
+def is_uncertain(probabilities, threshold):
+    """True when the top-1 probability of one row is below threshold (0-1)"""
+    return float(probabilities.max()) < threshold
+
+
+class CascadeStats:
+    """Escalation counters for the cascade"""
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.images = 0
+        self.escalated = 0
+        self.changed = 0
+        self.skipped = 0
+        self.busy = 0
+        self.failed = 0
+
+    def record(self, escalated=False, changed=False):
+        """
+        Record one image
+
+        Args:
+            escalated: The image was re-run on the larger model
+            changed: The larger model's top-1 class differs from the small model's
+        """
+        self.images += 1
+        if escalated:
+            self.escalated += 1
+        if changed:
+            self.changed += 1
+
+    def stats(self, fast_ms_per_image=None, accurate_ms_per_image=None):
+        """Escalation rate plus the estimated speedup over always using the larger model"""
+        rate = self.escalated / self.images if self.images else 0.0
+        stats = {
+            "threshold": self.threshold,
+            "images": self.images,
+            "escalated": self.escalated,
+            "escalation_rate": rate,
+            "changed_by_escalation": self.changed,
+            "skipped_class_mismatch": self.skipped,
+            "kept_fast_answer_busy": self.busy,
+            "kept_fast_answer_failed": self.failed,
+            "fast_forward_ms_per_image": fast_ms_per_image,
+            "accurate_forward_ms_per_image": accurate_ms_per_image,
+        }
+        if fast_ms_per_image and accurate_ms_per_image:
+            cascade_ms = fast_ms_per_image + rate * accurate_ms_per_image
+            stats["cascade_forward_ms_per_image"] = cascade_ms
+            stats["estimated_speedup"] = accurate_ms_per_image / cascade_ms
+        return stats
@@ -0,0 +1,289 @@
+"""
+Offline bulk classification of image archives
+
+Walks directories (or reads a file list), decodes and preprocesses images in
+DataLoader worker processes, runs batched inference and streams the results to
+CSV, JSONL or Parquet. Progress is checkpointed, so an interrupted run picks up
+where it stopped: the checkpoint records how many images were written and the
+output size at that point, and anything written after it is discarded on resume.
+
+Usage:
+    python classify_bulk.py /data/photos --output results.csv
+    python classify_bulk.py --file-list nightly.txt --output results.jsonl --workers 8 --batch-size 128
+    python classify_bulk.py /data/photos --output results.parquet   # directory of part files
+"""
+
+import argparse
+import csv
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+
+import torch
+from PIL import UnidentifiedImageError
+from torch.utils.data import DataLoader, Dataset
+
+from image_files import find_images
+from model_loader import file_fingerprint, load_class_names, load_model, resolve_model_paths
+from preprocessing import preprocess_image_bytes
+
+FORMATS = ("csv", "jsonl", "parquet")
+
+
+class ImageFileDataset(Dataset):
+    """Decodes and preprocesses one image per item; unreadable files are reported, not raised"""
+
+    def __init__(self, paths):
+        self.paths = paths
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, index):
+        try:
+            with open(self.paths[index], 'rb') as f:
+                return index, preprocess_image_bytes(f.read()), None
+        except UnidentifiedImageError:
+            return index, None, "UnidentifiedImageError: cannot identify image file"
+        except Exception as e:
+            return index, None, f"{type(e).__name__}: {e}"
+
+
+def collate_images(items):
+    """Stack the good images of a batch; keep failures separately"""
+    good = [(index, tensor) for index, tensor, _ in items if tensor is not None]
+    failed = [(index, error) for index, _, error in items if error is not None]
+    batch = torch.stack([tensor for _, tensor in good]) if good else None
+    return [index for index, _ in good], batch, failed
+
+
+class ResultWriter:
+    """Streams result rows to CSV, JSONL or a directory of Parquet part files"""
+
+    CSV_FIELDS = ["path", "class", "confidence", "top_k", "error"]
+
+    def __init__(self, path, output_format, resume_state=None):
+        self.path = path
+        self.format = output_format
+        state = resume_state or {}
+
+        if output_format == "parquet":
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise RuntimeError("Parquet output requires the pyarrow package")
+            os.makedirs(path, exist_ok=True)
+            self.part = state.get("parquet_parts", 0)
+            # Drop parts written after the last checkpoint
+            for stale in glob.glob(os.path.join(path, "part-*.parquet")):
+                if int(os.path.basename(stale)[5:10]) >= self.part:
+                    os.remove(stale)
+            self._rows = []
+            return
+
+        offset = state.get("output_offset")
+        if offset is not None and os.path.exists(path):
+            self._file = open(path, 'r+', newline='', encoding='utf-8')
+            self._file.truncate(offset)
+            self._file.seek(offset)
+        else:
+            self._file = open(path, 'w', newline='', encoding='utf-8')
+        if output_format == "csv":
+            self._csv = csv.DictWriter(self._file, fieldnames=self.CSV_FIELDS)
+            if offset is None:
+                self._csv.writeheader()
+
+    def write(self, rows):
+        if self.format == "parquet":
+            self._rows.extend(rows)
+        elif self.format == "csv":
+            for row in rows:
+                self._csv.writerow({**row, "top_k": json.dumps(row["top_k"]) if row["top_k"] else ""})
+        else:
+            for row in rows:
+                self._file.write(json.dumps(row) + "\n")
+
+    def flush(self):
+        """Make everything written so far durable; returns the state to store in the checkpoint"""
+        if self.format == "parquet":
+            if self._rows:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+                schema = pa.schema([
+                    ("path", pa.string()), ("class", pa.string()), ("confidence", pa.float64()),
+                    ("top_k", pa.string()), ("error", pa.string()),
+                ])
+                table = pa.Table.from_pylist([
+                    {**row, "top_k": json.dumps(row["top_k"]) if row["top_k"] else None} for row in self._rows
+                ], schema=schema)
+                pq.write_table(table, os.path.join(self.path, f"part-{self.part:05d}.parquet"))
+                self.part += 1
+                self._rows = []
+            return {"parquet_parts": self.part}
+
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return {"output_offset": self._file.tell()}
+
+    def close(self):
+        if self.format != "parquet":
+            self._file.close()
+
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def save_checkpoint(path, state):
+    """Write the checkpoint atomically so a crash never leaves a half-written file"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def list_inputs(inputs, file_list):
+    paths = []
+    for item in inputs:
+        paths.extend(find_images(item) if os.path.isdir(item) else [item])
+    if file_list:
+        with open(file_list, 'r', encoding='utf-8') as f:
+            paths.extend(line.strip() for line in f if line.strip())
+    return paths
+
+
+def inputs_digest(paths):
+    digest = hashlib.blake2b(digest_size=16)
+    for path in paths:
+        digest.update(path.encode("utf-8", "surrogateescape"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Classify a directory tree or file list of food photos")
+    parser.add_argument("inputs", nargs="*", help="Image directories (walked recursively) or image files")
+    parser.add_argument("--file-list", help="Text file with one image path per line")
+    parser.add_argument("--output", required=True, help="Output file (.csv, .jsonl) or directory (.parquet)")
+    parser.add_argument("--format", choices=FORMATS, help="Output format (default: from the --output extension)")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1),
+                        help="DataLoader worker processes for decoding")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: <output>.checkpoint.json)")
+    parser.add_argument("--checkpoint-every", type=int, default=20, help="Batches between checkpoints")
+    parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint")
+    args = parser.parse_args()
+
+    output_format = args.format or os.path.splitext(args.output)[1].lstrip(".").lower()
+    if output_format not in FORMATS:
+        parser.error(f"Cannot infer the output format from {args.output}; use --format")
+
+    paths = list_inputs(args.inputs, args.file_list)
+    if not paths:
+        parser.error("No input images found")
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    model_path, class_names_path = resolve_model_paths()
+    class_names = load_class_names(class_names_path)
+    model, detected_arch = load_model(model_path, len(class_names), device)
+    model_version = f"{detected_arch}-{file_fingerprint(model_path)}"
+    print(f"✅ Model loaded: {model_version} on {device}")
+
+    checkpoint_path = args.checkpoint or args.output.rstrip("/\\") + ".checkpoint.json"
+    digest = inputs_digest(paths)
+    state = None if args.restart else load_checkpoint(checkpoint_path)
+    if state is not None:
+        if state.get("inputs_digest") != digest or state.get("model_version") != model_version:
+            sys.exit(f"❌ {checkpoint_path} belongs to a different input list or model; use --restart")
+        print(f"🔁 Resuming after {state['processed']} of {len(paths)} images")
+    start_index = state["processed"] if state else 0
+
+    writer = ResultWriter(args.output, output_format, state.get("writer") if state else None)
+    loader = DataLoader(
+        ImageFileDataset(paths[start_index:]),
+        batch_size=args.batch_size,
+        num_workers=args.workers,
+        collate_fn=collate_images,
+        pin_memory=device.type == "cuda",
+        persistent_workers=False,
+        prefetch_factor=4 if args.workers > 0 else None,
+    )
+
+    k = min(args.top_k, len(class_names))
+    processed = start_index
+    writing = False
+    failed_total = 0
+    started = last_report = time.perf_counter()
+
+    def checkpoint():
+        # Flush first, so the checkpoint never counts rows that are not on disk
+        writer_state = writer.flush()
+        save_checkpoint(checkpoint_path, {
+            "inputs_digest": digest,
+            "model_version": model_version,
+            "total": len(paths),
+            "processed": processed,
+            "writer": writer_state,
+            "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        })
+
+    try:
+        for batch_number, (indices, batch, failed) in enumerate(loader, start=1):
+            rows = {}
+            if batch is not None:
+                with torch.no_grad():
+                    probabilities = torch.softmax(model(batch.to(device, non_blocking=True)), dim=1).cpu()
+                top_probs, top_indices = torch.topk(probabilities, k, dim=1)
+                for index, probs, classes in zip(indices, top_probs.tolist(), top_indices.tolist()):
+                    rows[index] = {
+                        "path": paths[start_index + index],
+                        "class": class_names[classes[0]],
+                        "confidence": probs[0],
+                        "top_k": [{"class": class_names[c], "confidence": p} for c, p in zip(classes, probs)],
+                        "error": None,
+                    }
+            for index, error in failed:
+                rows[index] = {
+                    "path": paths[start_index + index], "class": None, "confidence": None, "top_k": None, "error": error
+                }
+            failed_total += len(failed)
+
+            # Rows go out in input order so the checkpoint can be a simple count
+            writing = True
+            writer.write([rows[index] for index in sorted(rows)])
+            processed += len(rows)
+            writing = False
+
+            if batch_number % args.checkpoint_every == 0:
+                checkpoint()
+
+            now = time.perf_counter()
+            if now - last_report >= 2.0 or processed == len(paths):
+                rate = (processed - start_index) / (now - started)
+                eta = (len(paths) - processed) / rate if rate > 0 else 0.0
+                print(f"\r⏳ {processed}/{len(paths)} images | {rate:.1f} img/s | "
+                      f"{failed_total} failed | ETA {eta / 60:.1f} min", end="", flush=True)
+                last_report = now
+    finally:
+        # A batch interrupted while being written may be only partly in the output and not yet
+        # counted; keep the previous checkpoint then, and resume truncates back to it
+        if not writing:
+            checkpoint()
+        writer.close()
+        print()
+
+    elapsed = time.perf_counter() - started
+    print(f"✅ Classified {processed - start_index} images in {elapsed:.1f}s "
+          f"({(processed - start_index) / elapsed:.1f} img/s), {failed_total} failed")
+    print(f"✅ Results: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Convert model.pth to model.safetensors
+
+safetensors files are memory-mapped at load instead of unpickled, so cold start
+is faster and worker processes share the weights through the page cache. The
+source model.pth fingerprint is stored in the header; the loaders only use
+model.safetensors while it matches the model.pth next to it.
+
+Usage:
+    python convert_weights.py
+    python convert_weights.py --input ../app/model.pth --output ../app/model.safetensors
+"""
+
+import argparse
+import os
+import time
+
+import torch
+
+from model_loader import (
+    detect_model_architecture,
+    file_fingerprint,
+    load_state_dict,
+    resolve_model_paths,
+    safetensors_path_for
+)
+
+
+def convert(model_path, output_path):
+    """Write the state_dict of model_path as safetensors; returns the header metadata"""
+    from safetensors.torch import save_file
+
+    state_dict = load_state_dict(model_path)
+    detected_arch = detect_model_architecture(state_dict)
+    fingerprint = file_fingerprint(model_path)
+    metadata = {
+        "architecture": detected_arch,
+        "source_model_version": f"{detected_arch}-{fingerprint}",
+        "source_fingerprint": fingerprint,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    # safetensors stores each tensor once, contiguously
+    save_file({key: value.contiguous() for key, value in state_dict.items()}, output_path, metadata=metadata)
+    return metadata
+
+
+def verify(model_path, output_path):
+    """True if both files hold identical tensors"""
+    from safetensors.torch import load_file
+
+    original = load_state_dict(model_path)
+    converted = load_file(output_path)
+    return original.keys() == converted.keys() and all(
+        torch.equal(original[key], converted[key]) for key in original
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert model.pth to memory-mappable safetensors")
+    parser.add_argument("--input", help="Checkpoint to convert (default: model.pth, as found by the server)")
+    parser.add_argument("--output", help="Output path (default: model.safetensors next to the input)")
+    args = parser.parse_args()
+
+    model_path = args.input or resolve_model_paths()[0]
+    output_path = args.output or safetensors_path_for(model_path)
+
+    metadata = convert(model_path, output_path)
+    print(f"✅ Converted {metadata['source_model_version']}")
+    if not verify(model_path, output_path):
+        raise SystemExit("❌ Converted weights differ from the original checkpoint")
+    print(f"✅ Saved {output_path} ({os.path.getsize(output_path) / 1e6:.1f} MB, verified)")
+
+
+if __name__ == "__main__":
+    main()
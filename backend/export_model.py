@@ -0,0 +1,152 @@
+"""
+Export model.pth to an optimized inference artifact
+
+Formats:
+    torchscript - traced, frozen TorchScript module (channels_last by default),
+                  loaded automatically by the API server when present
+    onnx        - ONNX graph with a dynamic batch dimension, served with
+                  INFERENCE_BACKEND=onnxruntime (needs the onnx package to export)
+
+Usage:
+    python export_model.py --format torchscript
+    python export_model.py --format torchscript --no-channels-last --output model.ts
+    python export_model.py --format onnx
+"""
+
+import argparse
+import inspect
+import json
+import os
+import time
+
+import torch
+
+from model_loader import (
+    SCRIPT_DIR,
+    file_fingerprint,
+    load_class_names,
+    load_model,
+    resolve_model_paths
+)
+
+METADATA_FILE = "metadata.json"
+
+
+def export_torchscript(model, output_path, metadata, channels_last=True, batch_size=8):
+    """Trace, freeze and save the model; returns the max abs difference from eager outputs"""
+    memory_format = torch.channels_last if channels_last else torch.contiguous_format
+    model = model.to(memory_format=memory_format)
+    example = torch.randn(batch_size, 3, 224, 224).contiguous(memory_format=memory_format)
+
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example)
+        frozen = torch.jit.freeze(traced.eval())
+        max_diff = (frozen(example) - model(example)).abs().max().item()
+
+    metadata = {**metadata, "channels_last": channels_last}
+    torch.jit.save(frozen, output_path, _extra_files={METADATA_FILE: json.dumps(metadata)})
+    return max_diff
+
+
+def export_onnx(model, output_path, metadata, opset_version=17):
+    """
+    Export the model to ONNX with a dynamic batch dimension and the metadata stored
+    as model properties; returns the max abs difference from eager outputs when
+    onnxruntime is installed (None otherwise)
+    """
+    import onnx
+
+    example = torch.randn(2, 3, 224, 224)
+    export_kwargs = {}
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        # The TorchScript-based exporter handles dynamic_axes for these CNNs reliably
+        export_kwargs["dynamo"] = False
+
+    torch.onnx.export(
+        model, example, output_path,
+        input_names=["input"],
+        output_names=["logits"],
+        dynamic_axes={"input": {0: "batch"}, "logits": {0: "batch"}},
+        opset_version=opset_version,
+        **export_kwargs
+    )
+
+    onnx_model = onnx.load(output_path)
+    onnx.helper.set_model_props(onnx_model, {key: str(value) for key, value in metadata.items()})
+    onnx.checker.check_model(onnx_model)
+    onnx.save(onnx_model, output_path)
+
+    try:
+        import onnxruntime as ort
+    except ImportError:
+        return None
+
+    session = ort.InferenceSession(output_path, providers=["CPUExecutionProvider"])
+    with torch.no_grad():
+        expected = model(example).numpy()
+    actual = session.run(None, {"input": example.numpy()})[0]
+    return float(abs(actual - expected).max())
+
+
+def load_torchscript_model(artifact_path, source_fingerprint=None, device=torch.device("cpu")):
+    """
+    Load an exported TorchScript artifact and its metadata
+
+    Raises RuntimeError if the artifact was exported from a different model.pth.
+    Returns (model, metadata)
+    """
+    extra_files = {METADATA_FILE: ""}
+    model = torch.jit.load(artifact_path, map_location=device, _extra_files=extra_files)
+    metadata = json.loads(extra_files[METADATA_FILE] or "{}")
+
+    if source_fingerprint is not None and metadata.get("source_fingerprint") != source_fingerprint:
+        raise RuntimeError(
+            f"{os.path.basename(artifact_path)} was exported from {metadata.get('source_model_version')}, "
+            f"not from the current model.pth ({source_fingerprint})"
+        )
+
+    model.eval()
+    return model, metadata
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export model.pth to an optimized inference artifact")
+    parser.add_argument("--format", choices=["torchscript", "onnx"], default="torchscript")
+    parser.add_argument("--output", help="Output path (default: model.ts / model.onnx next to this script)")
+    parser.add_argument("--no-channels-last", action="store_true", help="Keep the default NCHW memory format")
+    parser.add_argument("--batch-size", type=int, default=8, help="Batch size of the example input (TorchScript)")
+    parser.add_argument("--opset", type=int, default=17, help="ONNX opset version")
+    args = parser.parse_args()
+
+    model_path, class_names_path = resolve_model_paths()
+    num_classes = len(load_class_names(class_names_path))
+    model, detected_arch = load_model(model_path, num_classes)
+    fingerprint = file_fingerprint(model_path)
+    print(f"✅ Loaded model: {detected_arch}-{fingerprint}")
+
+    metadata = {
+        "architecture": detected_arch,
+        "source_model_version": f"{detected_arch}-{fingerprint}",
+        "source_fingerprint": fingerprint,
+        "num_classes": num_classes,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+    if args.format == "onnx":
+        output = args.output or os.path.join(SCRIPT_DIR, "model.onnx")
+        max_diff = export_onnx(model, output, metadata, opset_version=args.opset)
+    else:
+        output = args.output or os.path.join(SCRIPT_DIR, "model.ts")
+        max_diff = export_torchscript(
+            model, output, metadata,
+            channels_last=not args.no_channels_last,
+            batch_size=args.batch_size
+        )
+    
+    if max_diff is not None:
+        print(f"📊 Max difference from eager model: {max_diff:.2e}")
+    print(f"✅ Saved {output} ({os.path.getsize(output) / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+"""
+Image file discovery shared by the command-line tools
+
+Kept free of torch and the server's dependencies so load_test.py can import it
+on a machine that only has httpx and Pillow.
+"""
+
+import os
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+
+
+def find_images(folder, limit=None):
+    """Image files under folder (recursive, sorted for reproducibility)"""
+    paths = []
+    for root, _, files in os.walk(folder):
+        for name in files:
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                paths.append(os.path.join(root, name))
+    paths.sort()
+    return paths[:limit] if limit else paths
@@ -0,0 +1,72 @@
+"""
+Pluggable inference backends
+
+The endpoints only ever call backend.run(batch) with an (N, 3, 224, 224) float
+tensor and get back (N, num_classes) softmax probabilities as a CPU tensor, so
+every backend produces exactly the same response schema.
+
+Backends:
+    torch       - eager, TorchScript or quantized PyTorch module
+    onnxruntime - ONNX model from export_model.py on ONNX Runtime's CPU provider
+"""
+
+import torch
+
+
+class InferenceBackend:
+    """Common interface for running the classifier on a batch of images"""
+
+    name = "base"
+
+    def run(self, batch):
+        """Return softmax probabilities (N, num_classes) on CPU for an (N, 3, H, W) batch"""
+        raise NotImplementedError
+
+
+class TorchBackend(InferenceBackend):
+    """Run a PyTorch module (eager, TorchScript or quantized)"""
+
+    name = "torch"
+
+    def __init__(self, model, device=torch.device("cpu"), channels_last=False):
+        self.model = model
+        self.device = device
+        self.channels_last = channels_last
+
+    def run(self, batch):
+        batch = batch.to(self.device)
+        if self.channels_last:
+            batch = batch.contiguous(memory_format=torch.channels_last)
+        with torch.no_grad():
+            outputs = self.model(batch)
+            return torch.softmax(outputs, dim=1).cpu()
+
+
+class OnnxRuntimeBackend(InferenceBackend):
+    """Run an exported ONNX model with ONNX Runtime on the CPU execution provider"""
+
+    name = "onnxruntime"
+
+    def __init__(self, onnx_path, intra_op_threads=0):
+        """
+        Args:
+            onnx_path: Model exported with `python export_model.py --format onnx`
+            intra_op_threads: ONNX Runtime intra-op threads (0 = let ONNX Runtime decide)
+        """
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise RuntimeError("INFERENCE_BACKEND=onnxruntime requires the onnxruntime package")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+
+        self.session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.metadata = dict(self.session.get_modelmeta().custom_metadata_map)
+
+    def run(self, batch):
+        logits = self.session.run(None, {self.input_name: batch.contiguous().numpy()})[0]
+        return torch.softmax(torch.from_numpy(logits), dim=1)
@@ -0,0 +1,403 @@
+"""
+Load test and latency benchmark for the API
+
+Replays an image corpus against the prediction endpoints and reports throughput
+and p50/p95/p99 latency per endpoint. Results are written to JSON (with the git
+commit, model version and settings) so runs can be diffed across commits and
+model architectures.
+
+Targets:
+    in-process (default) - the FastAPI app is imported and driven through an ASGI
+                           transport, so no network or extra server is involved
+    --spawn              - starts `uvicorn main:app` locally and tests over HTTP
+    --url                - tests an already running server
+
+Load shapes:
+    --concurrency N      - closed loop: N clients, each sends its next request as
+                           soon as the previous one returns
+    --rate R             - open loop: R requests/second at fixed intervals,
+                           regardless of how fast the server answers
+
+Each request gets a few random bytes appended after the image data so the
+prediction cache does not turn the run into a cache benchmark (--allow-cache
+turns that off).
+
+Usage:
+    python load_test.py --image-dir data/holdout --concurrency 8 --requests 200
+    python load_test.py --endpoints predict,batch --rate 20 --duration 30 --output run.json
+    python load_test.py --spawn --concurrency 16 --output resnet50.json
+    python load_test.py --url http://localhost:8000 --endpoints raw
+"""
+
+import argparse
+import asyncio
+import base64
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+import httpx
+from PIL import Image
+
+from image_files import find_images
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+ENDPOINTS = ("predict", "base64", "raw", "batch", "batch_base64")
+
+
+def synthetic_corpus(count, width, height, seed=0):
+    """Random-noise-over-gradient JPEGs of the given size"""
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(count):
+        image = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+        noise = Image.effect_noise((width, height), rng.uniform(20, 60)).convert("RGB")
+        image = Image.blend(image, noise, 0.5)
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=90)
+        corpus.append(buffer.getvalue())
+    return corpus
+
+
+def percentile(sorted_values, q):
+    """Linear-interpolated percentile (q in 0..100) of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * q / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+class RequestFactory:
+    """Builds the HTTP request for each endpoint from the image corpus"""
+
+    def __init__(self, corpus, batch_size, unique=True, seed=0):
+        self.corpus = corpus
+        self.batch_size = batch_size
+        self.unique = unique
+        self.rng = random.Random(seed)
+        self.counter = 0
+
+    def _image(self):
+        image_bytes = self.corpus[self.counter % len(self.corpus)]
+        self.counter += 1
+        if self.unique:
+            # Bytes after the end of the image are ignored by decoders but change the cache key
+            image_bytes = image_bytes + self.rng.getrandbits(64).to_bytes(8, "little")
+        return image_bytes
+
+    def build(self, endpoint):
+        """Returns (method kwargs for client.post, path, number of images)"""
+        if endpoint == "predict":
+            return "/predict", {"files": {"file": ("image.jpg", self._image(), "image/jpeg")}}, 1
+        if endpoint == "base64":
+            return "/predict/base64", {"json": {"image": base64.b64encode(self._image()).decode()}}, 1
+        if endpoint == "raw":
+            return "/predict/raw", {"content": self._image(), "headers": {"Content-Type": "image/jpeg"}}, 1
+        images = [self._image() for _ in range(self.batch_size)]
+        if endpoint == "batch":
+            files = [("files", (f"image{i}.jpg", data, "image/jpeg")) for i, data in enumerate(images)]
+            return "/predict/batch", {"files": files}, len(images)
+        if endpoint == "batch_base64":
+            payload = {"images": [base64.b64encode(data).decode() for data in images]}
+            return "/predict/batch/base64", {"json": payload}, len(images)
+        raise ValueError(f"Unknown endpoint: {endpoint}")
+
+
+class EndpointResult:
+    """Latencies and status codes collected for one endpoint"""
+
+    def __init__(self):
+        self.latencies = []
+        self.status_counts = {}
+        self.errors = 0
+        self.images = 0
+
+    def record(self, latency, status, images):
+        self.latencies.append(latency)
+        self.status_counts[str(status)] = self.status_counts.get(str(status), 0) + 1
+        if status == 200:
+            self.images += images
+        else:
+            self.errors += 1
+
+    def summary(self, duration):
+        latencies = sorted(self.latencies)
+        ok = len(latencies) - self.errors
+        return {
+            "requests": len(latencies),
+            "errors": self.errors,
+            "status_counts": self.status_counts,
+            "duration_s": round(duration, 3),
+            "throughput_rps": round(ok / duration, 2) if duration else 0.0,
+            "images_per_s": round(self.images / duration, 2) if duration else 0.0,
+            "latency_ms": {
+                "mean": round(1000 * sum(latencies) / len(latencies), 2) if latencies else 0.0,
+                "p50": round(1000 * percentile(latencies, 50), 2),
+                "p95": round(1000 * percentile(latencies, 95), 2),
+                "p99": round(1000 * percentile(latencies, 99), 2),
+                "max": round(1000 * latencies[-1], 2) if latencies else 0.0,
+            },
+        }
+
+
+async def send(client, factory, endpoint, result):
+    path, kwargs, images = factory.build(endpoint)
+    start = time.perf_counter()
+    try:
+        response = await client.post(path, **kwargs)
+        status = response.status_code
+    except httpx.HTTPError:
+        status = "connection_error"
+    result.record(time.perf_counter() - start, status, images)
+
+
+async def run_closed_loop(client, factory, endpoint, concurrency, total_requests, duration):
+    """N clients sending back-to-back requests until the request count or duration is reached"""
+    result = EndpointResult()
+    deadline = time.perf_counter() + duration if duration else None
+    remaining = [total_requests]
+
+    async def client_loop():
+        while True:
+            if deadline is not None:
+                if time.perf_counter() >= deadline:
+                    return
+            elif remaining[0] <= 0:
+                return
+            else:
+                remaining[0] -= 1
+            await send(client, factory, endpoint, result)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[client_loop() for _ in range(concurrency)])
+    return result, time.perf_counter() - start
+
+
+async def run_open_loop(client, factory, endpoint, rate, total_requests, duration):
+    """Requests started at a fixed arrival rate, independent of response times"""
+    result = EndpointResult()
+    count = int(rate * duration) if duration else total_requests
+    interval = 1.0 / rate
+    tasks = []
+
+    start = time.perf_counter()
+    for i in range(count):
+        delay = start + i * interval - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(send(client, factory, endpoint, result)))
+    await asyncio.gather(*tasks)
+    return result, time.perf_counter() - start
+
+
+class InProcessApp:
+    """Runs the app's startup/shutdown lifespan so it can be driven through ASGITransport"""
+
+    def __init__(self, app):
+        self.app = app
+        self._receive = asyncio.Queue()
+        self._send = asyncio.Queue()
+        self._task = None
+
+    async def _call(self, message_type):
+        await self._receive.put({"type": message_type})
+        message = await self._send.get()
+        if message["type"].endswith(".failed"):
+            raise RuntimeError(message.get("message", "Application lifespan failed"))
+
+    async def __aenter__(self):
+        self._task = asyncio.create_task(
+            self.app({"type": "lifespan", "asgi": {"version": "3.0"}}, self._receive.get, self._send.put)
+        )
+        await self._call("lifespan.startup")
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._call("lifespan.shutdown")
+        await self._task
+
+
+def wait_until_ready(url, timeout):
+    """Poll /ready until the server has loaded and warmed up the model"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{url}/ready", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"Server at {url} did not become ready within {timeout}s")
+
+
+async def wait_until_ready_async(client, timeout=300):
+    """Poll /ready through the client; the server answers while the model is still loading"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        response = await client.get("/ready")
+        if response.status_code == 200:
+            return
+        if response.json().get("status") == "failed":
+            raise RuntimeError("Model loading failed on the target server")
+        await asyncio.sleep(0.1)
+    raise RuntimeError(f"Target did not become ready within {timeout}s")
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=SCRIPT_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_benchmark(client, factory, args):
+    await wait_until_ready_async(client)
+    health = (await client.get("/health")).json()
+    print(f"✅ Target ready: {health.get('model_version')}")
+
+    results = {}
+    for endpoint in args.endpoints:
+        # A few unmeasured requests so connection setup and lazy init are not timed
+        for _ in range(args.warmup):
+            await send(client, factory, endpoint, EndpointResult())
+
+        if args.rate:
+            result, duration = await run_open_loop(
+                client, factory, endpoint, args.rate, args.requests, args.duration
+            )
+        else:
+            result, duration = await run_closed_loop(
+                client, factory, endpoint, args.concurrency, args.requests, args.duration
+            )
+        results[endpoint] = result.summary(duration)
+
+        latency = results[endpoint]["latency_ms"]
+        print(f"📊 {endpoint:>13}: {results[endpoint]['throughput_rps']:7.1f} req/s "
+              f"{results[endpoint]['images_per_s']:7.1f} img/s | p50 {latency['p50']:7.1f} ms "
+              f"p95 {latency['p95']:7.1f} ms p99 {latency['p99']:7.1f} ms | errors {result.errors}")
+    return health, results
+
+
+async def main_async(args, corpus):
+    factory = RequestFactory(corpus, args.batch_size, unique=not args.allow_cache, seed=args.seed)
+    timeout = httpx.Timeout(args.timeout)
+    limits = httpx.Limits(max_connections=max(args.concurrency, 100))
+
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=timeout, limits=limits) as client:
+            return await run_benchmark(client, factory, args)
+
+    sys.path.insert(0, SCRIPT_DIR)
+    import main
+
+    async with InProcessApp(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=timeout) as client:
+            return await run_benchmark(client, factory, args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the food classifier API")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", help="Test a running server (default: run the app in-process)")
+    target.add_argument("--spawn", action="store_true", help="Start uvicorn locally and test it over HTTP")
+    parser.add_argument("--port", type=int, default=8765, help="Port for --spawn")
+    parser.add_argument("--endpoints", default="predict,base64,batch",
+                        help=f"Comma-separated subset of: {', '.join(ENDPOINTS)}")
+    shape = parser.add_mutually_exclusive_group()
+    shape.add_argument("--concurrency", type=int, default=8, help="Closed-loop clients")
+    shape.add_argument("--rate", type=float, help="Open-loop arrival rate (requests/second)")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint")
+    parser.add_argument("--duration", type=float, help="Seconds per endpoint (overrides --requests)")
+    parser.add_argument("--warmup", type=int, default=5, help="Unmeasured requests per endpoint")
+    parser.add_argument("--batch-size", type=int, default=8, help="Images per request for batch endpoints")
+    parser.add_argument("--image-dir", help="Folder of images to replay")
+    parser.add_argument("--limit", type=int, default=100, help="Max images loaded from --image-dir")
+    parser.add_argument("--synthetic", type=int, default=20, help="Synthetic images when no --image-dir")
+    parser.add_argument("--synthetic-size", default="1280x960", help="WIDTHxHEIGHT of synthetic images")
+    parser.add_argument("--allow-cache", action="store_true", help="Send identical bytes so cache hits count")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    args.endpoints = [e.strip() for e in args.endpoints.split(",") if e.strip()]
+    unknown = [e for e in args.endpoints if e not in ENDPOINTS]
+    if unknown:
+        parser.error(f"Unknown endpoints: {', '.join(unknown)}")
+
+    if args.image_dir:
+        paths = find_images(args.image_dir, args.limit)
+        if not paths:
+            parser.error(f"No images found in {args.image_dir}")
+        corpus = []
+        for path in paths:
+            with open(path, 'rb') as f:
+                corpus.append(f.read())
+        source = args.image_dir
+    else:
+        width, height = (int(v) for v in args.synthetic_size.lower().split("x"))
+        corpus = synthetic_corpus(args.synthetic, width, height, args.seed)
+        source = f"synthetic {width}x{height} JPEGs"
+    print(f"📷 Corpus: {len(corpus)} images ({source})")
+
+    server = None
+    if args.spawn:
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(args.port)],
+            cwd=SCRIPT_DIR
+        )
+        args.url = f"http://127.0.0.1:{args.port}"
+    try:
+        if server is not None:
+            wait_until_ready(args.url, timeout=300)
+        health, results = asyncio.run(main_async(args, corpus))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": git_commit(),
+        "target": "spawn" if args.spawn else (args.url or "in-process"),
+        "model_version": health.get("model_version"),
+        "backend": health.get("backend"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "config": {
+            "endpoints": args.endpoints,
+            "mode": "open_loop" if args.rate else "closed_loop",
+            "concurrency": None if args.rate else args.concurrency,
+            "rate": args.rate,
+            "requests": None if args.duration else args.requests,
+            "duration": args.duration,
+            "batch_size": args.batch_size,
+            "corpus": source,
+            "corpus_size": len(corpus),
+            "allow_cache": args.allow_cache,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Saved {args.output}")
+
+
+if __name__ == "__main__":
+    main()
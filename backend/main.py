@@ -5,22 +5,62 @@ This API serves the food classification model for mobile apps (Flutter, React Na
 To run locally: uvicorn main:app --host 0.0.0.0 --port 8000 --reload
 """
 
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-import torch
-import torch.nn as nn
-from torchvision import transforms, models
+from fastapi.responses import JSONResponse, PlainTextResponse
+from contextlib import asynccontextmanager
 from PIL import Image
+from typing import List, Optional
+import asyncio
+import functools
+import hmac
+import importlib
 import io
-import json
 import os
+import time
+
+SERVER_IMPORT_STARTED = time.perf_counter()
+
+# Only torch-free modules are imported here; torch, torchvision and the modules
+# built on them are imported by the background loader (see import_inference_modules)
+# so the server binds its port and answers /health within a fraction of a second
+from cascade import CascadeStats, is_uncertain
+from metrics import Metrics, RequestMetricsMiddleware, process_cpu_seconds, process_resident_bytes
+from model_registry import ModelRegistry, ServedModel, UnknownModelError, file_signature
+from nutrition_store import get_nutrition_store
+from uploads import (
+    BodySizeLimitMiddleware,
+    InvalidImageError,
+    UploadRejectedError,
+    UploadStats,
+    decode_base64_image,
+    inspect_image,
+    read_request_body,
+    read_upload
+)
+from workers import BoundedExecutor, ServerBusyError
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Serve immediately while the model loads in the background; stop everything on exit"""
+    loader = asyncio.create_task(startup_event())
+    yield
+    if not loader.done():
+        loader.cancel()
+        try:
+            await loader
+        except asyncio.CancelledError:
+            pass
+    await shutdown_event()
+
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Bangladeshi Food Classifier API",
     description="API for classifying Bangladeshi food images using deep learning",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Enable CORS for Flutter/mobile apps
@@ -32,104 +72,942 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global variables for model and class names
-model = None
-class_names = None
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-
-# Image transformation pipeline
-transform = transforms.Compose([
-    transforms.Resize((224, 224)),
-    transforms.ToTensor(),
-    transforms.Normalize(
-        mean=[0.485, 0.456, 0.406],
-        std=[0.229, 0.224, 0.225]
+# Global state; the models themselves live in the registry (created after the config below)
+registry = None
+model_ready = False
+model_status = "loading"
+model_error = None
+startup_profile = {}
+decode_pool = None
+prediction_cache = None
+upload_stats = UploadStats()
+background_tasks = set()
+
+# Micro-batching settings (concurrent requests are grouped into one forward pass)
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", "5"))
+
+# Concurrency limits for CPU-bound work (decode/preprocess threads, model workers)
+DECODE_WORKERS = int(os.environ.get("DECODE_WORKERS", str(min(4, os.cpu_count() or 1))))
+MAX_PENDING_DECODES = int(os.environ.get("MAX_PENDING_DECODES", "32"))
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", "1"))
+MAX_QUEUE_SIZE = int(os.environ.get("MAX_QUEUE_SIZE", "64"))
+RETRY_AFTER_SECONDS = int(os.environ.get("RETRY_AFTER_SECONDS", "1"))
+
+# Maximum number of images accepted by the batch endpoints
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", "32"))
+
+# Upload limits (bytes per image, decoded pixels per image)
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+MAX_IMAGE_PIXELS = int(os.environ.get("MAX_IMAGE_PIXELS", "50000000"))
+
+# Prediction cache (size 0 disables it; set a DB path to keep results across restarts)
+PREDICTION_CACHE_SIZE = int(os.environ.get("PREDICTION_CACHE_SIZE", "1024"))
+PREDICTION_CACHE_TTL = float(os.environ.get("PREDICTION_CACHE_TTL", "3600"))
+PREDICTION_CACHE_DB = os.environ.get("PREDICTION_CACHE_DB", "")
+
+# Model precision: "fp32" (default) or "int8" (quantized artifact built by quantize.py)
+MODEL_PRECISION = os.environ.get("MODEL_PRECISION", "fp32").lower()
+QUANTIZED_MODEL_PATH = os.environ.get("QUANTIZED_MODEL_PATH", "model_int8.pt")
+QUANTIZED_MIN_AGREEMENT = float(os.environ.get("QUANTIZED_MIN_AGREEMENT", "0.98"))
+
+# Optimized artifacts: TorchScript from export_model.py (used when present), optional torch.compile
+TORCHSCRIPT_MODEL_PATH = os.environ.get("TORCHSCRIPT_MODEL_PATH", "model.ts")
+TORCH_COMPILE = os.environ.get("TORCH_COMPILE", "0") == "1"
+
+# Inference backend: "torch" (default) or "onnxruntime" (model.onnx from export_model.py)
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "torch").lower()
+ONNX_MODEL_PATH = os.environ.get("ONNX_MODEL_PATH", "model.onnx")
+ONNX_THREADS = int(os.environ.get("ONNX_THREADS", "0"))
+
+# Preprocessing: "1" uses the draft-mode JPEG decode path, "0" the torchvision transform
+FAST_PREPROCESS = os.environ.get("FAST_PREPROCESS", "1") == "1"
+
+# Warmup forward passes run at startup before the server reports ready
+WARMUP_BATCH_SIZES = [int(size) for size in os.environ.get("WARMUP_BATCH_SIZES", "1,4,8").split(",") if size.strip()]
+
+# Multi-process inference (0 = run the model in this process)
+INFERENCE_PROCESSES = int(os.environ.get("INFERENCE_PROCESSES", "0"))
+INFERENCE_THREADS_PER_WORKER = int(os.environ.get("INFERENCE_THREADS_PER_WORKER", "0"))
+
+# Served models: the model.pth model is served as MODEL_NAME; EXTRA_MODELS serves more side by side
+# ("name=checkpoint.pth,..." relative to backend/, selected per request with ?model=name)
+MODEL_NAME = os.environ.get("MODEL_NAME", "default")
+EXTRA_MODELS = os.environ.get("EXTRA_MODELS", "")
+registry = ModelRegistry(MODEL_NAME)
+
+# Hot reload: POST /models/{name}/reload (enabled by ADMIN_TOKEN) and/or polling the checkpoint files
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+MODEL_WATCH_SECONDS = float(os.environ.get("MODEL_WATCH_SECONDS", "0"))
+MODEL_DRAIN_SECONDS = float(os.environ.get("MODEL_DRAIN_SECONDS", "60"))
+
+# Cascade: requests that name no model go to CASCADE_FAST_MODEL, and images it answers with
+# less than CASCADE_THRESHOLD (0-1) top-1 confidence are re-run on CASCADE_MODEL ("" = off)
+CASCADE_MODEL = os.environ.get("CASCADE_MODEL", "")
+CASCADE_FAST_MODEL = os.environ.get("CASCADE_FAST_MODEL", MODEL_NAME)
+CASCADE_THRESHOLD = float(os.environ.get("CASCADE_THRESHOLD", "0.6"))
+cascade_stats = CascadeStats(CASCADE_THRESHOLD)
+
+# Nutrition data changes only with a new nutrition_data.json, so clients may cache it
+NUTRITION_MAX_AGE = int(os.environ.get("NUTRITION_MAX_AGE", "3600"))
+NUTRITION_CACHE_CONTROL = f"public, max-age={NUTRITION_MAX_AGE}"
+
+# Startup: "1" prints the import/load/warmup time breakdown once the model is ready
+STARTUP_PROFILE = os.environ.get("STARTUP_PROFILE", "0") == "1"
+
+# Modules built on torch, imported by the background loader (torch and torchvision dominate)
+INFERENCE_MODULES = [
+    "torch", "torchvision", "preprocessing", "model_loader", "inference_backends",
+    "export_model", "quantize", "batching", "cache", "process_pool"
+]
+
+# Prometheus metrics at /metrics ("0" removes all request-path instrumentation)
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+metrics = Metrics(enabled=METRICS_ENABLED)
+
+
+def max_request_bytes(path):
+    """Body size limit for a request path (None = unlimited)"""
+    if not path.startswith("/predict"):
+        return None
+    # Room for base64 expansion plus multipart/JSON framing
+    per_image = MAX_UPLOAD_BYTES * 4 // 3 + 64 * 1024
+    return per_image * BATCH_MAX_ITEMS if path.startswith("/predict/batch") else per_image
+
+
+app.add_middleware(BodySizeLimitMiddleware, limit_for_path=max_request_bytes, stats=upload_stats)
+
+
+def register_metrics():
+    """Declare the /metrics series; gauges are read from the live components at scrape time"""
+    metrics.histogram("stage_seconds", "Time spent in each request stage")
+    metrics.histogram("request_seconds", "End-to-end request latency by route")
+    metrics.histogram("batch_size", "Images per forward pass", buckets=(1, 2, 4, 8, 16, 32, 64))
+    metrics.counter("requests_total", "HTTP requests by route and status")
+    metrics.gauge(
+        "model_info", "Served model versions and inference backends",
+        lambda: [
+            ({"model": served.name, "model_version": served.version, "backend": served.backend.name}, 1)
+            for served in registry.models()
+        ] or None
+    )
+    metrics.gauge("model_ready", "1 once the model is loaded and warmed up", lambda: int(model_ready))
+    metrics.gauge(
+        "model_weights_bytes", "Parameter and buffer bytes per served model",
+        lambda: [({"model": served.name}, served.weights_bytes or 0) for served in registry.models()] or None
+    )
+    metrics.gauge(
+        "queue_depth", "Images waiting for a batch",
+        lambda: [
+            ({"model": served.name}, served.batcher.stats()["queue_depth"])
+            for served in registry.models() if served.batcher
+        ] or None
+    )
+    metrics.gauge(
+        "batches_total", "Forward passes run by the batchers",
+        lambda: sum(served.batcher.total_batches for served in registry.models() if served.batcher)
+        if registry.models() else None,
+        metric_type="counter"
+    )
+    metrics.gauge(
+        "cascade_images_total", "Images answered through the cascade, by outcome",
+        lambda: [
+            ({"outcome": "fast"}, cascade_stats.images - cascade_stats.escalated),
+            ({"outcome": "escalated"}, cascade_stats.escalated),
+        ] if CASCADE_MODEL else None,
+        metric_type="counter"
+    )
+    metrics.gauge(
+        "decode_pending", "Images queued or being decoded",
+        lambda: decode_pool.stats()["pending"] if decode_pool else None
+    )
+    metrics.gauge(
+        "cache_hits_total", "Prediction cache hits",
+        lambda: prediction_cache.hits if prediction_cache else None, metric_type="counter"
+    )
+    metrics.gauge(
+        "cache_misses_total", "Prediction cache misses",
+        lambda: prediction_cache.misses if prediction_cache else None, metric_type="counter"
+    )
+    metrics.gauge(
+        "upload_rejections_total", "Uploads refused before decoding, by reason",
+        lambda: [
+            ({"reason": "too_large"}, upload_stats.rejected_too_large),
+            ({"reason": "invalid"}, upload_stats.rejected_invalid),
+        ],
+        metric_type="counter"
+    )
+    metrics.gauge("process_resident_memory_bytes", "Resident memory of the server process", process_resident_bytes)
+    metrics.gauge(
+        "process_cpu_seconds_total", "User + system CPU time of the server process",
+        process_cpu_seconds, metric_type="counter"
     )
-])
 
 
-def detect_model_architecture(state_dict):
-    """Detect model architecture from state dict keys"""
-    keys = list(state_dict.keys())
-    keys_str = ' '.join(keys)
-    
-    # Check for EfficientNet (features-based architecture with blocks)
-    if 'features.0.0.weight' in keys and 'block' in keys_str:
-        # EfficientNet B3 has more blocks than B0
-        if any('features.7' in k for k in keys):
-            return "EfficientNet-B3"
-        return "EfficientNet-B0"
-    
-    if any('efficientnet' in k.lower() for k in keys):
-        if any('_blocks.15' in k for k in keys):
-            return "EfficientNet-B3"
-        return "EfficientNet-B0"
-    
-    if any('denseblock' in k for k in keys):
-        return "DenseNet-121"
-    
-    if any('layer1' in k for k in keys):
-        return "ResNet-50" if any('conv3' in k for k in keys) else "ResNet-18"
-    
-    return "Unknown"
+if METRICS_ENABLED:
+    register_metrics()
+    app.add_middleware(RequestMetricsMiddleware, metrics=metrics, routes=app.routes)
+
+
+class MeteredJSONResponse(JSONResponse):
+    """JSONResponse that records how long serializing the body takes"""
+
+    def render(self, content):
+        with metrics.timer("stage_seconds", stage="serialize"):
+            return super().render(content)
+
+
+def import_inference_modules():
+    """Import torch and the modules built on it, timing each one into startup_profile"""
+    for name in INFERENCE_MODULES:
+        start = time.perf_counter()
+        importlib.import_module(name)
+        startup_profile[f"import_{name}"] = time.perf_counter() - start
+
+
+def print_startup_profile():
+    """Print the startup time breakdown (STARTUP_PROFILE=1)"""
+    print("⏱️ Startup profile:")
+    for phase, seconds in startup_profile.items():
+        print(f"   {phase:<28} {seconds * 1000:9.1f} ms")
+    print("   (python -X importtime -c 'import main' breaks the imports down per module)")
 
 
-def load_model_and_classes():
-    """Load the trained model and class names"""
-    global model, class_names
+def backend_path(path):
+    """Resolve a configured path relative to the backend folder"""
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), path)
+
+
+def model_sources():
+    """(name, checkpoint path) of every configured model; None = model.pth with its optimized artifacts"""
+    sources = [(MODEL_NAME, None)]
+    for entry in EXTRA_MODELS.split(","):
+        name, _, path = entry.partition("=")
+        if name.strip() and path.strip():
+            sources.append((name.strip(), backend_path(path.strip())))
+    return sources
+
+
+def load_model_and_classes(name=None, model_path=None, class_names_path=None):
+    """
+    Load a trained model and its class names into a ServedModel (not serving yet)
     
-    # Paths - adjust based on your deployment
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    model_path = os.path.join(script_dir, "model.pth")
-    class_names_path = os.path.join(script_dir, "class_names.json")
+    Without a model_path this is model.pth, which also picks up the optimized artifacts
+    configured for it (ONNX, int8, TorchScript); other checkpoints load as eager models.
+    Blocking: runs in a worker thread at startup and on reload.
+    """
+    import torch
+    from export_model import load_torchscript_model
+    from inference_backends import OnnxRuntimeBackend, TorchBackend
+    from model_loader import (
+        class_names_path_for,
+        file_fingerprint,
+        load_class_names,
+        load_model,
+        model_size_bytes,
+        resolve_model_paths
+    )
+    from quantize import load_quantized_model
     
-    # Fallback to app directory if not found in backend
-    if not os.path.exists(model_path):
-        model_path = os.path.join(script_dir, "..", "app", "model.pth")
-        class_names_path = os.path.join(script_dir, "..", "app", "class_names.json")
+    name = name or MODEL_NAME
+    started = time.perf_counter()
+    rss_before = process_resident_bytes()
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    model = None
+    inference_backend = None
+    channels_last = False
+    weights_bytes = None
+    artifact = "eager"
+    
+    # Paths - model.pth in the backend folder, falling back to the app folder
+    use_artifacts = model_path is None
+    if use_artifacts:
+        model_path, default_class_names_path = resolve_model_paths()
+    else:
+        default_class_names_path = class_names_path_for(model_path)
+    class_names_path = class_names_path or default_class_names_path
+    signature = file_signature(model_path, class_names_path)
     
     # Load class names
-    with open(class_names_path, 'r') as f:
-        class_dict = json.load(f)
-    class_names = [class_dict[str(i)] for i in range(len(class_dict))]
+    class_names = load_class_names(class_names_path)
     num_classes = len(class_names)
+    fingerprint = file_fingerprint(model_path)
     
-    # Load model state dict and detect architecture
-    state_dict = torch.load(model_path, map_location=device)
-    detected_arch = detect_model_architecture(state_dict)
-    
-    # Create model based on detected architecture
-    if "ResNet-18" in detected_arch:
-        model = models.resnet18(weights=None)
-        model.fc = nn.Linear(model.fc.in_features, num_classes)
-    elif "ResNet-50" in detected_arch:
-        model = models.resnet50(weights=None)
-        model.fc = nn.Linear(model.fc.in_features, num_classes)
-    elif "EfficientNet-B0" in detected_arch:
-        model = models.efficientnet_b0(weights=None)
-        model.classifier[1] = nn.Linear(model.classifier[1].in_features, num_classes)
-    elif "EfficientNet-B3" in detected_arch:
-        model = models.efficientnet_b3(weights=None)
-        model.classifier[1] = nn.Linear(model.classifier[1].in_features, num_classes)
-    elif "DenseNet" in detected_arch:
-        model = models.densenet121(weights=None)
-        model.classifier = nn.Linear(model.classifier.in_features, num_classes)
+    if use_artifacts and INFERENCE_BACKEND == "onnxruntime":
+        # ONNX Runtime runs on the CPU execution provider
+        device = torch.device("cpu")
+        artifact_path = backend_path(ONNX_MODEL_PATH)
+        inference_backend = OnnxRuntimeBackend(artifact_path, ONNX_THREADS)
+        metadata = inference_backend.metadata
+        if metadata.get("source_fingerprint") != fingerprint:
+            raise RuntimeError(
+                f"{ONNX_MODEL_PATH} was exported from {metadata.get('source_model_version')}, "
+                f"not from the current model.pth ({fingerprint})"
+            )
+        detected_arch = f"{metadata.get('architecture')} (ONNX Runtime)"
+        model_version = f"{metadata.get('architecture')}-{fingerprint}-onnx"
+        artifact = f"onnx-{file_fingerprint(artifact_path)}"
+        weights_bytes = os.path.getsize(artifact_path)
+    elif use_artifacts and MODEL_PRECISION == "int8":
+        # Quantized kernels are CPU-only; the artifact must pass the agreement gate
+        device = torch.device("cpu")
+        artifact_path = backend_path(QUANTIZED_MODEL_PATH)
+        model, report = load_quantized_model(artifact_path, QUANTIZED_MIN_AGREEMENT, fingerprint)
+        detected_arch = f"{report['architecture']} (int8 {report['mode']})"
+        model_version = f"{report['architecture']}-{fingerprint}-int8"
+        artifact = f"int8-{report['mode']}-{file_fingerprint(artifact_path)}"
+        print(f"✅ Quantized model agreement: top-1 {report['top1_agreement']:.2%}, top-5 {report['top5_agreement']:.2%}")
     else:
-        raise ValueError(f"Unknown architecture: {detected_arch}")
+        artifact_path = backend_path(TORCHSCRIPT_MODEL_PATH)
+        
+        if use_artifacts and os.path.exists(artifact_path):
+            try:
+                model, metadata = load_torchscript_model(artifact_path, fingerprint, device)
+                detected_arch = f"{metadata['architecture']} (TorchScript)"
+                model_version = f"{metadata['architecture']}-{fingerprint}-ts"
+                channels_last = metadata.get("channels_last", False)
+                artifact = f"ts-{file_fingerprint(artifact_path)}" + ("-channels-last" if channels_last else "")
+            except Exception as e:
+                print(f"⚠️ Ignoring {TORCHSCRIPT_MODEL_PATH}: {e}")
+                model = None
+        
+        if model is None:
+            # Load model state dict, detect architecture and build the model
+            model, detected_arch = load_model(model_path, num_classes, device)
+            model_version = f"{detected_arch}-{fingerprint}"
+            if TORCH_COMPILE:
+                model = torch.compile(model)
+                artifact = "eager-compiled"
+                detected_arch = f"{detected_arch} (torch.compile)"
     
-    model.load_state_dict(state_dict)
-    model.to(device)
-    model.eval()
+    if inference_backend is None:
+        inference_backend = TorchBackend(model, device, channels_last)
+        weights_bytes = model_size_bytes(model)
+    
+    rss_after = process_resident_bytes()
+    served = ServedModel(
+        name, model_version, inference_backend, class_names,
+        model=model,
+        device=device,
+        source={
+            "model_path": os.path.normpath(model_path),
+            "class_names_path": os.path.normpath(class_names_path),
+            "artifacts": use_artifacts,
+            "signature": signature,
+        },
+        weights_bytes=weights_bytes,
+        rss_delta_bytes=rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+        load_seconds=round(time.perf_counter() - started, 3),
+        artifact=artifact
+    )
     
-    print(f"✅ Model loaded: {detected_arch}")
+    print(f"✅ Model loaded: {name} = {detected_arch} ({model_version})")
     print(f"✅ Classes: {num_classes}")
     print(f"✅ Device: {device}")
+    print(f"✅ Inference backend: {inference_backend.name}")
+    return served
+
+
+def preprocess_image(image_bytes):
+    """Decode raw image bytes and apply the model transform (runs in the decode pool)"""
+    from model_loader import transform
+    from preprocessing import decode_image, normalize, resize_to_uint8_tensor
+    
+    with metrics.timer("stage_seconds", stage="decode"):
+        if FAST_PREPROCESS:
+            image = decode_image(image_bytes)
+        else:
+            image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+    with metrics.timer("stage_seconds", stage="transform"):
+        if FAST_PREPROCESS:
+            return normalize(resize_to_uint8_tensor(image))
+        return transform(image)
+
+
+def sniff_image(image_bytes):
+    """Check format and pixel count from the image header; returns the size it will decode at"""
+    from preprocessing import INPUT_SIZE
+    _, _, decoded_size = inspect_image(image_bytes, MAX_IMAGE_PIXELS, INPUT_SIZE if FAST_PREPROCESS else None)
+    return decoded_size
+
+
+def cache_version(served):
+    """
+    Model-version part of a prediction cache key
+
+    Besides the checkpoint version it covers everything that changes the probabilities: the
+    inference backend and the artifact it runs (INT8 mode, TorchScript/ONNX file, channels_last),
+    and the preprocessing mode, since draft-mode JPEG decoding (FAST_PREPROCESS) yields slightly
+    different pixels. Entries on the disk tier outlive restarts, so switching any of these
+    must never serve another configuration's results.
+    """
+    preprocess = "fast" if FAST_PREPROCESS else "exact"
+    return f"{served.version}+{served.backend.name}+{served.artifact}+{preprocess}-preprocess"
+
+
+async def infer_cached(served, image_bytes, is_tensor=False, input_tensor=None, first_pass=True):
+    """
+    Class probabilities for one image from a served model, from the prediction cache when possible
+    
+    image_bytes is an encoded image file, or a pre-resized tensor payload when is_tensor is set.
+    input_tensor skips decoding when the image was already preprocessed; a cascade escalation
+    passes first_pass=False so the upload is not counted in upload_stats twice.
+    Returns (probabilities, cache_hit, input_tensor)
+    """
+    key = None
+    if prediction_cache is not None:
+        key = prediction_cache.key(image_bytes, cache_version(served))
+        cached = await prediction_cache.lookup(key)
+        if cached is not None:
+            if first_pass:
+                upload_stats.record(len(image_bytes))
+            return cached, True, input_tensor
+    
+    if input_tensor is None:
+        if is_tensor:
+            # Already 224x224 uint8 pixels: only the fused normalize is left, no decode pool needed
+            from preprocessing import decode_tensor_payload
+            try:
+                input_tensor = decode_tensor_payload(image_bytes)
+            except ValueError as e:
+                raise InvalidImageError(str(e))
+            if first_pass:
+                upload_stats.record(len(image_bytes))
+        else:
+            # Reject unsupported formats and decompression bombs before decoding any pixels
+            decoded_size = sniff_image(image_bytes)
+            if first_pass:
+                upload_stats.record(len(image_bytes), [decoded_size])
+            input_tensor = await decode_pool.run(preprocess_image, image_bytes)
+    probabilities = await served.batcher.submit(input_tensor)
+    
+    if key is not None:
+        prediction_cache.put(key, probabilities)
+    return probabilities, False, input_tensor
+
+
+async def predict_image_bytes(served, image_bytes, is_tensor=False, cascade=False):
+    """
+    Class probabilities for one image, escalating uncertain answers when cascade is set
+    
+    With cascade (requests that name no model while CASCADE_MODEL is set), an image whose
+    top-1 confidence from served is below CASCADE_THRESHOLD is re-run on CASCADE_MODEL,
+    reusing the preprocessed tensor. If CASCADE_MODEL is too busy or fails, the fast answer is kept.
+    Returns (probabilities, cache_hit, answering ServedModel)
+    """
+    probabilities, cache_hit, input_tensor = await infer_cached(served, image_bytes, is_tensor)
+    if not (cascade and CASCADE_MODEL):
+        return probabilities, cache_hit, served
+    if not is_uncertain(probabilities, CASCADE_THRESHOLD):
+        cascade_stats.record()
+        return probabilities, cache_hit, served
+    
+    with registry.use(CASCADE_MODEL) as accurate:
+        if accurate.class_names != served.class_names:
+            cascade_stats.skipped += 1
+            return probabilities, cache_hit, served
+        try:
+            escalated, escalated_hit, _ = await infer_cached(
+                accurate, image_bytes, is_tensor, input_tensor, first_pass=False
+            )
+        except ServerBusyError:
+            cascade_stats.busy += 1
+            cascade_stats.record()
+            return probabilities, cache_hit, served
+        except Exception as e:
+            print(f"⚠️ Cascade escalation to {CASCADE_MODEL} failed, keeping the fast answer: {type(e).__name__}: {e}")
+            cascade_stats.failed += 1
+            cascade_stats.record()
+            return probabilities, cache_hit, served
+    cascade_stats.record(escalated=True, changed=int(escalated.argmax()) != int(probabilities.argmax()))
+    return escalated, escalated_hit, accurate
+
+
+def record_batch(model_name, batch_size, queue_waits, run_seconds):
+    """Batcher callback (bound to one served model): batch size, per-image queue wait and forward-pass time"""
+    metrics.observe("batch_size", batch_size, model=model_name)
+    metrics.observe("stage_seconds", run_seconds, stage="forward", model=model_name)
+    for wait in queue_waits:
+        metrics.observe("stage_seconds", wait, stage="queue_wait", model=model_name)
+
+
+def warmup_model(run_batch, batch_sizes, repeats=1):
+    """
+    Run dummy forward passes at the typical batch sizes so allocator growth,
+    kernel selection and compilation happen before the first real request
+    """
+    import torch
+    
+    for batch_size in batch_sizes:
+        dummy = torch.zeros(batch_size, 3, 224, 224)
+        # Repeat per inference worker so every worker process gets warmed up
+        for _ in range(repeats):
+            run_batch(dummy)
+
+
+def build_prediction(class_names, probabilities, include_top5=True):
+    """Build the JSON prediction payload from one row of class probabilities"""
+    with metrics.timer("stage_seconds", stage="postprocess"):
+        return _build_prediction(class_names, probabilities, include_top5)
+
+
+def _build_prediction(class_names, probabilities, include_top5):
+    confidence, predicted_idx = probabilities.max(0)
+    confidence_score = float(confidence.item())
+    
+    result = {
+        "success": True,
+        "prediction": {
+            "class": class_names[predicted_idx.item()],
+            "confidence": confidence_score,
+            "confidence_percent": f"{confidence_score * 100:.1f}%"
+        }
+    }
+    
+    if include_top5:
+        result["top5"] = top_k_predictions(class_names, probabilities, 5)
+    
+    return result
+
+
+def top_k_predictions(class_names, probabilities, k):
+    """Top-k classes with their confidence from one row of class probabilities"""
+    top_probs, top_indices = probabilities.topk(min(k, len(class_names)))
+    return [
+        {
+            "class": class_names[idx.item()],
+            "confidence": float(prob.item())
+        }
+        for prob, idx in zip(top_probs, top_indices)
+    ]
+
+
+async def predict_many(served, payloads, top_k, cascade=False):
+    """
+    Decode a list of images in parallel and predict them with a served model in chunked batches
+    
+    Each payload is raw image bytes, or an Exception to report for that item.
+    Returns one result per payload, in input order. A bad image only fails its
+    own entry; a full server fails the whole request with 503. With cascade,
+    uncertain images are re-run on CASCADE_MODEL as in predict_image_bytes.
+    """
+    # Serve repeated images from the cache before doing any decoding
+    probabilities = {}
+    cache_keys = {}
+    if prediction_cache is not None:
+        version = cache_version(served)
+        for i, payload in enumerate(payloads):
+            if not isinstance(payload, Exception):
+                cache_keys[i] = prediction_cache.key(payload, version)
+        cached = await prediction_cache.lookup_many(list(cache_keys.values()))
+        for i, key in cache_keys.items():
+            if key in cached:
+                probabilities[i] = cached[key]
+    
+    # Sniff headers of the remaining images; rejected ones fail only their own entry
+    payloads = list(payloads)
+    decoded_sizes = []
+    for i, payload in enumerate(payloads):
+        if isinstance(payload, Exception) or i in probabilities:
+            continue
+        try:
+            decoded_sizes.append(sniff_image(payload))
+        except UploadRejectedError as e:
+            upload_stats.record_rejection(e)
+            payloads[i] = e
+    upload_stats.record(
+        sum(len(p) for p in payloads if not isinstance(p, Exception)),
+        decoded_sizes
+    )
+    
+    # Bound per-request decode concurrency so one large batch cannot fill the decode pool
+    decode_slots = asyncio.Semaphore(decode_pool.max_workers)
+    
+    async def decode(i, payload):
+        if isinstance(payload, Exception) or i in probabilities:
+            return payload
+        async with decode_slots:
+            return await decode_pool.run(preprocess_image, payload)
+    
+    decoded = await asyncio.gather(*[decode(i, p) for i, p in enumerate(payloads)], return_exceptions=True)
+    for item in decoded:
+        if isinstance(item, ServerBusyError):
+            raise item
+    
+    # Submit newly decoded images in chunks of one batch so the queue is never flooded
+    valid = [
+        (i, tensor) for i, tensor in enumerate(decoded)
+        if i not in probabilities and not isinstance(tensor, BaseException)
+    ]
+    for start in range(0, len(valid), BATCH_MAX_SIZE):
+        chunk = valid[start:start + BATCH_MAX_SIZE]
+        rows = await asyncio.gather(*[served.batcher.submit(tensor) for _, tensor in chunk])
+        for (i, _), row in zip(chunk, rows):
+            probabilities[i] = row
+            if i in cache_keys:
+                prediction_cache.put(cache_keys[i], row)
+    
+    escalated, accurate = {}, None
+    if cascade and CASCADE_MODEL:
+        escalated, accurate = await escalate_many(served, payloads, decoded, probabilities)
+    
+    results = []
+    for i, item in enumerate(decoded):
+        if i in probabilities:
+            row = escalated.get(i, probabilities[i])
+            answered_by = accurate if i in escalated else served
+            with metrics.timer("stage_seconds", stage="postprocess"):
+                prediction = _build_prediction(served.class_names, row, include_top5=False)
+                results.append({
+                    "index": i,
+                    "success": True,
+                    "prediction": prediction["prediction"],
+                    "top_k": top_k_predictions(served.class_names, row, top_k),
+                    "model": answered_by.name
+                })
+                if cascade and CASCADE_MODEL:
+                    results[-1]["escalated"] = i in escalated
+        else:
+            results.append({"index": i, "success": False, "error": str(item)})
+    
+    succeeded = len(probabilities)
+    response = {
+        "success": True,
+        "count": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "results": results,
+        "models": {served.name: served.version}
+    }
+    if escalated:
+        response["models"][accurate.name] = accurate.version
+    if cascade and CASCADE_MODEL:
+        response["escalated"] = len(escalated)
+    return response
+
+
+async def escalate_many(served, payloads, decoded, probabilities):
+    """
+    Re-run the images served is unsure about on CASCADE_MODEL, in chunks of one batch
+    
+    decoded[i] is the preprocessed tensor, or the payload itself for images answered from
+    the cache (those are decoded again only if they escalate). Images that fail on CASCADE_MODEL,
+    or find it too busy, keep the fast answer.
+    Returns ({index: probabilities}, the CASCADE_MODEL ServedModel or None)
+    """
+    uncertain = [i for i in sorted(probabilities) if is_uncertain(probabilities[i], CASCADE_THRESHOLD)]
+    for _ in range(len(probabilities) - len(uncertain)):
+        cascade_stats.record()
+    
+    escalated = {}
+    if not uncertain:
+        return escalated, None
+    with registry.use(CASCADE_MODEL) as accurate:
+        if accurate.class_names != served.class_names:
+            cascade_stats.skipped += len(uncertain)
+            return escalated, None
+        for start in range(0, len(uncertain), BATCH_MAX_SIZE):
+            chunk = uncertain[start:start + BATCH_MAX_SIZE]
+            rows = await asyncio.gather(*[
+                infer_cached(
+                    accurate, payloads[i],
+                    input_tensor=None if isinstance(decoded[i], (bytes, bytearray)) else decoded[i],
+                    first_pass=False
+                )
+                for i in chunk
+            ], return_exceptions=True)
+            for i, row in zip(chunk, rows):
+                if isinstance(row, BaseException):
+                    # Keep the small model's answer
+                    if isinstance(row, ServerBusyError):
+                        cascade_stats.busy += 1
+                    else:
+                        print(f"⚠️ Cascade escalation to {CASCADE_MODEL} failed, keeping the fast answer: "
+                              f"{type(row).__name__}: {row}")
+                        cascade_stats.failed += 1
+                    cascade_stats.record()
+                    continue
+                escalated[i] = row[0]
+                cascade_stats.record(escalated=True, changed=int(row[0].argmax()) != int(probabilities[i].argmax()))
+    return escalated, accurate
+
+
+def check_batch_size(count):
+    """Reject empty or oversized batch requests"""
+    if count == 0:
+        raise HTTPException(status_code=400, detail="No images provided")
+    if count > BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many images: {count} (maximum is {BATCH_MAX_ITEMS})"
+        )
+
+
+def require_model():
+    """Refuse work with 503 until the background loader has the model ready"""
+    if not model_ready:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Model not ready ({model_status})",
+            headers={"Retry-After": str(RETRY_AFTER_SECONDS)}
+        )
+
+
+def use_model(name=None):
+    """
+    Pin the requested model version for one request: `with use_model(name) as served:`
+    
+    Requests that name no model get the default model, or the cascade's fast model
+    """
+    require_model()
+    try:
+        return registry.use(name or (CASCADE_FAST_MODEL if CASCADE_MODEL else None))
+    except UnknownModelError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+def model_headers(served, cache_hit=None, escalated=None):
+    """Response headers naming the model version that produced a prediction"""
+    headers = {"X-Model": served.name, "X-Model-Version": served.version}
+    if cache_hit is not None:
+        headers["X-Cache"] = "HIT" if cache_hit else "MISS"
+    if escalated is not None:
+        headers["X-Cascade"] = "escalated" if escalated else "fast"
+    return headers
+
+
+def batch_headers(response):
+    """
+    Response headers for a predict_many response
+
+    X-Model and X-Model-Version list every model that answered an item (the fast and the
+    accurate model when the cascade escalated some); each result names its own "model".
+    """
+    return {
+        "X-Model": ", ".join(response["models"]),
+        "X-Model-Version": ", ".join(response["models"].values())
+    }
+
+
+def cascade_headers(served, answered_by, cache_hit, requested_model):
+    """model_headers for the model that answered, with X-Cascade when the request went through the cascade"""
+    escalated = answered_by is not served if requested_model is None and CASCADE_MODEL else None
+    return model_headers(answered_by, cache_hit, escalated)
+
+
+def spawn(coro):
+    """Run a coroutine in the background, keeping a reference until it finishes"""
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+
+async def start_served_model(served):
+    """Start worker processes (optional), warm up and start the batching queue of a loaded model"""
+    import torch
+    from batching import MicroBatcher
+    from process_pool import InferenceProcessPool
+    
+    run_batch, inference_workers = served.backend.run, INFERENCE_WORKERS
+    if INFERENCE_PROCESSES > 0:
+        if served.model is None:
+            print("⚠️ INFERENCE_PROCESSES is only supported by the torch backend, running in-process")
+        elif isinstance(served.model, torch.jit.ScriptModule):
+            print("⚠️ INFERENCE_PROCESSES is not supported for TorchScript artifacts, running in-process")
+        elif served.device.type == "cpu":
+            served.process_pool = await asyncio.to_thread(
+                InferenceProcessPool, served.model, INFERENCE_PROCESSES, INFERENCE_THREADS_PER_WORKER or None
+            )
+            run_batch, inference_workers = served.process_pool.run, served.process_pool.num_workers
+            print(f"✅ Inference processes: {served.process_pool.num_workers} x {served.process_pool.threads_per_worker} threads (shared weights)")
+        else:
+            print("⚠️ INFERENCE_PROCESSES is only supported on CPU, running in-process")
+    
+    if WARMUP_BATCH_SIZES:
+        start = time.perf_counter()
+        await asyncio.to_thread(warmup_model, run_batch, WARMUP_BATCH_SIZES, inference_workers)
+        print(f"✅ Warmup: batch sizes {WARMUP_BATCH_SIZES} in {time.perf_counter() - start:.2f}s")
+    
+    served.batcher = MicroBatcher(
+        run_batch,
+        max_batch_size=BATCH_MAX_SIZE,
+        max_wait_ms=BATCH_MAX_WAIT_MS,
+        max_queue_size=MAX_QUEUE_SIZE,
+        inference_workers=inference_workers,
+        on_batch=functools.partial(record_batch, served.name) if METRICS_ENABLED else None
+    )
+    served.batcher.start()
+    print(f"✅ Batching ({served.name}): max {BATCH_MAX_SIZE} images, {BATCH_MAX_WAIT_MS:g} ms wait, {inference_workers} inference workers")
+
+
+async def reload_model(name, model_path=None, class_names_path=None):
+    """
+    Load a new version of a model in the background, warm it up and swap it in
+    
+    Requests already running finish on the old version, which is stopped once idle.
+    If anything fails the old version keeps serving.
+    """
+    current = registry.get(name) if name in registry else None
+    if model_path is None and current is not None and not current.source["artifacts"]:
+        model_path = current.source["model_path"]
+        class_names_path = class_names_path or current.source["class_names_path"]
+    
+    registry.reloads[name] = {"status": "loading", "started_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    try:
+        served = await asyncio.to_thread(load_model_and_classes, name, model_path, class_names_path)
+        try:
+            await start_served_model(served)
+        except Exception:
+            # Warmup or the batcher failed after worker processes may have started
+            await served.stop()
+            raise
+    except Exception as e:
+        registry.reloads[name] = {
+            "status": "failed",
+            "error": f"{type(e).__name__}: {e}",
+            "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            # The watcher does not retry the same files
+            "signature": file_signature(*current.source_files()) if current is not None else None
+        }
+        print(f"❌ Reloading {name} failed, keeping the current version: {type(e).__name__}: {e}")
+        return
+    
+    previous = registry.publish(served)
+    if previous is not None:
+        spawn(registry.retire(previous, MODEL_DRAIN_SECONDS))
+    registry.reloads[name] = {
+        "status": "done",
+        "version": served.version,
+        "previous_version": previous.version if previous is not None else None,
+        "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S")
+    }
+    print(f"✅ Serving {name}: {served.version}" + (f" (replaces {previous.version})" if previous else ""))
+
+
+async def watch_models():
+    """Reload a model when its checkpoint or class names file changes on disk (MODEL_WATCH_SECONDS)"""
+    while True:
+        await asyncio.sleep(MODEL_WATCH_SECONDS)
+        for served in registry.models():
+            reload = registry.reloads.get(served.name, {})
+            if reload.get("status") == "loading":
+                continue
+            signature = file_signature(*served.source_files())
+            if signature != served.source["signature"] and signature != reload.get("signature"):
+                print(f"🔁 {served.name}: checkpoint changed on disk, reloading")
+                await reload_model(served.name)
 
 
-@app.on_event("startup")
 async def startup_event():
-    """Load model when server starts"""
-    load_model_and_classes()
+    """
+    Load the models, start the decode pool and the batching queues (background task)
+    
+    Blocking steps run in worker threads so /health and /ready keep answering
+    while torch is imported and the models are loaded and warmed up.
+    """
+    global decode_pool, prediction_cache, model_ready, model_status, model_error
+    started = time.perf_counter()
+    startup_profile["import_server"] = started - SERVER_IMPORT_STARTED
+    
+    try:
+        await asyncio.to_thread(import_inference_modules)
+        from cache import PredictionCache
+        
+        names = [name for name, _ in model_sources()]
+        if CASCADE_MODEL and (CASCADE_MODEL not in names or CASCADE_FAST_MODEL not in names):
+            raise RuntimeError(f"CASCADE_MODEL and CASCADE_FAST_MODEL must name served models ({', '.join(names)})")
+        
+        phase_start = time.perf_counter()
+        loaded = []
+        for name, model_path in model_sources():
+            loaded.append(await asyncio.to_thread(load_model_and_classes, name, model_path))
+        startup_profile["load_model"] = time.perf_counter() - phase_start
+        
+        decode_pool = BoundedExecutor(DECODE_WORKERS, MAX_PENDING_DECODES, name="decode")
+        print(f"✅ Workers: {DECODE_WORKERS} decode")
+        
+        if PREDICTION_CACHE_SIZE > 0:
+            cache_db = None
+            if PREDICTION_CACHE_DB:
+                # Relative paths are kept next to the backend files (alongside food_app.db)
+                cache_db = backend_path(PREDICTION_CACHE_DB)
+            prediction_cache = PredictionCache(PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL, cache_db)
+            print(f"✅ Prediction cache: {PREDICTION_CACHE_SIZE} entries" + (f", disk tier at {cache_db}" if cache_db else ""))
+        
+        model_status = "warming_up"
+        phase_start = time.perf_counter()
+        for served in loaded:
+            try:
+                await start_served_model(served)
+            except Exception:
+                await served.stop()
+                raise
+            registry.publish(served)
+        startup_profile["warmup"] = time.perf_counter() - phase_start
+        if CASCADE_MODEL:
+            if registry.get(CASCADE_MODEL).class_names != registry.get(CASCADE_FAST_MODEL).class_names:
+                raise RuntimeError(f"{CASCADE_FAST_MODEL} and {CASCADE_MODEL} have different class names")
+            print(f"✅ Cascade: {CASCADE_FAST_MODEL} first, {CASCADE_MODEL} below {CASCADE_THRESHOLD:.0%} confidence")
+    except Exception as e:
+        model_status = "failed"
+        model_error = f"{type(e).__name__}: {e}"
+        print(f"❌ Model loading failed: {model_error}")
+        return
+    
+    check_nutrition_store()
+    model_ready = True
+    model_status = "healthy"
+    startup_profile["total"] = time.perf_counter() - SERVER_IMPORT_STARTED
+    print(f"✅ Ready {startup_profile['total']:.2f}s after import")
+    if STARTUP_PROFILE:
+        print_startup_profile()
+    if MODEL_WATCH_SECONDS > 0:
+        spawn(watch_models())
+        print(f"✅ Watching model files every {MODEL_WATCH_SECONDS:g}s")
+
+
+def check_nutrition_store():
+    """Load nutrition_data.json and report class names without a nutrition entry (never fatal)"""
+    try:
+        store = get_nutrition_store()
+    except Exception as e:
+        print(f"⚠️ Nutrition data unavailable: {type(e).__name__}: {e}")
+        return
+    print(f"✅ Nutrition data v{store.version}: {len(store.records)} foods")
+    for served in registry.models():
+        unresolved = store.unresolved(served.class_names)
+        if unresolved:
+            print(f"⚠️ {served.name}: no nutrition entry for {', '.join(unresolved)}")
+
+
+async def shutdown_event():
+    """Stop the model watcher, the batching queues and the worker pools"""
+    for task in list(background_tasks):
+        task.cancel()
+    await registry.close()
+    if decode_pool is not None:
+        decode_pool.shutdown()
+    if prediction_cache is not None:
+        # Flushes the write-behind queue to disk, so keep it off the event loop
+        await asyncio.to_thread(prediction_cache.close)
+
+
+@app.exception_handler(ServerBusyError)
+async def server_busy_handler(request: Request, exc: ServerBusyError):
+    """Reject work with 503 when a bounded stage is full so clients back off"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"Server busy: {exc}"},
+        headers={"Retry-After": str(RETRY_AFTER_SECONDS)}
+    )
+
+
+@app.exception_handler(UploadRejectedError)
+async def upload_rejected_handler(request: Request, exc: UploadRejectedError):
+    """Reject oversized (413) or undecodable/oversized-in-pixels (422) images before decoding"""
+    upload_stats.record_rejection(exc)
+    return JSONResponse(status_code=exc.status_code, content={"detail": str(exc)})
 
 
 @app.get("/")
@@ -141,134 +1019,386 @@ async def root():
         "version": "1.0.0",
         "endpoints": {
             "predict": "/predict",
+            "predict_raw": "/predict/raw",
+            "predict_batch": "/predict/batch",
             "classes": "/classes",
-            "health": "/health"
+            "nutrition": "/nutrition/{class_name}",
+            "models": "/models",
+            "health": "/health",
+            "ready": "/ready",
+            "batching": "/stats/batching",
+            "cascade": "/stats/cascade",
+            "cache": "/stats/cache",
+            "uploads": "/stats/uploads",
+            "metrics": "/metrics"
         }
     }
 
 
 @app.get("/health")
 async def health_check():
-    """Health check for monitoring"""
-    return {
-        "status": "healthy",
-        "model_loaded": model is not None,
-        "num_classes": len(class_names) if class_names else 0
+    """
+    Liveness check: answers as soon as the server is up, while the model is still loading
+    
+    status is loading, warming_up, healthy or failed (503, so the platform restarts the process)
+    """
+    served = registry.get() if registry.default_name in registry else None
+    content = {
+        "status": model_status,
+        "ready": model_ready,
+        "model_loaded": served is not None,
+        "model_version": served.version if served else None,
+        "backend": served.backend.name if served else None,
+        "num_classes": len(served.class_names) if served else 0,
+        "models": registry.names()
     }
+    if model_error:
+        content["error"] = model_error
+    return JSONResponse(status_code=503 if model_status == "failed" else 200, content=content)
+
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness check: 200 once the model is loaded and warmed up, 503 until then"""
+    content = {
+        "ready": model_ready,
+        "status": model_status,
+        "model_version": registry.get().version if registry.default_name in registry else None,
+        "startup_seconds": {phase: round(seconds, 4) for phase, seconds in startup_profile.items()}
+    }
+    if model_ready:
+        return content
+    return JSONResponse(status_code=503, content=content, headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
 
 
 @app.get("/classes")
-async def get_classes():
-    """Get list of all food classes"""
-    if class_names is None:
-        raise HTTPException(status_code=500, detail="Model not loaded")
+async def get_classes(model: Optional[str] = None):
+    """Get list of all food classes (of the default model, or ?model=<name>)"""
+    with use_model(model) as served:
+        return {
+            "classes": served.class_names,
+            "count": len(served.class_names)
+        }
+
+
+@app.get("/nutrition")
+async def list_nutrition():
+    """Foods in the nutrition database and its data version"""
+    store = get_nutrition_store()
+    return JSONResponse(
+        {"version": store.version, "foods": list(store.records), "count": len(store.records)},
+        headers={"Cache-Control": NUTRITION_CACHE_CONTROL}
+    )
+
+
+@app.get("/nutrition/{class_name}")
+async def get_nutrition(class_name: str):
+    """
+    Nutrition facts for a food class
+
+    Accepts class names as returned by /predict ("Chicken Roast"), normalized keys
+    (chicken_roast), common alternate spellings and near misses.
+    """
+    store = get_nutrition_store()
+    key, match = store.resolve(class_name)
+    if key is None:
+        raise HTTPException(status_code=404, detail=f"No nutrition data for {class_name}")
+    return JSONResponse(
+        {"version": store.version, "match": match, **store.records[key].to_dict()},
+        headers={"Cache-Control": NUTRITION_CACHE_CONTROL}
+    )
+
+
+@app.get("/models")
+async def list_models():
+    """Served models with their version, memory use and in-flight requests, plus reload status"""
+    return {
+        "default": registry.default_name,
+        "models": [served.info() for served in registry.models()],
+        "reloads": {
+            name: {key: value for key, value in reload.items() if key != "signature"}
+            for name, reload in registry.reloads.items()
+        },
+        "retired_versions": registry.retired,
+        "process_resident_bytes": process_resident_bytes()
+    }
+
+
+@app.post("/models/{name}/reload", status_code=202)
+async def reload_model_endpoint(name: str, data: Optional[dict] = None, x_admin_token: str = Header("")):
+    """
+    Load a new version of a model in the background and swap it in once warmed up
+    
+    - **X-Admin-Token** header: must match ADMIN_TOKEN (the endpoint is disabled without it)
+    - **data**: optional JSON with "model_path" and "class_names_path" (relative to backend/);
+      without it the model's current files are reloaded. A new name with a model_path adds a model.
+    
+    In-flight requests finish on the old version; poll /models for the outcome
+    """
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Model reload is disabled (set ADMIN_TOKEN)")
+    if not hmac.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+    require_model()
+    
+    data = data or {}
+    model_path = data.get("model_path")
+    class_names_path = data.get("class_names_path")
+    if name not in registry and not model_path:
+        raise HTTPException(status_code=404, detail=f"Unknown model: {name} (pass a model_path to add it)")
+    if registry.reloads.get(name, {}).get("status") == "loading":
+        raise HTTPException(status_code=409, detail=f"{name} is already being reloaded")
+    
+    registry.reloads[name] = {"status": "loading", "started_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    spawn(reload_model(
+        name,
+        backend_path(model_path) if model_path else None,
+        backend_path(class_names_path) if class_names_path else None
+    ))
+    return {"status": "loading", "model": name}
+
+
+@app.get("/stats/batching")
+async def batching_stats():
+    """Batch-size and queue-wait metrics for the micro-batching queues and decode pool"""
+    require_model()
+    served = registry.get()
+    stats = {**served.batcher.stats(), "decode": decode_pool.stats()}
+    if served.process_pool is not None:
+        stats["processes"] = served.process_pool.stats()
+    stats["models"] = {entry.name: entry.batcher.stats() for entry in registry.models()}
+    return stats
+
+
+@app.get("/stats/cascade")
+async def cascade_stats_endpoint():
+    """Escalation rate of the cascade and its estimated speedup over the larger model alone"""
+    if not CASCADE_MODEL:
+        return {"enabled": False}
+    forward_ms = {
+        served.name: served.batcher.stats()["forward_ms_per_image"]
+        for served in registry.models() if served.batcher is not None
+    }
     return {
-        "classes": class_names,
-        "count": len(class_names)
+        "enabled": True,
+        "fast_model": CASCADE_FAST_MODEL,
+        "accurate_model": CASCADE_MODEL,
+        **cascade_stats.stats(forward_ms.get(CASCADE_FAST_MODEL), forward_ms.get(CASCADE_MODEL))
+    }
+
+
+@app.get("/stats/cache")
+async def cache_stats():
+    """Hit/miss/eviction counters for the prediction cache"""
+    if prediction_cache is None:
+        return {"enabled": False}
+    model_version = cache_version(registry.get()) if registry.default_name in registry else None
+    return {"enabled": True, "model_version": model_version, **(await asyncio.to_thread(prediction_cache.stats))}
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus metrics: per-stage latency histograms, counters, queue depth, process gauges"""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/stats/uploads")
+async def uploads_stats():
+    """Upload sizes, early rejections and estimated peak memory per request"""
+    return {
+        "upload_limit_bytes": MAX_UPLOAD_BYTES,
+        "image_pixel_limit": MAX_IMAGE_PIXELS,
+        **upload_stats.stats()
     }
 
 
 @app.post("/predict")
-async def predict(file: UploadFile = File(...)):
+async def predict(file: UploadFile = File(...), model: Optional[str] = None):
     """
     Predict food class from uploaded image
     
     - **file**: Image file (JPEG, PNG, etc.)
+    - **model**: Served model to use (see /models; the default model when omitted)
     
     Returns predicted class and confidence score
     """
-    if model is None or class_names is None:
-        raise HTTPException(status_code=500, detail="Model not loaded")
+    require_model()
     
     # Validate file type
     if not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="File must be an image")
     
-    try:
-        # Read and process image
-        contents = await file.read()
-        image = Image.open(io.BytesIO(contents)).convert("RGB")
-        
-        # Transform image
-        input_tensor = transform(image).unsqueeze(0).to(device)
-        
-        # Predict
-        with torch.no_grad():
-            outputs = model(input_tensor)
-            probabilities = torch.softmax(outputs, dim=1)
-            confidence, predicted_idx = torch.max(probabilities, 1)
-        
-        predicted_class = class_names[predicted_idx.item()]
-        confidence_score = float(confidence.item())
-        
-        # Get top 5 predictions
-        top5_probs, top5_indices = torch.topk(probabilities, min(5, len(class_names)))
-        top5_predictions = [
-            {
-                "class": class_names[idx.item()],
-                "confidence": float(prob.item())
-            }
-            for prob, idx in zip(top5_probs[0], top5_indices[0])
-        ]
-        
-        return JSONResponse(content={
-            "success": True,
-            "prediction": {
-                "class": predicted_class,
-                "confidence": confidence_score,
-                "confidence_percent": f"{confidence_score * 100:.1f}%"
-            },
-            "top5": top5_predictions
-        })
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
+    with use_model(model) as served:
+        try:
+            # Read the upload in chunks, stopping at MAX_UPLOAD_BYTES
+            with metrics.timer("stage_seconds", stage="upload_read"):
+                contents = await read_upload(file, MAX_UPLOAD_BYTES)
+            
+            # Predict as part of a batch (or reuse the result for an identical upload)
+            probabilities, cache_hit, answered_by = await predict_image_bytes(served, contents, cascade=model is None)
+            
+            return MeteredJSONResponse(
+                content=build_prediction(served.class_names, probabilities),
+                headers=cascade_headers(served, answered_by, cache_hit, model)
+            )
+            
+        except (ServerBusyError, UploadRejectedError):
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
 
 
 @app.post("/predict/base64")
-async def predict_base64(data: dict):
+async def predict_base64(data: dict, model: Optional[str] = None):
     """
     Predict food class from base64 encoded image
     Useful for Flutter apps that send base64 strings
     
     - **data**: JSON with "image" key containing base64 string
+    - **model**: Served model to use (see /models; the default model when omitted)
     """
-    import base64
-    
-    if model is None or class_names is None:
-        raise HTTPException(status_code=500, detail="Model not loaded")
+    require_model()
     
     if "image" not in data:
         raise HTTPException(status_code=400, detail="Missing 'image' field")
     
-    try:
-        # Decode base64 image
-        image_data = base64.b64decode(data["image"])
-        image = Image.open(io.BytesIO(image_data)).convert("RGB")
-        
-        # Transform image
-        input_tensor = transform(image).unsqueeze(0).to(device)
-        
-        # Predict
-        with torch.no_grad():
-            outputs = model(input_tensor)
-            probabilities = torch.softmax(outputs, dim=1)
-            confidence, predicted_idx = torch.max(probabilities, 1)
-        
-        predicted_class = class_names[predicted_idx.item()]
-        confidence_score = float(confidence.item())
+    with use_model(model) as served:
+        try:
+            # Decode base64 image (size is checked before decoding)
+            with metrics.timer("stage_seconds", stage="upload_read"):
+                image_data = decode_base64_image(data["image"], MAX_UPLOAD_BYTES)
+            
+            # Predict as part of a batch (or reuse the result for an identical upload)
+            probabilities, cache_hit, answered_by = await predict_image_bytes(served, image_data, cascade=model is None)
+            
+            return MeteredJSONResponse(
+                content=build_prediction(served.class_names, probabilities, include_top5=False),
+                headers=cascade_headers(served, answered_by, cache_hit, model)
+            )
+            
+        except (ServerBusyError, UploadRejectedError):
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
+
+
+@app.post("/predict/raw")
+async def predict_raw(request: Request, model: Optional[str] = None):
+    """
+    Predict food class from the raw request body (no multipart, no base64 JSON)
+    
+    - **Content-Type: image/*** or **application/octet-stream**: the image file bytes
+    - **Content-Type: application/x-food-tensor**: pre-resized 224x224 RGB uint8 pixels
+      with a 9-byte header (see preprocessing.py)
+    - **model**: Served model to use (see /models; the default model when omitted)
+    
+    Returns predicted class, confidence score and top-5 predictions
+    """
+    require_model()
+    
+    from preprocessing import TENSOR_CONTENT_TYPE
+    
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    is_tensor = content_type == TENSOR_CONTENT_TYPE
+    if not (is_tensor or content_type.startswith("image/") or content_type == "application/octet-stream"):
+        raise HTTPException(
+            status_code=415,
+            detail=f"Content-Type must be image/*, application/octet-stream or {TENSOR_CONTENT_TYPE}"
+        )
+    
+    with use_model(model) as served:
+        try:
+            with metrics.timer("stage_seconds", stage="upload_read"):
+                body = await read_request_body(request, MAX_UPLOAD_BYTES, writable=is_tensor)
+            probabilities, cache_hit, answered_by = await predict_image_bytes(
+                served, body, is_tensor, cascade=model is None
+            )
+            
+            return MeteredJSONResponse(
+                content=build_prediction(served.class_names, probabilities),
+                headers=cascade_headers(served, answered_by, cache_hit, model)
+            )
+            
+        except (HTTPException, ServerBusyError, UploadRejectedError):
+            # HTTPException: body size limit hit by BodySizeLimitMiddleware while streaming
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
+
+
+@app.post("/predict/batch")
+async def predict_batch(files: List[UploadFile] = File(...), top_k: int = 5, model: Optional[str] = None):
+    """
+    Predict food classes for many uploaded images in one request
+    
+    - **files**: Image files (JPEG, PNG, etc.), at most BATCH_MAX_ITEMS
+    - **top_k**: Number of top predictions to return per image
+    - **model**: Served model to use (see /models; the default model when omitted)
+    
+    Returns per-image results in input order; a bad image only fails its own entry
+    """
+    require_model()
+    check_batch_size(len(files))
+    
+    with use_model(model) as served:
+        payloads = []
+        for file in files:
+            if not (file.content_type or "").startswith("image/"):
+                payloads.append(ValueError("File must be an image"))
+            else:
+                try:
+                    with metrics.timer("stage_seconds", stage="upload_read"):
+                        payloads.append(await read_upload(file, MAX_UPLOAD_BYTES))
+                except UploadRejectedError as e:
+                    upload_stats.record_rejection(e)
+                    payloads.append(e)
         
-        return JSONResponse(content={
-            "success": True,
-            "prediction": {
-                "class": predicted_class,
-                "confidence": confidence_score,
-                "confidence_percent": f"{confidence_score * 100:.1f}%"
-            }
-        })
+        try:
+            response = await predict_many(served, payloads, max(1, top_k), cascade=model is None)
+            return MeteredJSONResponse(content=response, headers=batch_headers(response))
+        except (ServerBusyError, UploadRejectedError):
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
+
+
+@app.post("/predict/batch/base64")
+async def predict_batch_base64(data: dict, top_k: int = 5, model: Optional[str] = None):
+    """
+    Predict food classes for many base64 encoded images in one request
+    
+    - **data**: JSON with "images" key containing a list of base64 strings
+    - **top_k**: Number of top predictions to return per image
+    - **model**: Served model to use (see /models; the default model when omitted)
+    
+    Returns per-image results in input order; a bad image only fails its own entry
+    """
+    require_model()
+    
+    images = data.get("images")
+    if not isinstance(images, list):
+        raise HTTPException(status_code=400, detail="Missing 'images' list")
+    check_batch_size(len(images))
+    
+    with use_model(model) as served:
+        payloads = []
+        for image in images:
+            try:
+                with metrics.timer("stage_seconds", stage="upload_read"):
+                    payloads.append(decode_base64_image(image, MAX_UPLOAD_BYTES))
+            except UploadRejectedError as e:
+                upload_stats.record_rejection(e)
+                payloads.append(e)
         
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
+        try:
+            response = await predict_many(served, payloads, max(1, top_k), cascade=model is None)
+            return MeteredJSONResponse(content=response, headers=batch_headers(response))
+        except (ServerBusyError, UploadRejectedError):
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,250 @@
+"""
+Lightweight Prometheus-style metrics for the API server
+
+Histograms and counters are plain Python objects updated under a lock and
+rendered in the Prometheus text exposition format by /metrics; there is no
+client library dependency. Gauges are callables evaluated only at scrape time,
+so they cost nothing on the request path.
+
+When disabled, timer() hands back one shared no-op context manager and
+observe()/inc() return immediately, so instrumented code pays only a method call.
+"""
+
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Seconds; covers sub-millisecond stages up to slow forward passes
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_NULL_TIMER = nullcontext()
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+class _Timer:
+    __slots__ = ("metrics", "name", "labels", "start")
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class Metrics:
+    """Registry of counters, histograms and scrape-time gauges"""
+
+    def __init__(self, enabled=True, prefix="food_"):
+        self.enabled = enabled
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._help = {}
+        self._types = {}
+        self._buckets = {}
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = []
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        """Declare a histogram (observations outside the last bucket land only in +Inf)"""
+        self._declare(name, help_text, "histogram")
+        self._buckets[name] = tuple(buckets)
+
+    def counter(self, name, help_text):
+        self._declare(name, help_text, "counter")
+
+    def gauge(self, name, help_text, collect, metric_type="gauge"):
+        """
+        Declare a metric whose value is read at scrape time
+
+        collect() returns a number, a list of (labels_dict, value) pairs, or None to skip.
+        Use metric_type="counter" for cumulative values kept elsewhere (e.g. cache hits).
+        """
+        self._declare(name, help_text, metric_type)
+        self._gauges.append((name, collect))
+
+    def _declare(self, name, help_text, metric_type):
+        self._help[name] = help_text
+        self._types[name] = metric_type
+
+    def observe(self, name, value, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(self._buckets[name])
+            histogram.observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def timer(self, name, **labels):
+        """Context manager observing the elapsed seconds into histogram `name`"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name, labels)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+            snapshots = [
+                (key, list(h.counts), h.sum, h.count, h.buckets) for key, h in histograms
+            ]
+
+        emitted = set()
+
+        def header(name):
+            if name not in emitted:
+                emitted.add(name)
+                lines.append(f"# HELP {self.prefix}{name} {self._help[name]}")
+                lines.append(f"# TYPE {self.prefix}{name} {self._types[name]}")
+
+        for (name, labels), value in counters:
+            header(name)
+            lines.append(f"{self.prefix}{name}{_format_labels(labels)} {_format_value(value)}")
+
+        for (name, labels), counts, total, count, buckets in snapshots:
+            header(name)
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                bucket_labels = labels + (("le", _format_value(bound)),)
+                lines.append(f"{self.prefix}{name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+            lines.append(f"{self.prefix}{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{self.prefix}{name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.prefix}{name}_count{_format_labels(labels)} {count}")
+
+        for name, collect in self._gauges:
+            value = collect()
+            if value is None:
+                continue
+            header(name)
+            samples = value if isinstance(value, list) else [({}, value)]
+            for labels, sample in samples:
+                label_items = tuple(sorted(labels.items()))
+                lines.append(f"{self.prefix}{name}{_format_labels(label_items)} {_format_value(sample)}")
+
+        return "\n".join(lines) + "\n"
+
+
+def process_resident_bytes():
+    """Current resident set size (Linux /proc), falling back to the peak RSS"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        if resource is None:
+            return None
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def process_cpu_seconds():
+    """User + system CPU time of this process"""
+    times = os.times()
+    return times.user + times.system
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware counting requests and timing them per route and status
+
+    Requests are labelled with the path template of the route they match (e.g.
+    "/models/{name}"), so parameterized routes do not multiply label values.
+    """
+
+    def __init__(self, app, metrics, routes):
+        """
+        Args:
+            metrics: Metrics registry with request_seconds and requests_total declared
+            routes: The application's route list; requests matching no route are reported as "other"
+        """
+        from starlette.routing import Match
+
+        self.app = app
+        self.metrics = metrics
+        self.routes = routes
+        self._no_match = Match.NONE
+
+    def route_path(self, scope):
+        """Path template of the first route matching scope ("other" when none does)"""
+        for route in self.routes:
+            match, _ = route.matches(scope)
+            if match is not self._no_match:
+                return getattr(route, "path", "other")
+        return "other"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+        path = self.route_path(scope)
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self.metrics.observe("request_seconds", time.perf_counter() - start, path=path)
+            self.metrics.inc("requests_total", path=path, status=str(status))
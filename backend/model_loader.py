@@ -0,0 +1,218 @@
+"""
+Model loading helpers shared by the API server and the command-line tools
+
+Finds the checkpoint and class names, detects the architecture from the
+state_dict keys and builds the matching torchvision model. Also holds the
+image transform so every entry point preprocesses images identically.
+
+Weights are memory-mapped rather than unpickled into fresh memory: a
+model.safetensors converted from model.pth (convert_weights.py) is preferred
+when present, otherwise model.pth is opened with torch.load(mmap=True). The
+model is built on the meta device and the mapped tensors are assigned to it
+directly, so pages are read lazily and shared through the page cache by every
+process that loads the same file.
+"""
+
+import hashlib
+import json
+import os
+
+import torch
+import torch.nn as nn
+from torchvision import models, transforms
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Image transformation pipeline
+transform = transforms.Compose([
+    transforms.Resize((224, 224)),
+    transforms.ToTensor(),
+    transforms.Normalize(
+        mean=[0.485, 0.456, 0.406],
+        std=[0.229, 0.224, 0.225]
+    )
+])
+
+
+SUPPORTED_ARCHITECTURES = ("ResNet-18", "ResNet-50", "EfficientNet-B0", "EfficientNet-B3", "DenseNet-121")
+
+
+def efficientnet_variant(stem_weight):
+    """
+    EfficientNet variant from its stem convolution weight
+
+    B0 and B3 have the same stage layout (features.0-8), so the keys cannot tell them
+    apart; the stem is 32 channels wide in B0 and 40 in B3.
+    """
+    return "EfficientNet-B3" if stem_weight.shape[0] >= 40 else "EfficientNet-B0"
+
+
+def detect_model_architecture(state_dict):
+    """Detect model architecture from state dict keys (and the stem width for EfficientNet)"""
+    keys = list(state_dict.keys())
+    keys_str = ' '.join(keys)
+
+    # Check for EfficientNet (features-based architecture with blocks)
+    if 'features.0.0.weight' in keys and 'block' in keys_str:
+        return efficientnet_variant(state_dict['features.0.0.weight'])
+
+    stem_keys = [k for k in keys if k.endswith('_conv_stem.weight')]
+    if stem_keys:
+        return efficientnet_variant(state_dict[stem_keys[0]])
+
+    if any('denseblock' in k for k in keys):
+        return "DenseNet-121"
+
+    if any('layer1' in k for k in keys):
+        return "ResNet-50" if any('conv3' in k for k in keys) else "ResNet-18"
+
+    return "Unknown"
+
+
+def create_model(detected_arch, num_classes):
+    """Build an untrained torchvision model with a classifier head for num_classes"""
+    if "ResNet-18" in detected_arch:
+        model = models.resnet18(weights=None)
+        model.fc = nn.Linear(model.fc.in_features, num_classes)
+    elif "ResNet-50" in detected_arch:
+        model = models.resnet50(weights=None)
+        model.fc = nn.Linear(model.fc.in_features, num_classes)
+    elif "EfficientNet-B0" in detected_arch:
+        model = models.efficientnet_b0(weights=None)
+        model.classifier[1] = nn.Linear(model.classifier[1].in_features, num_classes)
+    elif "EfficientNet-B3" in detected_arch:
+        model = models.efficientnet_b3(weights=None)
+        model.classifier[1] = nn.Linear(model.classifier[1].in_features, num_classes)
+    elif "DenseNet" in detected_arch:
+        model = models.densenet121(weights=None)
+        model.classifier = nn.Linear(model.classifier.in_features, num_classes)
+    else:
+        raise ValueError(f"Unknown architecture: {detected_arch}")
+    return model
+
+
+def resolve_model_paths():
+    """Paths to model.pth and class_names.json (backend folder, falling back to app folder)"""
+    model_path = os.path.join(SCRIPT_DIR, "model.pth")
+    class_names_path = os.path.join(SCRIPT_DIR, "class_names.json")
+
+    # Fallback to app directory if not found in backend
+    if not os.path.exists(model_path):
+        model_path = os.path.join(SCRIPT_DIR, "..", "app", "model.pth")
+        class_names_path = os.path.join(SCRIPT_DIR, "..", "app", "class_names.json")
+
+    return model_path, class_names_path
+
+
+def class_names_path_for(model_path):
+    """<name>.classes.json next to a checkpoint, falling back to class_names.json in its folder"""
+    specific = os.path.splitext(model_path)[0] + ".classes.json"
+    if os.path.exists(specific):
+        return specific
+    return os.path.join(os.path.dirname(model_path), "class_names.json")
+
+
+def load_class_names(class_names_path):
+    """Class names ordered by index"""
+    with open(class_names_path, 'r') as f:
+        class_dict = json.load(f)
+    return [class_dict[str(i)] for i in range(len(class_dict))]
+
+
+def safetensors_path_for(model_path):
+    """model.safetensors next to model.pth"""
+    return os.path.splitext(model_path)[0] + ".safetensors"
+
+
+def safetensors_metadata(weights_path):
+    """Header metadata of a .safetensors file (reads only the header)"""
+    from safetensors import safe_open
+
+    with safe_open(weights_path, framework="pt") as f:
+        return f.metadata() or {}
+
+
+def resolve_weights_path(model_path):
+    """
+    model.safetensors when it exists, safetensors is installed and it was converted
+    from the current model.pth; otherwise model.pth itself
+    """
+    weights_path = safetensors_path_for(model_path)
+    if not os.path.exists(weights_path):
+        return model_path
+    try:
+        metadata = safetensors_metadata(weights_path)
+    except ImportError:
+        print(f"⚠️ Ignoring {os.path.basename(weights_path)}: the safetensors package is not installed")
+        return model_path
+    if os.path.exists(model_path) and metadata.get("source_fingerprint") != file_fingerprint(model_path):
+        print(f"⚠️ Ignoring {os.path.basename(weights_path)}: it was converted from a different model.pth")
+        return model_path
+    return weights_path
+
+
+def load_state_dict(weights_path):
+    """Memory-mapped state_dict on CPU from a .safetensors or .pth file"""
+    if weights_path.endswith(".safetensors"):
+        from safetensors.torch import load_file
+        return load_file(weights_path, device="cpu")
+
+    try:
+        return torch.load(weights_path, map_location="cpu", mmap=True, weights_only=True)
+    except RuntimeError:
+        # Checkpoints in the legacy (non-zip) format cannot be memory-mapped
+        return torch.load(weights_path, map_location="cpu")
+
+
+def load_model(model_path, num_classes, device=torch.device("cpu")):
+    """Load a state_dict checkpoint into the detected architecture (in eval mode)"""
+    state_dict = load_state_dict(resolve_weights_path(model_path))
+    detected_arch = detect_model_architecture(state_dict)
+
+    # No parameter memory is allocated or initialized; the mapped tensors are assigned as-is
+    with torch.device("meta"):
+        model = create_model(detected_arch, num_classes)
+    model.load_state_dict(state_dict, assign=True)
+    model.to(device)
+    model.eval()
+    return model, detected_arch
+
+
+def check_architecture_detection(num_classes=10):
+    """
+    Build an untrained model of every supported architecture and check that its
+    state_dict is detected as that architecture and loads into the model built for it
+    """
+    for arch in SUPPORTED_ARCHITECTURES:
+        state_dict = create_model(arch, num_classes).state_dict()
+        detected = detect_model_architecture(state_dict)
+        if detected != arch:
+            raise AssertionError(f"{arch} state_dict detected as {detected}")
+        with torch.device("meta"):
+            model = create_model(detected, num_classes)
+        model.load_state_dict(state_dict, assign=True)
+        print(f"✅ {arch}: detected and loaded")
+
+
+def model_size_bytes(model):
+    """Bytes held by a module's tensors (parameters, buffers and packed quantized weights)"""
+    total = 0
+    for value in model.state_dict().values():
+        # Quantized linear layers store (weight, bias) tuples
+        for tensor in value if isinstance(value, (tuple, list)) else (value,):
+            if isinstance(tensor, torch.Tensor):
+                total += tensor.numel() * tensor.element_size()
+    return total
+
+
+def file_fingerprint(path):
+    """Short content hash of a file, used as the model version"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+if __name__ == "__main__":
+    check_architecture_detection()
@@ -0,0 +1,163 @@
+"""
+Registry of served models for hot reload and side-by-side serving
+
+Each entry is a ServedModel: one loaded model version with its class names,
+inference backend and its own micro-batching queue. A request pins the live
+entry for its whole lifetime (ModelRegistry.use), so swapping in a new version
+is a single dict assignment: new requests see the new version, in-flight ones
+finish on the old one, which is stopped once it is idle.
+
+Everything here runs on the event loop thread, so the counters need no locks.
+"""
+
+import asyncio
+import os
+import time
+
+
+class UnknownModelError(Exception):
+    """Raised when a request names a model that is not loaded"""
+
+
+def file_signature(*paths):
+    """(mtime, size) of each file (None if missing); changes when a file is replaced or rewritten"""
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+
+class ServedModel:
+    """One loaded model version and the components serving it"""
+
+    def __init__(self, name, version, backend, class_names, model=None, device=None, source=None,
+                 weights_bytes=None, rss_delta_bytes=None, load_seconds=None, artifact="eager"):
+        """
+        Args:
+            name: Registry name the model is selected by (?model=<name>)
+            version: Model version (architecture + checkpoint fingerprint), also the cache key prefix
+            backend: InferenceBackend running the forward pass
+            source: Checkpoint/class-names paths and their file signature, used for reloads
+            weights_bytes: Size of the parameters and buffers (or the ONNX file)
+            rss_delta_bytes: Growth of the process resident memory while loading (approximate)
+            artifact: What actually runs for this version (e.g. "int8-static-<fingerprint>",
+                "ts-<fingerprint>-channels-last", "eager"); part of the prediction cache key
+        """
+        self.name = name
+        self.version = version
+        self.backend = backend
+        self.class_names = class_names
+        self.model = model
+        self.device = device
+        self.source = source or {}
+        self.weights_bytes = weights_bytes
+        self.rss_delta_bytes = rss_delta_bytes
+        self.load_seconds = load_seconds
+        self.artifact = artifact
+        self.batcher = None
+        self.process_pool = None
+        self.loaded_at = time.time()
+        self.in_flight = 0
+        self.requests = 0
+
+    def source_files(self):
+        """Checkpoint and class names files this version was loaded from"""
+        return self.source.get("model_path"), self.source.get("class_names_path")
+
+    async def stop(self):
+        """Stop the batching queue and worker processes of this version"""
+        if self.batcher is not None:
+            await self.batcher.stop()
+        if self.process_pool is not None:
+            self.process_pool.shutdown()
+
+    def info(self):
+        return {
+            "name": self.name,
+            "version": self.version,
+            "backend": self.backend.name,
+            "artifact": self.artifact,
+            "device": str(self.device) if self.device is not None else None,
+            "num_classes": len(self.class_names),
+            "loaded_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.loaded_at)),
+            "load_seconds": self.load_seconds,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "memory": {
+                "weights_bytes": self.weights_bytes,
+                "rss_delta_bytes": self.rss_delta_bytes,
+            },
+            "source": {key: value for key, value in self.source.items() if key != "signature"},
+        }
+
+
+class _Lease:
+    """Keeps a ServedModel counted as in flight for the duration of a with-block"""
+
+    __slots__ = ("served",)
+
+    def __init__(self, served):
+        self.served = served
+
+    def __enter__(self):
+        self.served.in_flight += 1
+        self.served.requests += 1
+        return self.served
+
+    def __exit__(self, *exc_info):
+        self.served.in_flight -= 1
+        return False
+
+
+class ModelRegistry:
+    """Live model versions by name, with atomic swap and draining of replaced versions"""
+
+    def __init__(self, default_name="default"):
+        self.default_name = default_name
+        self._models = {}
+        self.reloads = {}
+        self.retired = 0
+
+    def __contains__(self, name):
+        return name in self._models
+
+    def names(self):
+        return list(self._models)
+
+    def models(self):
+        return list(self._models.values())
+
+    def get(self, name=None):
+        """Live version of a model (the default model when name is None)"""
+        served = self._models.get(name or self.default_name)
+        if served is None:
+            raise UnknownModelError(f"Unknown model: {name} (available: {', '.join(self._models) or 'none'})")
+        return served
+
+    def use(self, name=None):
+        """Pin the live version of a model for one request: `with registry.use(name) as served:`"""
+        return _Lease(self.get(name))
+
+    def publish(self, served):
+        """Make served the live version of its name; returns the version it replaces (or None)"""
+        previous = self._models.get(served.name)
+        self._models[served.name] = served
+        return previous
+
+    async def retire(self, served, timeout=60.0):
+        """Stop a replaced version once its in-flight requests have finished (or after timeout)"""
+        deadline = time.monotonic() + timeout
+        while served.in_flight and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        await served.stop()
+        self.retired += 1
+
+    async def close(self):
+        """Stop every live version (server shutdown)"""
+        for served in self.models():
+            await served.stop()
+        self._models.clear()
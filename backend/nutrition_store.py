@@ -0,0 +1,194 @@
+"""
+Nutrition data store
+
+The nutrition database lives in nutrition_data.json next to this module. The
+backend serves it at /nutrition and the Streamlit app imports this module, so
+both share one copy of the data, the schema and the matcher. It is validated
+and loaded once; records are frozen slotted dataclasses. Lookups go through an
+index: exact normalized names and aliases in a dict, then a trigram fallback
+for misspellings.
+
+Only the standard library is used, so the app can import it without the
+backend's dependencies.
+"""
+
+import json
+import os
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+NUTRITION_NUMBER_FIELDS = ("calories", "protein", "carbs", "fat", "fiber")
+NUTRITION_TEXT_FIELDS = (
+    "description", "origin", "preparation", "best_time", "vitamins", "serving_size", "popular_variants"
+)
+
+# Minimum trigram similarity (Dice coefficient, 0-1) for a fuzzy match
+FUZZY_MIN_SCORE = 0.5
+
+
+class NutritionDataError(ValueError):
+    """Raised when nutrition_data.json does not match the expected schema"""
+
+
+@dataclass(frozen=True, slots=True)
+class NutritionRecord:
+    key: str
+    calories: float
+    protein: float
+    carbs: float
+    fat: float
+    fiber: float
+    description: str
+    origin: str
+    preparation: str
+    best_time: str
+    health_tips: tuple
+    vitamins: str
+    serving_size: str
+    popular_variants: str
+
+    def to_dict(self):
+        record = asdict(self)
+        record["health_tips"] = list(self.health_tips)
+        return record
+
+
+def resolve_nutrition_path():
+    """Path to nutrition_data.json next to this module"""
+    return os.path.join(SCRIPT_DIR, "nutrition_data.json")
+
+
+def validate_record(name, record):
+    """Schema errors of one food record (empty list if valid)"""
+    if not isinstance(record, dict):
+        return [f"{name}: expected an object"]
+    errors = []
+    expected = set(NUTRITION_NUMBER_FIELDS) | set(NUTRITION_TEXT_FIELDS) | {"health_tips"}
+    for field in sorted(expected - record.keys()):
+        errors.append(f"{name}: missing {field}")
+    for field in sorted(record.keys() - expected):
+        errors.append(f"{name}: unknown field {field}")
+    for field in NUTRITION_NUMBER_FIELDS:
+        value = record.get(field, 0)
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+            errors.append(f"{name}: {field} must be a non-negative number")
+    for field in NUTRITION_TEXT_FIELDS:
+        if not isinstance(record.get(field, ""), str):
+            errors.append(f"{name}: {field} must be a string")
+    tips = record.get("health_tips", [])
+    if not isinstance(tips, list) or not all(isinstance(tip, str) for tip in tips):
+        errors.append(f"{name}: health_tips must be a list of strings")
+    return errors
+
+
+def validate_nutrition_data(data):
+    """Schema errors of a parsed nutrition_data.json (empty list if valid)"""
+    if not isinstance(data, dict):
+        return ["top level: expected an object"]
+    errors = []
+    if not isinstance(data.get("version"), int):
+        errors.append("version: expected an integer")
+    foods = data.get("foods")
+    if not isinstance(foods, dict) or not foods:
+        return errors + ["foods: expected a non-empty object"]
+    for key, record in foods.items():
+        if key != normalize_food_name(key):
+            errors.append(f"{key}: keys must be normalized (lowercase, underscores)")
+        errors.extend(validate_record(key, record))
+    errors.extend(validate_record("default", data.get("default")))
+    aliases = data.get("aliases", {})
+    if not isinstance(aliases, dict):
+        return errors + ["aliases: expected an object"]
+    for alias, key in aliases.items():
+        if key not in foods:
+            errors.append(f"alias {alias}: unknown food {key}")
+    return errors
+
+
+def normalize_food_name(food_name):
+    """Lowercase, with runs of spaces, dashes and other separators turned into single underscores"""
+    return "_".join("".join(ch if ch.isalnum() else " " for ch in food_name.lower()).split())
+
+
+def name_trigrams(name):
+    """Character trigrams of a normalized name, padded so short names still get some"""
+    padded = f"  {name.replace('_', ' ')} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+class NutritionStore:
+    """Validated nutrition records with an exact/alias map and a trigram index"""
+
+    def __init__(self, data, path=None):
+        errors = validate_nutrition_data(data)
+        if errors:
+            raise NutritionDataError(f"Invalid nutrition data ({len(errors)} errors): " + "; ".join(errors[:5]))
+        self.path = path
+        self.version = data["version"]
+        self.records = {key: self._record(key, record) for key, record in data["foods"].items()}
+        self.default = self._record("default", data["default"])
+
+        self.exact = {key: key for key in self.records}
+        for alias, key in data.get("aliases", {}).items():
+            self.exact.setdefault(normalize_food_name(alias), key)
+        self.trigrams = {name: name_trigrams(name) for name in self.exact}
+        self.trigram_index = {}
+        for name, grams in self.trigrams.items():
+            for gram in grams:
+                self.trigram_index.setdefault(gram, []).append(name)
+
+    @staticmethod
+    def _record(key, record):
+        return NutritionRecord(key=key, **{**record, "health_tips": tuple(record["health_tips"])})
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f), path)
+
+    def fuzzy_match(self, name):
+        """Best (score, key) by trigram Dice similarity among names sharing a trigram, or (0.0, None)
+
+        Ties go to the lexicographically smallest name, so the result never depends on dict order.
+        """
+        grams = name_trigrams(name)
+        shared = {}
+        for gram in grams:
+            for candidate in self.trigram_index.get(gram, ()):
+                shared[candidate] = shared.get(candidate, 0) + 1
+
+        best_score, best_name = 0.0, None
+        for candidate, count in sorted(shared.items()):
+            score = 2 * count / (len(grams) + len(self.trigrams[candidate]))
+            if score > best_score:
+                best_score, best_name = score, candidate
+        return best_score, self.exact.get(best_name)
+
+    def resolve(self, food_name):
+        """(key, how) for a food name: how is "exact", "alias", "fuzzy" or None when nothing matches"""
+        name = normalize_food_name(food_name)
+        key = self.exact.get(name)
+        if key is not None:
+            return key, "exact" if name == key else "alias"
+
+        score, key = self.fuzzy_match(name)
+        if key is not None and score >= FUZZY_MIN_SCORE:
+            return key, "fuzzy"
+        return None, None
+
+    def get(self, food_name):
+        """Record for a food name, or None"""
+        key, _ = self.resolve(food_name)
+        return self.records.get(key)
+
+    def unresolved(self, class_names):
+        """Class names that do not map to a record by exact name or alias"""
+        return [name for name in class_names if self.resolve(name)[1] not in ("exact", "alias")]
+
+
+@lru_cache(maxsize=1)
+def get_nutrition_store():
+    """The nutrition store, loaded on first use"""
+    return NutritionStore.load(resolve_nutrition_path())
@@ -0,0 +1,104 @@
+"""
+Fast image preprocessing for the API server
+
+Phone photos are often 12 MP, but the model only sees 224x224. Instead of
+decoding every pixel and resizing a float image, the fast path:
+
+    1. asks the JPEG decoder for a reduced-size image (draft mode scales the
+       DCT by 1/2, 1/4 or 1/8, so a 4032x3024 photo decodes at ~504x378)
+    2. resizes the small image in uint8 with Pillow's antialiased bilinear
+       filter (the same filter transforms.Resize uses, vectorized under
+       pillow-simd)
+    3. wraps the pixels as a uint8 tensor (no PIL -> float round trip)
+    4. converts to float and normalizes in one fused multiply-add
+
+Images that are not JPEG, or already small, produce the same tensor as
+model_loader.transform; downscaled JPEGs differ by a few intensity levels.
+Run bench_preprocess.py to compare both pipelines on your own photos.
+
+Clients may also resize on the device and send the pixels directly as a
+tensor payload (TENSOR_CONTENT_TYPE): a 9-byte header followed by
+224 x 224 x 3 RGB uint8 values in row-major (height, width, channel) order.
+
+    offset  size  field
+    0       4     magic b"FDT1"
+    4       2     height (uint16, little-endian) = 224
+    6       2     width  (uint16, little-endian) = 224
+    8       1     channels (uint8) = 3
+"""
+
+import io
+import struct
+
+import torch
+from PIL import Image
+from torchvision.transforms import functional as TF
+
+INPUT_SIZE = (224, 224)
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+# (x / 255 - mean) / std  ==  x * scale + shift
+_SCALE = torch.tensor([1.0 / (255.0 * s) for s in IMAGENET_STD]).view(3, 1, 1)
+_SHIFT = torch.tensor([-m / s for m, s in zip(IMAGENET_MEAN, IMAGENET_STD)]).view(3, 1, 1)
+
+TENSOR_CONTENT_TYPE = "application/x-food-tensor"
+TENSOR_MAGIC = b"FDT1"
+TENSOR_HEADER = struct.Struct("<4sHHB")
+
+
+def decode_image(image_bytes, size=INPUT_SIZE):
+    """
+    Decode image bytes to an RGB PIL image, letting the JPEG decoder downscale
+    to the smallest size that is still at least `size` in both dimensions
+    """
+    image = Image.open(io.BytesIO(image_bytes))
+    if image.format == "JPEG":
+        image.draft("RGB", size)
+    return image.convert("RGB")
+
+
+def resize_to_uint8_tensor(image, size=INPUT_SIZE):
+    """Bilinear resize in uint8, returned as a (3, H, W) uint8 tensor"""
+    if image.size != size:
+        image = image.resize(size, Image.BILINEAR)
+    return TF.pil_to_tensor(image)
+
+
+def normalize(pixels):
+    """uint8 (3, H, W) -> normalized float in one fused scale/shift"""
+    return torch.addcmul(_SHIFT, pixels.float(), _SCALE)
+
+
+def preprocess_image_bytes(image_bytes, size=INPUT_SIZE):
+    """Raw upload bytes -> normalized (3, 224, 224) float tensor for the model"""
+    return normalize(resize_to_uint8_tensor(decode_image(image_bytes, size), size))
+
+
+def encode_tensor_payload(image, size=INPUT_SIZE):
+    """Build a tensor payload from a PIL image (what a client sends to skip uploading the photo)"""
+    image = image.convert("RGB").resize(size, Image.BILINEAR)
+    width, height = size
+    return TENSOR_HEADER.pack(TENSOR_MAGIC, height, width, 3) + image.tobytes()
+
+
+def decode_tensor_payload(payload, size=INPUT_SIZE):
+    """
+    Tensor payload -> normalized (3, 224, 224) float tensor
+
+    The pixels are viewed in place (no copy) until the fused normalize; pass a
+    bytearray so the view is writable. Raises ValueError for a malformed payload.
+    """
+    if len(payload) < TENSOR_HEADER.size:
+        raise ValueError("Tensor payload is shorter than its header")
+    magic, height, width, channels = TENSOR_HEADER.unpack_from(payload)
+    if magic != TENSOR_MAGIC:
+        raise ValueError("Tensor payload has an unknown header")
+    if (width, height) != tuple(size) or channels != 3:
+        raise ValueError(f"Tensor payload must be {size[0]}x{size[1]}x3, got {width}x{height}x{channels}")
+    expected = height * width * channels
+    if len(payload) - TENSOR_HEADER.size != expected:
+        raise ValueError(f"Tensor payload must hold {expected} pixel bytes")
+
+    pixels = torch.frombuffer(payload, dtype=torch.uint8, count=expected, offset=TENSOR_HEADER.size)
+    return normalize(pixels.view(height, width, channels).permute(2, 0, 1))
@@ -0,0 +1,132 @@
+"""
+Multi-process inference workers sharing one copy of the model weights
+
+The parent process loads the model once and moves its parameters into shared
+memory. Worker processes are spawned with that model, so every worker maps the
+same weight pages instead of loading its own ~43 MB copy. Each worker runs
+with a fixed number of torch threads so that workers x threads never exceeds
+the number of CPU cores.
+"""
+
+import os
+import queue
+import threading
+
+import torch
+import torch.multiprocessing as mp
+
+
+def default_threads_per_worker(num_workers):
+    """Split the available cores evenly between workers"""
+    return max(1, (os.cpu_count() or 1) // max(1, num_workers))
+
+
+def _worker_main(model, num_threads, conn):
+    """Worker loop: receive a batch, send back softmax probabilities"""
+    torch.set_num_threads(num_threads)
+    torch.set_num_interop_threads(1)
+    model.eval()
+
+    while True:
+        try:
+            batch = conn.recv()
+        except EOFError:
+            break
+        if batch is None:
+            break
+        try:
+            with torch.no_grad():
+                probabilities = torch.softmax(model(batch), dim=1)
+            # Results are tiny (N x num_classes), so send plain arrays instead of shared tensors
+            conn.send((True, probabilities.numpy()))
+        except Exception as e:
+            conn.send((False, f"{type(e).__name__}: {e}"))
+
+
+class _Worker:
+    def __init__(self, ctx, model, num_threads, index):
+        self.index = index
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(model, num_threads, child_conn),
+            name=f"inference-worker-{index}",
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.batches = 0
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
+
+
+class InferenceProcessPool:
+    """Dispatch batches to a fixed set of worker processes holding a shared model"""
+
+    def __init__(self, model, num_workers, threads_per_worker=None):
+        """
+        Args:
+            model: CPU model to serve; its parameters are moved into shared memory
+            num_workers: Number of worker processes
+            threads_per_worker: torch intra-op threads per worker (default: cores / workers)
+        """
+        self.num_workers = max(1, int(num_workers))
+        self.threads_per_worker = int(threads_per_worker or default_threads_per_worker(self.num_workers))
+        self.model = model.share_memory()
+        self._ctx = mp.get_context("spawn")
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._workers = []
+        self.restarts = 0
+
+        for index in range(self.num_workers):
+            worker = _Worker(self._ctx, self.model, self.threads_per_worker, index)
+            self._workers.append(worker)
+            self._idle.put(worker)
+
+    def run(self, batch):
+        """Run one batch on the next idle worker (blocking; call from an executor thread)"""
+        worker = self._idle.get()
+        try:
+            worker.conn.send(batch)
+            ok, result = worker.conn.recv()
+        except (EOFError, BrokenPipeError, ConnectionResetError, OSError):
+            # Worker died (e.g. OOM-killed): replace it and fail this batch
+            worker = self._respawn(worker)
+            raise RuntimeError("Inference worker exited unexpectedly")
+        finally:
+            self._idle.put(worker)
+
+        if not ok:
+            raise RuntimeError(result)
+        worker.batches += 1
+        return torch.from_numpy(result)
+
+    def _respawn(self, worker):
+        with self._lock:
+            worker.stop()
+            replacement = _Worker(self._ctx, self.model, self.threads_per_worker, worker.index)
+            self._workers[worker.index] = replacement
+            self.restarts += 1
+        return replacement
+
+    def shutdown(self):
+        for worker in self._workers:
+            worker.stop()
+
+    def stats(self):
+        return {
+            "processes": self.num_workers,
+            "threads_per_worker": self.threads_per_worker,
+            "restarts": self.restarts,
+            "batches_per_worker": [worker.batches for worker in self._workers],
+            "alive": sum(worker.process.is_alive() for worker in self._workers),
+        }
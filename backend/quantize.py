@@ -0,0 +1,188 @@
+"""
+INT8 quantization tool for the food classifier
+
+Produces a quantized TorchScript artifact from model.pth and measures how often
+it agrees with the fp32 model on a held-out image folder. The agreement is
+written to a JSON report next to the artifact; the API server refuses to load
+a quantized model whose agreement is below QUANTIZED_MIN_AGREEMENT.
+
+Modes:
+    dynamic - int8 weights for Linear layers, activations quantized on the fly
+    static  - post-training static quantization of the whole network (conv
+              backbone included), calibrated on a folder of sample images
+
+Usage:
+    python quantize.py --mode static --calibration-dir data/calib --eval-dir data/holdout
+    python quantize.py --mode dynamic --eval-dir data/holdout
+"""
+
+import argparse
+import json
+import os
+import time
+
+import torch
+import torch.nn as nn
+from PIL import Image
+
+from image_files import find_images
+from model_loader import (
+    SCRIPT_DIR,
+    file_fingerprint,
+    load_class_names,
+    load_model,
+    resolve_model_paths,
+    transform
+)
+
+
+def load_batches(paths, batch_size=16):
+    """Yield preprocessed image batches"""
+    for start in range(0, len(paths), batch_size):
+        tensors = [transform(Image.open(p).convert("RGB")) for p in paths[start:start + batch_size]]
+        yield torch.stack(tensors)
+
+
+def quantize_dynamic(model):
+    """Dynamic quantization: int8 Linear weights, activations quantized at runtime"""
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+
+def quantize_static(model, calibration_paths, backend="x86"):
+    """Post-training static quantization (FX graph mode) calibrated on sample images"""
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    if not calibration_paths:
+        raise ValueError("Static quantization needs at least one calibration image")
+
+    torch.backends.quantized.engine = backend
+    example_inputs = (torch.randn(1, 3, 224, 224),)
+    prepared = prepare_fx(model, get_default_qconfig_mapping(backend), example_inputs)
+
+    with torch.no_grad():
+        for batch in load_batches(calibration_paths):
+            prepared(batch)
+
+    return convert_fx(prepared)
+
+
+def measure_agreement(reference, candidate, paths, k=5):
+    """
+    Compare a candidate model with the fp32 reference on the given images
+
+    top1_agreement: fraction of images where both models predict the same class
+    top5_agreement: fraction of images where the reference top-1 class is in the candidate's top-5
+    """
+    top1 = top5 = total = 0
+    with torch.no_grad():
+        for batch in load_batches(paths):
+            ref_pred = reference(batch).argmax(dim=1)
+            cand_topk = torch.topk(candidate(batch), k, dim=1).indices
+            top1 += (cand_topk[:, 0] == ref_pred).sum().item()
+            top5 += (cand_topk == ref_pred.unsqueeze(1)).any(dim=1).sum().item()
+            total += batch.shape[0]
+
+    return {
+        "num_images": total,
+        "top1_agreement": top1 / total if total else 0.0,
+        "top5_agreement": top5 / total if total else 0.0,
+    }
+
+
+def report_path_for(artifact_path):
+    """Agreement report that accompanies a quantized artifact"""
+    return os.path.splitext(artifact_path)[0] + ".json"
+
+
+def load_quantized_model(artifact_path, min_agreement, source_fingerprint=None):
+    """
+    Load a quantized TorchScript artifact, refusing it if its agreement report is
+    missing, below min_agreement (top-1), or was produced from a different model.pth
+    
+    Returns (model, report)
+    """
+    report_path = report_path_for(artifact_path)
+    if not os.path.exists(report_path):
+        raise RuntimeError(f"No agreement report found for {artifact_path} (expected {report_path})")
+
+    with open(report_path, 'r') as f:
+        report = json.load(f)
+
+    agreement = report.get("top1_agreement", 0.0)
+    if agreement < min_agreement:
+        raise RuntimeError(
+            f"Quantized model top-1 agreement {agreement:.2%} is below the required {min_agreement:.2%}"
+        )
+    if source_fingerprint is not None and report.get("source_fingerprint") != source_fingerprint:
+        raise RuntimeError(
+            f"Quantized model was built from {report.get('source_model_version')}, "
+            f"not from the current model.pth ({source_fingerprint})"
+        )
+
+    torch.backends.quantized.engine = report.get("engine", torch.backends.quantized.engine)
+    model = torch.jit.load(artifact_path, map_location="cpu")
+    model.eval()
+    return model, report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantize model.pth to INT8 and check agreement with fp32")
+    parser.add_argument("--mode", choices=["dynamic", "static"], default="static")
+    parser.add_argument("--calibration-dir", help="Folder of sample images for static calibration")
+    parser.add_argument("--calibration-size", type=int, default=200, help="Max calibration images")
+    parser.add_argument("--eval-dir", required=True, help="Held-out image folder for the agreement check")
+    parser.add_argument("--backend", default="x86", help="Quantized engine (x86, fbgemm, qnnpack)")
+    parser.add_argument("--output", default=os.path.join(SCRIPT_DIR, "model_int8.pt"))
+    args = parser.parse_args()
+
+    model_path, class_names_path = resolve_model_paths()
+    num_classes = len(load_class_names(class_names_path))
+    fp32_model, detected_arch = load_model(model_path, num_classes)
+    fingerprint = file_fingerprint(model_path)
+    model_version = f"{detected_arch}-{fingerprint}"
+    print(f"✅ Loaded fp32 model: {model_version}")
+
+    if args.mode == "dynamic":
+        quantized = quantize_dynamic(fp32_model)
+    else:
+        if not args.calibration_dir:
+            parser.error("--calibration-dir is required for static quantization")
+        calibration_paths = find_images(args.calibration_dir, args.calibration_size)
+        print(f"🔧 Calibrating on {len(calibration_paths)} images...")
+        # FX prepare rewrites the module, so calibrate a fresh copy
+        reference_copy, _ = load_model(model_path, num_classes)
+        quantized = quantize_static(reference_copy, calibration_paths, args.backend)
+
+    eval_paths = find_images(args.eval_dir)
+    if not eval_paths:
+        parser.error(f"No images found in {args.eval_dir}")
+
+    start = time.perf_counter()
+    agreement = measure_agreement(fp32_model, quantized, eval_paths)
+    print(f"📊 Top-1 agreement: {agreement['top1_agreement']:.2%}")
+    print(f"📊 Top-5 agreement: {agreement['top5_agreement']:.2%} ({agreement['num_images']} images, "
+          f"{time.perf_counter() - start:.1f}s)")
+
+    scripted = torch.jit.trace(quantized, torch.randn(1, 3, 224, 224))
+    scripted = torch.jit.freeze(scripted.eval())
+    torch.jit.save(scripted, args.output)
+
+    report = {
+        "mode": args.mode,
+        "engine": torch.backends.quantized.engine,
+        "architecture": detected_arch,
+        "source_model_version": model_version,
+        "source_fingerprint": fingerprint,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        **agreement,
+    }
+    with open(report_path_for(args.output), 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"✅ Saved {args.output} ({os.path.getsize(args.output) / 1e6:.1f} MB)")
+    print(f"✅ Saved {report_path_for(args.output)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+Bounded upload ingestion
+
+Request bodies are capped while they stream in, so an oversized upload is
+rejected (413) after at most the limit has been buffered rather than after the
+whole body is in memory. Image headers are then sniffed before any pixels are
+decoded: unsupported formats and decompression bombs (tiny files that expand to
+huge pixel counts) are rejected with 422. Per-request memory is tracked as the
+upload buffer plus the decoded pixel buffer plus the model input tensor.
+"""
+
+import base64
+import binascii
+import io
+from collections import deque
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from PIL import Image
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ALLOWED_FORMATS = {"JPEG", "MPO", "PNG", "WEBP", "BMP", "GIF"}
+CHUNK_SIZE = 64 * 1024
+MODEL_INPUT_BYTES = 3 * 224 * 224 * 4
+
+
+class UploadRejectedError(Exception):
+    """Raised when an upload is refused before decoding; served with status_code"""
+
+    status_code = 422
+
+
+class UploadTooLargeError(UploadRejectedError):
+    """The upload is bigger than the configured byte limit"""
+
+    status_code = 413
+
+
+class InvalidImageError(UploadRejectedError):
+    """The upload is not a supported image or would decode to too many pixels"""
+
+    status_code = 422
+
+
+async def read_upload(upload, max_bytes, chunk_size=CHUNK_SIZE):
+    """Read an UploadFile in chunks, stopping as soon as it exceeds max_bytes"""
+    chunks = []
+    total = 0
+    while True:
+        chunk = await upload.read(chunk_size)
+        if not chunk:
+            break
+        total += len(chunk)
+        if total > max_bytes:
+            raise UploadTooLargeError(f"Upload exceeds {max_bytes} bytes")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+async def read_request_body(request, max_bytes, writable=False):
+    """
+    Read a raw request body as it streams in, stopping as soon as it exceeds max_bytes
+
+    Returns bytes, or a bytearray when writable=True (for zero-copy tensor views)
+    """
+    chunks = []
+    total = 0
+    async for chunk in request.stream():
+        total += len(chunk)
+        if total > max_bytes:
+            raise UploadTooLargeError(f"Upload exceeds {max_bytes} bytes")
+        chunks.append(chunk)
+    return bytearray().join(chunks) if writable else b"".join(chunks)
+
+
+def decode_base64_image(data, max_bytes):
+    """Decode a base64 string, refusing it from its length alone if it would exceed max_bytes"""
+    if not isinstance(data, str):
+        raise InvalidImageError("Image must be a base64 string")
+    if len(data) * 3 // 4 > max_bytes:
+        raise UploadTooLargeError(f"Upload exceeds {max_bytes} bytes")
+    try:
+        return base64.b64decode(data)
+    except (binascii.Error, ValueError) as e:
+        raise InvalidImageError(f"Invalid base64 image: {e}")
+
+
+def inspect_image(image_bytes, max_pixels, draft_size=None):
+    """
+    Read only the image header and check format and dimensions
+
+    Returns (format, (width, height), (decoded_width, decoded_height)); the decoded
+    size is smaller than the image size when JPEG draft decoding to draft_size applies
+    """
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            image_format = image.format
+            size = image.size
+            if image_format not in ALLOWED_FORMATS:
+                raise InvalidImageError(f"Unsupported image format: {image_format}")
+            if size[0] * size[1] > max_pixels:
+                raise InvalidImageError(
+                    f"Image is {size[0]}x{size[1]} pixels (maximum is {max_pixels} pixels)"
+                )
+            if draft_size is not None and image_format == "JPEG":
+                image.draft("RGB", draft_size)
+            return image_format, size, image.size
+    except UploadRejectedError:
+        raise
+    except Exception:
+        raise InvalidImageError("Cannot identify image file")
+
+
+class UploadStats:
+    """Upload size, rejection and per-request memory counters"""
+
+    def __init__(self, window=1000):
+        self.requests = 0
+        self.total_upload_bytes = 0
+        self.max_upload_bytes = 0
+        self.rejected_too_large = 0
+        self.rejected_invalid = 0
+        self._peaks = deque(maxlen=window)
+        self.max_request_bytes = 0
+
+    def record(self, upload_bytes, decoded_sizes=()):
+        """Record one request: total upload bytes and the decoded (width, height) of each image"""
+        peak = upload_bytes + sum(w * h * 3 + MODEL_INPUT_BYTES for w, h in decoded_sizes)
+        self.requests += 1
+        self.total_upload_bytes += upload_bytes
+        self.max_upload_bytes = max(self.max_upload_bytes, upload_bytes)
+        self.max_request_bytes = max(self.max_request_bytes, peak)
+        self._peaks.append(peak)
+
+    def record_rejection(self, error):
+        if isinstance(error, UploadTooLargeError):
+            self.rejected_too_large += 1
+        else:
+            self.rejected_invalid += 1
+
+    def stats(self):
+        """Upload and peak-memory-per-request metrics (peaks over the recent window)"""
+        peaks = sorted(self._peaks)
+        stats = {
+            "requests": self.requests,
+            "rejected_too_large": self.rejected_too_large,
+            "rejected_invalid": self.rejected_invalid,
+            "avg_upload_bytes": self.total_upload_bytes / self.requests if self.requests else 0.0,
+            "max_upload_bytes": self.max_upload_bytes,
+            "avg_request_peak_bytes": sum(peaks) / len(peaks) if peaks else 0.0,
+            "p95_request_peak_bytes": peaks[int(0.95 * (len(peaks) - 1))] if peaks else 0,
+            "max_request_peak_bytes": self.max_request_bytes,
+        }
+        if resource is not None:
+            # ru_maxrss is in kilobytes on Linux
+            stats["process_max_rss_bytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        return stats
+
+
+class BodySizeLimitMiddleware:
+    """
+    ASGI middleware that caps request bodies while they stream in
+
+    limit_for_path(path) returns the byte limit for a request path (None = no limit).
+    A declared Content-Length over the limit is refused before reading the body;
+    chunked bodies are refused as soon as the running total passes the limit.
+    """
+
+    def __init__(self, app, limit_for_path, stats=None):
+        self.app = app
+        self.limit_for_path = limit_for_path
+        self.stats = stats
+
+    def _reject(self, limit):
+        if self.stats is not None:
+            self.stats.rejected_too_large += 1
+        return f"Request body exceeds {limit} bytes"
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limit_for_path(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        content_length = headers.get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            response = JSONResponse(status_code=413, content={"detail": self._reject(limit)})
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # HTTPException passes through FastAPI's body parsing unchanged
+                    raise HTTPException(status_code=413, detail=self._reject(limit))
+            return message
+
+        await self.app(scope, limited_receive, send)
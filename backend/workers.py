@@ -0,0 +1,58 @@
+"""
+Bounded executor stages for CPU-bound work
+
+Image decoding, preprocessing and model inference block the thread they run on,
+so they are kept off the asyncio event loop. Each stage has a fixed number of
+threads and a cap on pending work; once the cap is reached new work is rejected
+with ServerBusyError (served as 503 + Retry-After) instead of queueing forever.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ServerBusyError(Exception):
+    """Raised when a bounded stage is full and the request should be retried later"""
+
+
+class BoundedExecutor:
+    """Thread pool with a limit on how much work may be queued or running at once"""
+
+    def __init__(self, max_workers, max_pending, name="worker"):
+        """
+        Args:
+            max_workers: Number of threads in the pool
+            max_pending: Maximum tasks queued or running before new work is rejected
+            name: Thread name prefix (shows up in stack dumps and profilers)
+        """
+        self.name = name
+        self.max_workers = max(1, int(max_workers))
+        self.max_pending = max(self.max_workers, int(max_pending))
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=name)
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    async def run(self, fn, *args):
+        """Run fn(*args) in the pool, raising ServerBusyError if the stage is full"""
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise ServerBusyError(f"{self.name} queue is full")
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        return {
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }